@@ -5,6 +5,8 @@ import time
 
 from flask import Flask
 from .config import Config
+from .assets import init_assets
+from .compression import init_compression
 from .db import Base, engine
 from . import models  # чтобы модели зарегистрировались
 from .routes.auth import auth_bp
@@ -13,6 +15,8 @@ from .routes.webapp_admin import admin_bp
 from .routes.questions import questions_bp
 from .routes.boom_media import boom_media_bp
 from .similar_cache import warmup_similar_cache_async
+from .embedding_jobs import start_embedding_worker
+from .telegram_outbox import start_telegram_sender
 
 def create_app() -> Flask:
     # Проверяем конфигурацию перед запуском
@@ -24,6 +28,11 @@ def create_app() -> Flask:
     # Долгая сессия (можно поменять срок)
     app.permanent_session_lifetime = timedelta(days=30)
 
+    # gzip/brotli для JSON и HTML
+    init_compression(app)
+    # Шаблоны: кеш байткода, asset_url() и долгий кеш версионированной статики
+    init_assets(app)
+
 
     # Создаём таблицы (для простоты, без миграций)
     Base.metadata.create_all(bind=engine)
@@ -33,8 +42,16 @@ def create_app() -> Flask:
     ensure_votes_count_trigger()
     from utils.ensure_telegram_notice_columns import ensure_telegram_notice_columns
     ensure_telegram_notice_columns()
+    from utils.ensure_similar_cache_columns import ensure_similar_cache_columns
+    ensure_similar_cache_columns()
+    from utils.ensure_question_cards import ensure_question_cards
+    ensure_question_cards()
+    from utils.ensure_embedding_index import ensure_embedding_index
+    ensure_embedding_index()
 
     warmup_similar_cache_async()
+    start_embedding_worker()
+    start_telegram_sender()
 
     from .routes.questions import auto_close_due_discussions, auto_publish_daily_question
 
@@ -60,6 +77,19 @@ def create_app() -> Flask:
 
     threading.Thread(target=_auto_publish_loop, daemon=True).start()
 
+    if Config.VOTES_RECONCILE_INTERVAL > 0:
+        from .vote_counts import reconcile_votes_counts
+
+        def _votes_reconcile_loop():
+            while True:
+                time.sleep(Config.VOTES_RECONCILE_INTERVAL)
+                try:
+                    reconcile_votes_counts()
+                except Exception as exc:
+                    print(f"[VotesReconcile] Error: {exc}")
+
+        threading.Thread(target=_votes_reconcile_loop, daemon=True).start()
+
     # Регистрируем blueprints
     app.register_blueprint(auth_bp)
     app.register_blueprint(dashboard_bp)
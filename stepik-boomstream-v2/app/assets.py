@@ -0,0 +1,52 @@
+from threading import Lock
+from typing import Dict
+import hashlib
+import os
+
+from flask import request, url_for
+from jinja2 import FileSystemBytecodeCache
+
+from .config import Config
+
+_ASSET_VERSIONS: Dict[str, str] = {}
+_ASSET_VERSIONS_LOCK = Lock()
+
+# Versioned static URLs never change content, so browsers may keep them for a year.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def _asset_version(static_folder: str, filename: str) -> str:
+    with _ASSET_VERSIONS_LOCK:
+        version = _ASSET_VERSIONS.get(filename)
+        if version is None:
+            with open(os.path.join(static_folder, filename), "rb") as f:
+                version = hashlib.md5(f.read()).hexdigest()[:12]
+            _ASSET_VERSIONS[filename] = version
+        return version
+
+
+def make_asset_url(app):
+    def asset_url(filename: str) -> str:
+        """Static URL with a content hash (?v=...), computed once per process."""
+        return url_for("static", filename=filename, v=_asset_version(app.static_folder, filename))
+    return asset_url
+
+
+def _static_cache_headers(response):
+    if request.endpoint == "static" and request.args.get("v") and response.status_code in (200, 304):
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def init_assets(app) -> None:
+    """Template bytecode cache, asset_url() for templates and long-lived static caching."""
+    cache_dir = getattr(Config, "JINJA_BYTECODE_CACHE_DIR", "")
+    if cache_dir:
+        try:
+            os.makedirs(cache_dir, exist_ok=True)
+            app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
+        except OSError as e:
+            print(f"[Templates] Bytecode cache disabled: {e}")
+    app.jinja_env.auto_reload = app.debug
+    app.jinja_env.globals["asset_url"] = make_asset_url(app)
+    app.after_request(_static_cache_headers)
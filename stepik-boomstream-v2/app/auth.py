@@ -5,11 +5,40 @@ from app.db import SessionLocal
 from app.models import User, TelegramUser, ROLE_CURATOR, ROLE_ADMIN
 from app.telegram_auth import validate_webapp_init_data
 from app.config import Config
+from sqlalchemy import or_
+from sqlalchemy.dialects.postgresql import insert
 
+from collections import OrderedDict, namedtuple
+from threading import Lock, Thread
+from typing import Dict, Optional, Tuple
+import atexit
+import hashlib
 import logging
 import time
 logger = logging.getLogger(__name__)
 
+# Кеш проверенных initData: sha256(init_data) -> (expires_at, user_id, user_role, telegram_id).
+# Ключ — вся строка целиком, поэтому попадание возможно только для уже проверенной подписи.
+_INIT_DATA_CACHE: "OrderedDict[str, Tuple[float, int, int, int]]" = OrderedDict()
+_INIT_DATA_CACHE_LOCK = Lock()
+
+# upsert_telegram_user: последние записанные (first_name, last_name, username) по Telegram ID
+# (None — строка есть, данные этот процесс не видел, см. ensure_telegram_user_saved)
+# и буфер изменённых пользователей, который сбрасывает фоновый поток.
+_TG_USER_FINGERPRINTS: Dict[int, Optional[Tuple[Optional[str], Optional[str], Optional[str]]]] = {}
+_TG_USERS_PENDING: Dict[int, dict] = {}
+_TG_USERS_LOCK = Lock()
+_TG_USERS_FLUSH_LOCK = Lock()  # один сброс за раз: ensure_telegram_user_saved дожидается текущего
+_TG_USERS_FLUSHER: Optional[Thread] = None
+
+# Кеш прав (LRU): user_id -> (expires_at, Principal или None, если пользователя нет).
+# Роль и telegram_id меняются только вне приложения (SQL, скрипты импорта), поэтому
+# кеш не сбрасывается: новая роль или её отзыв вступают в силу в каждом процессе
+# не позже чем через PRINCIPAL_CACHE_TTL секунд.
+Principal = namedtuple("Principal", ["role", "telegram_id"])
+_PRINCIPALS: "OrderedDict[int, Tuple[float, Optional[Principal]]]" = OrderedDict()
+_PRINCIPALS_LOCK = Lock()
+
 
 def login_required(f):
     """Декоратор: требует авторизации пользователя."""
@@ -21,6 +50,37 @@ def login_required(f):
     return decorated_function
 
 
+def get_principal(user_id) -> Optional[Principal]:
+    """Роль и telegram_id пользователя из кеша (до PRINCIPAL_CACHE_TTL секунд устаревания), None — пользователя нет."""
+    if not user_id:
+        return None
+    now = time.time()
+    with _PRINCIPALS_LOCK:
+        entry = _PRINCIPALS.get(user_id)
+        if entry is not None and entry[0] > now:
+            _PRINCIPALS.move_to_end(user_id)
+            return entry[1]
+
+    db = SessionLocal()
+    try:
+        row = db.query(User.role, User.telegram_id).filter(User.id == user_id).first()
+    finally:
+        db.close()
+    principal = Principal(row.role, row.telegram_id) if row else None
+
+    with _PRINCIPALS_LOCK:
+        _PRINCIPALS[user_id] = (now + Config.PRINCIPAL_CACHE_TTL, principal)
+        _PRINCIPALS.move_to_end(user_id)
+        while len(_PRINCIPALS) > Config.PRINCIPAL_CACHE_MAX_ENTRIES:
+            _PRINCIPALS.popitem(last=False)
+    return principal
+
+
+def get_user_role(user_id) -> Optional[int]:
+    principal = get_principal(user_id)
+    return principal.role if principal else None
+
+
 def curator_required(f):
     """Декоратор: требует прав куратора (role >= 1)."""
     @wraps(f)
@@ -32,13 +92,9 @@ def curator_required(f):
             return redirect(url_for('auth.login'))
         
         # Проверяем роль
-        db = SessionLocal()
-        try:
-            user = db.query(User).filter_by(id=user_id).first()
-            if not user or user.role < ROLE_CURATOR:
-                abort(403, description="У вас недостаточно прав для доступа к этой странице")
-        finally:
-            db.close()
+        user_role = get_user_role(user_id)
+        if user_role is None or user_role < ROLE_CURATOR:
+            abort(403, description="У вас недостаточно прав для доступа к этой странице")
         
         return f(*args, **kwargs)
     return decorated_function
@@ -55,13 +111,9 @@ def admin_required(f):
             return redirect(url_for('auth.login'))
         
         # Проверяем роль
-        db = SessionLocal()
-        try:
-            user = db.query(User).filter_by(id=user_id).first()
-            if not user or user.role < ROLE_ADMIN:
-                abort(403, description="У вас недостаточно прав для доступа к этой странице")
-        finally:
-            db.close()
+        user_role = get_user_role(user_id)
+        if user_role is None or user_role < ROLE_ADMIN:
+            abort(403, description="У вас недостаточно прав для доступа к этой странице")
         
         return f(*args, **kwargs)
     return decorated_function
@@ -78,84 +130,196 @@ def get_user_by_telegram_id(telegram_id: int):
     finally:
         db.close()
 
+def _tg_get(obj, key):
+    if isinstance(obj, dict):
+        return obj.get(key)
+    return getattr(obj, key, None)
+
+
+def _ensure_telegram_users_flusher() -> None:
+    global _TG_USERS_FLUSHER
+    if _TG_USERS_FLUSHER is not None and _TG_USERS_FLUSHER.is_alive():
+        return
+
+    def _flush_loop():
+        while True:
+            time.sleep(Config.TELEGRAM_USERS_FLUSH_INTERVAL)
+            flush_telegram_users()
+
+    _TG_USERS_FLUSHER = Thread(target=_flush_loop, daemon=True)
+    _TG_USERS_FLUSHER.start()
+    atexit.register(flush_telegram_users)
+
+
 def upsert_telegram_user(tg_user) -> None:
-    """Создаёт или обновляет запись в таблице telegram_users по Telegram ID."""
-    def _tg_get(obj, key):
-        if isinstance(obj, dict):
-            return obj.get(key)
-        return getattr(obj, key, None)
+    """Запоминает данные Telegram-пользователя для таблицы telegram_users.
 
+    Не пишет в БД: если (first_name, last_name, username) не изменились с
+    прошлого раза, ничего не делает, иначе кладёт запись в буфер, который
+    фоновый поток сбрасывает одним upsert раз в TELEGRAM_USERS_FLUSH_INTERVAL.
+    Перед записью, которой нужна строка telegram_users (голос), вызывайте
+    ensure_telegram_user_saved.
+    """
     tg_user_id = _tg_get(tg_user, "id")
     if not tg_user_id:
         return
 
+    row = {
+        "id": tg_user_id,
+        "first_name": _tg_get(tg_user, "first_name"),
+        "last_name": _tg_get(tg_user, "last_name"),
+        "username": _tg_get(tg_user, "username"),
+    }
+    fingerprint = (row["first_name"], row["last_name"], row["username"])
+    with _TG_USERS_LOCK:
+        if _TG_USER_FINGERPRINTS.get(tg_user_id) == fingerprint:
+            return
+        if len(_TG_USER_FINGERPRINTS) >= Config.TELEGRAM_USERS_FINGERPRINTS_MAX:
+            _TG_USER_FINGERPRINTS.clear()
+        _TG_USER_FINGERPRINTS[tg_user_id] = fingerprint
+        _TG_USERS_PENDING[tg_user_id] = row
+        _ensure_telegram_users_flusher()
+
+
+def flush_telegram_users() -> int:
+    """Сохраняет буфер upsert_telegram_user одним INSERT ... ON CONFLICT DO UPDATE."""
+    with _TG_USERS_FLUSH_LOCK:
+        return _flush_telegram_users_locked()
+
+
+def _flush_telegram_users_locked() -> int:
+    global _TG_USERS_PENDING
+    with _TG_USERS_LOCK:
+        batch = _TG_USERS_PENDING
+        _TG_USERS_PENDING = {}
+    if not batch:
+        return 0
+
+    rows = [batch[tg_id] for tg_id in sorted(batch)]
+    stmt = insert(TelegramUser).values(rows)
+    # phone не трогаем: он приходит отдельно (CSV/импорт)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TelegramUser.id],
+        set_={
+            "first_name": stmt.excluded.first_name,
+            "last_name": stmt.excluded.last_name,
+            "username": stmt.excluded.username,
+        },
+        where=or_(
+            TelegramUser.first_name.is_distinct_from(stmt.excluded.first_name),
+            TelegramUser.last_name.is_distinct_from(stmt.excluded.last_name),
+            TelegramUser.username.is_distinct_from(stmt.excluded.username),
+        ),
+    )
     session = SessionLocal()
     try:
-        db_tg = session.get(TelegramUser, tg_user_id)
-
-        if db_tg is None:
-            # Новый пользователь
-            db_tg = TelegramUser(
-                id=tg_user_id,
-                first_name=_tg_get(tg_user, "first_name"),
-                last_name=_tg_get(tg_user, "last_name"),
-                username=_tg_get(tg_user, "username"),
-                phone=None,  # Телефон может приходить отдельно (CSV/импорт)
-            )
-            session.add(db_tg)
-        else:
-            # Обновляем, если что-то изменилось
-            changed = False
-            first_name = _tg_get(tg_user, "first_name")
-            last_name = _tg_get(tg_user, "last_name")
-            username = _tg_get(tg_user, "username")
-            if db_tg.first_name != first_name:
-                db_tg.first_name = first_name
-                changed = True
-            if db_tg.last_name != last_name:
-                db_tg.last_name = last_name
-                changed = True
-            if db_tg.username != username:
-                db_tg.username = username
-                changed = True
-            # phone не обновляем здесь
-
-            if not changed:
-                session.commit()
-                return
+        session.execute(stmt)
+        session.commit()
+        return len(rows)
+    except Exception as e:
+        session.rollback()
+        logger.error(f"Ошибка при сохранении telegram_users ({len(rows)} шт.): {e}", exc_info=True)
+        # Вернём в буфер, если за это время не пришли более свежие данные
+        with _TG_USERS_LOCK:
+            for tg_id, row in batch.items():
+                _TG_USERS_PENDING.setdefault(tg_id, row)
+        return 0
+    finally:
+        session.close()
+
 
+def ensure_telegram_user_saved(telegram_id) -> None:
+    """Гарантирует строку telegram_users перед записью, которая на неё ссылается (голос).
+
+    Пользователь в буфере upsert_telegram_user — буфер сохраняется сейчас.
+    Если этот процесс пользователя не видел (вошёл через другой воркер, чей
+    буфер мог ещё не сброситься), строка с одним id вставляется сразу;
+    имена допишет upsert того воркера.
+    """
+    with _TG_USERS_FLUSH_LOCK:
+        with _TG_USERS_LOCK:
+            pending = telegram_id in _TG_USERS_PENDING
+            known = telegram_id in _TG_USER_FINGERPRINTS
+        if pending:
+            _flush_telegram_users_locked()
+            return
+    if known:
+        return
+
+    stmt = insert(TelegramUser).values(id=telegram_id).on_conflict_do_nothing(index_elements=[TelegramUser.id])
+    session = SessionLocal()
+    try:
+        session.execute(stmt)
         session.commit()
     except Exception as e:
         session.rollback()
-        logger.error(
-            f"Ошибка при сохранении telegram_user ID={tg_user_id}: {e}",
-            exc_info=True
-        )
+        logger.error(f"Ошибка при сохранении telegram_users id={telegram_id}: {e}", exc_info=True)
+        return
     finally:
         session.close()
+    with _TG_USERS_LOCK:
+        if len(_TG_USER_FINGERPRINTS) >= Config.TELEGRAM_USERS_FINGERPRINTS_MAX:
+            _TG_USER_FINGERPRINTS.clear()
+        _TG_USER_FINGERPRINTS.setdefault(telegram_id, None)
+
+
+def _init_data_key(init_data: str) -> str:
+    return hashlib.sha256(init_data.encode()).hexdigest()
+
+
+def _get_cached_init_data(init_data: str, now_ts: float) -> Optional[Tuple[int, int, int]]:
+    key = _init_data_key(init_data)
+    with _INIT_DATA_CACHE_LOCK:
+        entry = _INIT_DATA_CACHE.get(key)
+        if entry is None:
+            return None
+        if entry[0] <= now_ts:
+            del _INIT_DATA_CACHE[key]
+            return None
+        _INIT_DATA_CACHE.move_to_end(key)
+        return entry[1:]
+
+
+def _remember_init_data(init_data: str, tg_user: dict, user_id: int, user_role: int, telegram_id: int, now_ts: float) -> None:
+    """Запоминает проверенный initData не дольше INIT_DATA_CACHE_TTL и срока годности auth_date."""
+    ttl = Config.INIT_DATA_CACHE_TTL
+    if ttl <= 0:
+        return
+    expires_at = now_ts + ttl
+    if Config.WEBAPP_INIT_DATA_MAX_AGE > 0:
+        try:
+            auth_date = int(tg_user.get("auth_date") or 0)
+        except (TypeError, ValueError):
+            return
+        expires_at = min(expires_at, auth_date + Config.WEBAPP_INIT_DATA_MAX_AGE)
+    if expires_at <= now_ts:
+        return
+    key = _init_data_key(init_data)
+    with _INIT_DATA_CACHE_LOCK:
+        _INIT_DATA_CACHE[key] = (expires_at, user_id, user_role, telegram_id)
+        _INIT_DATA_CACHE.move_to_end(key)
+        while len(_INIT_DATA_CACHE) > Config.INIT_DATA_CACHE_MAX_ENTRIES:
+            _INIT_DATA_CACHE.popitem(last=False)
 
 
 def ensure_session_user(init_data: str = ""):
     """
     Ensure session has user_id, user_role, telegram_id if possible.
     Returns dict with user, user_id, user_role, telegram_id, tg_user.
- 
+
+    Роль в сессии перечитывается раз в сутки. Проверенный initData
+    кешируется в процессе, поэтому повторные запросы Mini App с холодной
+    сессией не проверяют HMAC и не ходят в БД.
     """
 
     cache_ts = session.get("user_cache_ts")
     now_ts = int(time.time())
-    session_start_ts = Config.SESSION_START_TS
-    if (
-        not cache_ts 
-        or cache_ts < session_start_ts
-        or now_ts - cache_ts > 86400
-    ):  
+    if not cache_ts or now_ts - cache_ts > 86400:
         session.pop("user_role", None)
         session.pop("telegram_id", None)
         session["user_cache_ts"] = now_ts
         if init_data:
            session.pop("user_id", None)
-    
 
     user_id = session.get("user_id")
     user_role = session.get("user_role")
@@ -176,6 +340,23 @@ def ensure_session_user(init_data: str = ""):
             "tg_user": None,
         }
 
+    if not user_id and init_data:
+        cached = _get_cached_init_data(init_data, now_ts)
+        if cached:
+            user_id, user_role, telegram_id = cached
+            session["user_id"] = user_id
+            session["user_role"] = user_role
+            session["telegram_id"] = telegram_id
+            session["user_cache_ts"] = now_ts
+            session.permanent = True
+            return {
+                "user": None,
+                "user_id": user_id,
+                "user_role": user_role,
+                "telegram_id": telegram_id,
+                "tg_user": None,
+            }
+
     db = SessionLocal()
     try:
         if user_id:
@@ -184,7 +365,6 @@ def ensure_session_user(init_data: str = ""):
                 session.pop("user_id", None)
                 session.pop("user_role", None)
                 session.pop("telegram_id", None)
-                print(f"[DEBUG] return 2") 
                 return {
                     "user": None,
                     "user_id": None,
@@ -195,7 +375,6 @@ def ensure_session_user(init_data: str = ""):
             session["user_role"] = user.role
             session["telegram_id"] = user.telegram_id
             session["user_cache_ts"] = now_ts
-            print(f"[DEBUG] return 3") 
             return {
                 "user": user,
                 "user_id": user.id,
@@ -206,25 +385,18 @@ def ensure_session_user(init_data: str = ""):
 
         if init_data:
             tg_user = validate_webapp_init_data(init_data)
-            print(f"[DEBUG] tg_user from init_data: {tg_user}") 
             if tg_user and tg_user.get("id"):
                 telegram_id = tg_user["id"]
                 upsert_telegram_user(tg_user)
                 session["telegram_id"] = telegram_id
                 user = db.query(User).filter_by(telegram_id=telegram_id).first()
-                print(
-                    f"[DEBUG] ensure init_data:{session}, user_id:{user.id if user else None}, "
-                    f"user_role:{user.role if user else None}, telegram_id:{telegram_id}, "
-                    f"session_start_ts:{session_start_ts}, cache_ts{cache_ts}, now_ts{now_ts}, "
-                    f"init_data:{init_data}"
-                )
 
                 if user:
                     session["user_id"] = user.id
                     session["user_role"] = user.role
                     session["user_cache_ts"] = now_ts
                     session.permanent = True
-                    print(f"[DEBUG] return 4") 
+                    _remember_init_data(init_data, tg_user, user.id, user.role, telegram_id, now_ts)
                     return {
                         "user": user,
                         "user_id": user.id,
@@ -232,7 +404,6 @@ def ensure_session_user(init_data: str = ""):
                         "telegram_id": telegram_id,
                         "tg_user": tg_user,
                     }
-        print(f"[DEBUG] return 5") 
         return {
             "user": None,
             "user_id": session.get("user_id"),
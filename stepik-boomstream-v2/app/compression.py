@@ -0,0 +1,69 @@
+import gzip
+
+from flask import request
+
+from .config import Config
+
+try:
+    import brotli
+except ImportError:  # необязательная зависимость: без неё — gzip
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = {
+    "application/json",
+    "text/html",
+    "text/css",
+    "text/javascript",
+    "application/javascript",
+    "text/plain",
+}
+
+
+def _accepted_encoding() -> str:
+    accept = request.accept_encodings
+    if brotli is not None and accept["br"]:
+        return "br"
+    if accept["gzip"]:
+        return "gzip"
+    return ""
+
+
+def compress_response(response):
+    """after_request-хук: brotli или gzip для JSON/HTML; потоки и файлы не трогаем."""
+    if (
+        response.status_code < 200
+        or response.status_code >= 300
+        or response.direct_passthrough
+        or response.is_streamed
+        or "Content-Encoding" in response.headers
+        or response.mimetype not in COMPRESSIBLE_MIMETYPES
+    ):
+        return response
+
+    response.vary.add("Accept-Encoding")
+    data = response.get_data()
+    if len(data) < Config.COMPRESSION_MIN_SIZE:
+        return response
+
+    encoding = _accepted_encoding()
+    if encoding == "br":
+        compressed = brotli.compress(data, quality=Config.COMPRESSION_BROTLI_QUALITY)
+    elif encoding == "gzip":
+        compressed = gzip.compress(data, compresslevel=Config.COMPRESSION_GZIP_LEVEL)
+    else:
+        return response
+
+    response.set_data(compressed)
+    # Сжатое тело побайтово отличается от исходного: сильный ETag становится слабым
+    etag, weak = response.get_etag()
+    if etag and not weak:
+        response.set_etag(etag, weak=True)
+    response.headers["Content-Encoding"] = encoding
+    response.headers["Content-Length"] = str(len(compressed))
+    return response
+
+
+def init_compression(app) -> None:
+    if str(Config.COMPRESSION_ENABLED).lower() in ("0", "false", "no"):
+        return
+    app.after_request(compress_response)
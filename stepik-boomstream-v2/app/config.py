@@ -1,5 +1,4 @@
 import os
-import time
 import sys
 from dotenv import load_dotenv
 
@@ -29,6 +28,35 @@ class Config:
     TELEGRAM_THREAD_ID = os.getenv("TELEGRAM_THREAD_ID")
     TELEGRAM_BOT_USERNAME = os.getenv("TELEGRAM_BOT_USERNAME")
     TELEGRAM_ENABLE_FORUM_MESSAGE_TRACKING = os.getenv("TELEGRAM_ENABLE_FORUM_MESSAGE_TRACKING", "0")
+    # Клиент Telegram Bot API: таймауты (секунды), повторы при 5xx/429 и лимит сообщений в минуту на чат
+    TELEGRAM_API_CONNECT_TIMEOUT = float(os.getenv("TELEGRAM_API_CONNECT_TIMEOUT", "5"))
+    TELEGRAM_API_READ_TIMEOUT = float(os.getenv("TELEGRAM_API_READ_TIMEOUT", "15"))
+    TELEGRAM_API_MAX_RETRIES = int(os.getenv("TELEGRAM_API_MAX_RETRIES", "3"))
+    TELEGRAM_API_BACKOFF_BASE = float(os.getenv("TELEGRAM_API_BACKOFF_BASE", "1"))
+    TELEGRAM_API_MAX_RETRY_AFTER = float(os.getenv("TELEGRAM_API_MAX_RETRY_AFTER", "60"))
+    TELEGRAM_CHAT_RATE_LIMIT = int(os.getenv("TELEGRAM_CHAT_RATE_LIMIT", "20"))  # 0 — без лимита
+    # Очередь исходящих операций Telegram (таблица telegram_outbox)
+    TELEGRAM_OUTBOX_ENABLED = os.getenv("TELEGRAM_OUTBOX_ENABLED", "1")
+    TELEGRAM_OUTBOX_POLL_INTERVAL = int(os.getenv("TELEGRAM_OUTBOX_POLL_INTERVAL", "5"))  # секунды
+    TELEGRAM_OUTBOX_BATCH_SIZE = int(os.getenv("TELEGRAM_OUTBOX_BATCH_SIZE", "10"))  # чатов за проход
+    TELEGRAM_OUTBOX_MAX_ATTEMPTS = int(os.getenv("TELEGRAM_OUTBOX_MAX_ATTEMPTS", "8"))
+    # С этой попытки повторяющаяся головная задача, держащая очередь чата, пишется в лог как WARNING
+    TELEGRAM_OUTBOX_BLOCKED_WARN_ATTEMPTS = int(os.getenv("TELEGRAM_OUTBOX_BLOCKED_WARN_ATTEMPTS", "3"))
+    TELEGRAM_OUTBOX_BACKOFF_BASE = int(os.getenv("TELEGRAM_OUTBOX_BACKOFF_BASE", "15"))  # секунды
+    TELEGRAM_OUTBOX_BACKOFF_MAX = int(os.getenv("TELEGRAM_OUTBOX_BACKOFF_MAX", "1800"))
+    TELEGRAM_OUTBOX_LOCK_TIMEOUT = int(os.getenv("TELEGRAM_OUTBOX_LOCK_TIMEOUT", "600"))
+    TELEGRAM_OUTBOX_RETENTION_DAYS = int(os.getenv("TELEGRAM_OUTBOX_RETENTION_DAYS", "30"))
+    # Авторизация Mini App: срок годности initData (по auth_date) и кеш проверенных initData
+    WEBAPP_INIT_DATA_MAX_AGE = int(os.getenv("WEBAPP_INIT_DATA_MAX_AGE", "86400"))  # секунды, 0 — без ограничения
+    INIT_DATA_CACHE_TTL = int(os.getenv("INIT_DATA_CACHE_TTL", "300"))  # секунды
+    INIT_DATA_CACHE_MAX_ENTRIES = int(os.getenv("INIT_DATA_CACHE_MAX_ENTRIES", "4096"))
+    # Кеш прав (user_id -> role, telegram_id) для curator_required/admin_required и действий кураторов.
+    # Сбросов нет: смена роли в БД доходит до каждого процесса не позже чем через TTL
+    PRINCIPAL_CACHE_TTL = int(os.getenv("PRINCIPAL_CACHE_TTL", "300"))  # секунды
+    PRINCIPAL_CACHE_MAX_ENTRIES = int(os.getenv("PRINCIPAL_CACHE_MAX_ENTRIES", "10000"))
+    # Отложенная запись telegram_users (upsert_telegram_user): период сброса буфера и размер кеша отпечатков
+    TELEGRAM_USERS_FLUSH_INTERVAL = int(os.getenv("TELEGRAM_USERS_FLUSH_INTERVAL", "5"))  # секунды
+    TELEGRAM_USERS_FINGERPRINTS_MAX = int(os.getenv("TELEGRAM_USERS_FINGERPRINTS_MAX", "50000"))
 
     BOOMSTREAM_API_KEY = os.getenv("BOOM_API_KEY")
     BOOMSTREAM_CODE_SUBSCRIPTION = os.getenv("BOOM_CODE_SUBSCRIPTION")
@@ -37,8 +65,73 @@ class Config:
     # OpenAI API для генерации заголовков
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     OPENAI_EMBEDDING_MODEL = os.getenv("OPENAI_EMBEDDING_MODEL", "text-embedding-3-large")
-    SESSION_START_TS = int(time.time())
     OPENAI_EMBEDDING_DIM = os.getenv("OPENAI_EMBEDDING_DIM")
+    OPENAI_EMBEDDING_BATCH_SIZE = int(os.getenv("OPENAI_EMBEDDING_BATCH_SIZE", "256"))
+    # Источник эмбеддингов: openai | hashing (локальные n-граммы без сети — для тестов и бенчмарков).
+    # Размерность должна совпадать с колонкой question_embeddings.embedding (3072).
+    EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "openai")
+    EMBEDDING_HASHING_DIM = int(os.getenv("EMBEDDING_HASHING_DIM", "3072"))
+
+    # Поиск похожих: exact (полный перебор по vector) | hnsw (HNSW-индекс по embedding::halfvec)
+    EMBEDDING_INDEX_MODE = os.getenv("EMBEDDING_INDEX_MODE", "exact")
+    EMBEDDING_HNSW_M = int(os.getenv("EMBEDDING_HNSW_M", "16"))
+    EMBEDDING_HNSW_EF_CONSTRUCTION = int(os.getenv("EMBEDDING_HNSW_EF_CONSTRUCTION", "64"))
+    EMBEDDING_HNSW_EF_SEARCH = int(os.getenv("EMBEDDING_HNSW_EF_SEARCH", "40"))
+    # Движок поиска похожих: pgvector (запрос в БД) | numpy (матрица в памяти процесса)
+    SIMILAR_ENGINE = os.getenv("SIMILAR_ENGINE", "pgvector")
+    VECTOR_INDEX_SNAPSHOT_DIR = os.getenv("VECTOR_INDEX_SNAPSHOT_DIR", "/dev/shm/sdt_vector_index")
+    # Как часто индекс процесса сверяется с question_embeddings (эмбеддинги пишут и другие воркеры)
+    VECTOR_INDEX_SYNC_INTERVAL = int(os.getenv("VECTOR_INDEX_SYNC_INTERVAL", "30"))  # секунды
+    SIMILAR_WARMUP_BLOCK_SIZE = int(os.getenv("SIMILAR_WARMUP_BLOCK_SIZE", "512"))
+    # Проверка дублей при создании вопроса: порог косинусной близости и число кандидатов
+    DUPLICATE_SIMILARITY_THRESHOLD = float(os.getenv("DUPLICATE_SIMILARITY_THRESHOLD", "0.85"))
+    DUPLICATE_CANDIDATES_LIMIT = int(os.getenv("DUPLICATE_CANDIDATES_LIMIT", "5"))
+    # Сколько запрос (поиск, проверка дублей) ждёт эмбеддинг текста; дальше — без векторной части
+    QUERY_EMBEDDING_TIMEOUT = float(os.getenv("QUERY_EMBEDDING_TIMEOUT", "3"))  # секунды
+
+    # Фоновая очередь эмбеддингов (таблица embedding_jobs)
+    EMBEDDING_WORKER_ENABLED = os.getenv("EMBEDDING_WORKER_ENABLED", "1")
+    EMBEDDING_JOB_POLL_INTERVAL = int(os.getenv("EMBEDDING_JOB_POLL_INTERVAL", "5"))  # секунды
+    EMBEDDING_JOB_BATCH_SIZE = int(os.getenv("EMBEDDING_JOB_BATCH_SIZE", "32"))
+    EMBEDDING_JOB_MAX_ATTEMPTS = int(os.getenv("EMBEDDING_JOB_MAX_ATTEMPTS", "8"))
+    EMBEDDING_JOB_BACKOFF_BASE = int(os.getenv("EMBEDDING_JOB_BACKOFF_BASE", "30"))  # секунды
+    EMBEDDING_JOB_BACKOFF_MAX = int(os.getenv("EMBEDDING_JOB_BACKOFF_MAX", "3600"))
+    EMBEDDING_JOB_LOCK_TIMEOUT = int(os.getenv("EMBEDDING_JOB_LOCK_TIMEOUT", "600"))
+
+    # Кеш похожих вопросов: memory (в процессе) | postgres (общий для воркеров) | disk (файлы в SIMILAR_CACHE_DIR)
+    SIMILAR_CACHE_BACKEND = os.getenv("SIMILAR_CACHE_BACKEND", "memory")
+    SIMILAR_CACHE_DIR = os.getenv("SIMILAR_CACHE_DIR", "/dev/shm/sdt_similar_cache")
+    SIMILAR_CACHE_MAX_ENTRIES = int(os.getenv("SIMILAR_CACHE_MAX_ENTRIES", "5000"))
+    SIMILAR_CACHE_TTL = int(os.getenv("SIMILAR_CACHE_TTL", "86400"))  # секунды, 0 — без срока
+    # Сколько ближайших к новому эмбеддингу вопросов проверять при дополнении их списков соседей
+    SIMILAR_INCREMENTAL_CANDIDATES = int(os.getenv("SIMILAR_INCREMENTAL_CANDIDATES", "50"))
+
+    # Сжатие ответов (JSON/HTML): brotli, если установлен и поддерживается клиентом, иначе gzip
+    COMPRESSION_ENABLED = os.getenv("COMPRESSION_ENABLED", "1")
+    COMPRESSION_MIN_SIZE = int(os.getenv("COMPRESSION_MIN_SIZE", "500"))  # байты
+    COMPRESSION_GZIP_LEVEL = int(os.getenv("COMPRESSION_GZIP_LEVEL", "6"))
+    COMPRESSION_BROTLI_QUALITY = int(os.getenv("COMPRESSION_BROTLI_QUALITY", "5"))
+
+    # Сверка questions.votes_count с question_votes (триггер считает ±1)
+    VOTES_RECONCILE_INTERVAL = int(os.getenv("VOTES_RECONCILE_INTERVAL", "3600"))  # секунды, 0 — выключено
+
+    # Пакетная синхронизация голосов из Mini App (/questions/api/votes/sync)
+    VOTES_SYNC_MAX_ITEMS = int(os.getenv("VOTES_SYNC_MAX_ITEMS", "200"))
+
+    # Живые счётчики голосов в Mini App (SSE, /questions/api/votes/stream)
+    # Потоков на воркер gunicorn; gunicorn.conf.py читает ту же переменную
+    GUNICORN_THREADS = int(os.getenv("GUNICORN_THREADS", "16"))
+    # SSE-клиент занимает поток воркера целиком: под потоки голосов — не больше четверти потоков,
+    # остальные клиенты обходятся без живых счётчиков
+    VOTES_STREAM_MAX_CLIENTS = int(os.getenv("VOTES_STREAM_MAX_CLIENTS", str(max(1, GUNICORN_THREADS // 4))))  # на процесс
+    VOTES_STREAM_MAX_SECONDS = int(os.getenv("VOTES_STREAM_MAX_SECONDS", "300"))  # потом клиент переподключается
+
+    # Кеш байткода Jinja-шаблонов (общий для воркеров); пусто — без кеша
+    JINJA_BYTECODE_CACHE_DIR = os.getenv("JINJA_BYTECODE_CACHE_DIR", "/dev/shm/sdt_jinja_cache")
+
+    # Размер страницы для /questions/api/questions (keyset-пагинация)
+    QUESTIONS_PAGE_SIZE = int(os.getenv("QUESTIONS_PAGE_SIZE", "30"))
+    QUESTIONS_PAGE_SIZE_MAX = int(os.getenv("QUESTIONS_PAGE_SIZE_MAX", "100"))
     
     @classmethod
     def validate(cls):
@@ -0,0 +1,286 @@
+from datetime import datetime, timedelta
+from threading import Event, Thread
+from typing import Dict, Optional, Tuple
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from .config import Config
+from .db import SessionLocal
+from .embedding_providers import get_embedding_provider
+from .embeddings import build_question_source_texts, find_stale_question_ids, upsert_question_embeddings_batch
+from .models import EmbeddingJob
+
+# Будит воркер этого процесса сразу после сохранения; остальные процессы опрашивают очередь.
+_WAKEUP = Event()
+
+
+def enqueue_embedding_job(db, question_id: int, requeue: bool = True) -> None:
+    """Ставит пересчёт question_id в очередь в транзакции вызывающего.
+
+    На вопрос одна строка, поэтому повторные правки схлопываются. С requeue
+    существующая задача сбрасывается (attempts, backoff) и получает новый
+    enqueued_at; выполняющаяся в этот момент задача остаётся RUNNING и будет
+    взята снова после текущего прогона. Без requeue существующую задачу
+    не трогаем.
+    """
+    now = datetime.utcnow()
+    stmt = insert(EmbeddingJob).values(
+        question_id=question_id,
+        status="PENDING",
+        attempts=0,
+        run_after=now,
+        enqueued_at=now,
+    )
+    if requeue:
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[EmbeddingJob.question_id],
+            set_={
+                "status": text(
+                    "CASE WHEN embedding_jobs.status = 'RUNNING' THEN 'RUNNING' ELSE 'PENDING' END"
+                ),
+                "attempts": 0,
+                "run_after": stmt.excluded.run_after,
+                "enqueued_at": stmt.excluded.enqueued_at,
+                "last_error": None,
+            },
+        )
+    else:
+        stmt = stmt.on_conflict_do_nothing(index_elements=[EmbeddingJob.question_id])
+    db.execute(stmt)
+
+
+def notify_embedding_worker() -> None:
+    _WAKEUP.set()
+
+
+def _claim_jobs(db, limit: int) -> Dict[int, Tuple[datetime, int]]:
+    """Захватывает до limit готовых задач; возвращает {question_id: (enqueued_at, attempts)}.
+
+    SKIP LOCKED позволяет каждому воркеру gunicorn опрашивать очередь
+    самостоятельно. RUNNING-задачи с блокировкой старше
+    EMBEDDING_JOB_LOCK_TIMEOUT принадлежат упавшему процессу и перехватываются.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=Config.EMBEDDING_JOB_LOCK_TIMEOUT)
+    rows = db.execute(
+        text(
+            """
+            UPDATE embedding_jobs j
+            SET status = 'RUNNING', locked_at = :now, attempts = j.attempts + 1
+            FROM (
+                SELECT question_id
+                FROM embedding_jobs
+                WHERE (status = 'PENDING' AND run_after <= :now)
+                   OR (status = 'RUNNING' AND locked_at < :stale)
+                ORDER BY run_after
+                LIMIT :limit
+                FOR UPDATE SKIP LOCKED
+            ) picked
+            WHERE j.question_id = picked.question_id
+            RETURNING j.question_id, j.enqueued_at, j.attempts
+            """
+        ),
+        {"now": now, "stale": stale, "limit": limit},
+    ).all()
+    db.commit()
+    return {row[0]: (row[1], row[2]) for row in rows}
+
+
+def _complete_jobs(db, jobs: Dict[int, Tuple[datetime, int]]) -> None:
+    params = [{"qid": qid, "enqueued_at": enqueued_at} for qid, (enqueued_at, _) in jobs.items()]
+    db.execute(
+        text("DELETE FROM embedding_jobs WHERE question_id = :qid AND enqueued_at = :enqueued_at"),
+        params,
+    )
+    # Поставлена заново во время выполнения — отпускаем на следующий проход.
+    db.execute(
+        text(
+            "UPDATE embedding_jobs SET status = 'PENDING', locked_at = NULL "
+            "WHERE question_id = :qid AND status = 'RUNNING'"
+        ),
+        params,
+    )
+    db.commit()
+
+
+def _backoff_seconds(attempts: int) -> int:
+    return min(
+        Config.EMBEDDING_JOB_BACKOFF_BASE * 2 ** max(attempts - 1, 0),
+        Config.EMBEDDING_JOB_BACKOFF_MAX,
+    )
+
+
+def _fail_jobs(db, jobs: Dict[int, Tuple[datetime, int]], error: str) -> None:
+    now = datetime.utcnow()
+    params = [
+        {
+            "qid": qid,
+            "enqueued_at": enqueued_at,
+            "retry_at": now + timedelta(seconds=_backoff_seconds(attempts)),
+            "max_attempts": Config.EMBEDDING_JOB_MAX_ATTEMPTS,
+            "error": error[:2000],
+        }
+        for qid, (enqueued_at, attempts) in jobs.items()
+    ]
+    db.execute(
+        text(
+            """
+            UPDATE embedding_jobs
+            SET status = CASE
+                    WHEN enqueued_at <> :enqueued_at THEN 'PENDING'
+                    WHEN attempts >= :max_attempts THEN 'FAILED'
+                    ELSE 'PENDING'
+                END,
+                run_after = CASE WHEN enqueued_at <> :enqueued_at THEN run_after ELSE :retry_at END,
+                locked_at = NULL,
+                last_error = :error
+            WHERE question_id = :qid
+            """
+        ),
+        params,
+    )
+    db.commit()
+
+
+def _skip_jobs(db, jobs: Dict[int, Tuple[datetime, int]], reason: str) -> None:
+    """Конечный статус SKIPPED: строка остаётся, поэтому повторная постановка без requeue её не плодит."""
+    db.execute(
+        text(
+            "UPDATE embedding_jobs SET status = 'SKIPPED', locked_at = NULL, last_error = :reason "
+            "WHERE question_id = :qid AND enqueued_at = :enqueued_at"
+        ),
+        [
+            {"qid": qid, "enqueued_at": enqueued_at, "reason": reason}
+            for qid, (enqueued_at, _) in jobs.items()
+        ],
+    )
+    # Поставлена заново во время выполнения — отпускаем на следующий проход.
+    db.execute(
+        text(
+            "UPDATE embedding_jobs SET status = 'PENDING', locked_at = NULL "
+            "WHERE question_id = :qid AND status = 'RUNNING'"
+        ),
+        [{"qid": qid} for qid in jobs],
+    )
+    db.commit()
+
+
+def resume_skipped_jobs() -> int:
+    """Возвращает SKIPPED-задачи в очередь, когда провайдер эмбеддингов настроен."""
+    if not get_embedding_provider().is_available():
+        return 0
+    db = SessionLocal()
+    try:
+        resumed = db.execute(
+            text(
+                "UPDATE embedding_jobs SET status = 'PENDING', attempts = 0, run_after = :now, last_error = NULL "
+                "WHERE status = 'SKIPPED'"
+            ),
+            {"now": datetime.utcnow()},
+        ).rowcount
+        db.commit()
+        if resumed:
+            print(f"[EmbeddingJobs] Resumed {resumed} skipped jobs.")
+        return resumed
+    finally:
+        db.close()
+
+
+def enqueue_stale_embeddings() -> int:
+    """Ставит в очередь вопросы, чей эмбеддинг посчитан другим провайдером/моделью или по старому тексту.
+
+    source_hash включает имя провайдера и размерность, поэтому после смены
+    EMBEDDING_PROVIDER или модели пересчитываются все вопросы, а не только
+    отредактированные. Существующие задачи не трогаем.
+    """
+    if not get_embedding_provider().is_available():
+        return 0
+    db = SessionLocal()
+    try:
+        stale_ids = find_stale_question_ids(db, build_question_source_texts(db))
+        for question_id in stale_ids:
+            enqueue_embedding_job(db, question_id, requeue=False)
+        db.commit()
+        if stale_ids:
+            print(f"[EmbeddingJobs] Queued {len(stale_ids)} stale embeddings.")
+        return len(stale_ids)
+    finally:
+        db.close()
+
+
+def process_embedding_jobs(limit: Optional[int] = None) -> int:
+    """Выполняет одну пачку задач: эмбеддинги одним вызовом API, затем соседи.
+
+    Возвращает число захваченных задач.
+    """
+    from .similar_cache import refresh_similar_cache
+    from .vector_index import is_numpy_engine_enabled, sync_vector_index
+
+    db = SessionLocal()
+    try:
+        jobs = _claim_jobs(db, limit or Config.EMBEDDING_JOB_BATCH_SIZE)
+        if not jobs:
+            return 0
+
+        if not get_embedding_provider().is_available():
+            _skip_jobs(db, jobs, "Embedding provider is not configured")
+            print(f"[EmbeddingJobs] No embedding provider, skipped {len(jobs)} jobs.")
+            return len(jobs)
+
+        try:
+            source_texts = build_question_source_texts(db, jobs.keys())
+            updated = upsert_question_embeddings_batch(db, source_texts)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"[EmbeddingJobs] Batch of {len(jobs)} failed: {e}")
+            _fail_jobs(db, jobs, str(e))
+            return len(jobs)
+
+        if updated and is_numpy_engine_enabled():
+            try:
+                sync_vector_index(db, write_snapshot=True)
+            except Exception as e:
+                db.rollback()
+                print(f"[EmbeddingJobs] Vector index sync failed: {e}")
+
+        for question_id in source_texts:
+            try:
+                refresh_similar_cache(question_id)
+            except Exception as e:
+                print(f"[EmbeddingJobs] Similar refresh failed for question {question_id}: {e}")
+
+        _complete_jobs(db, jobs)
+        print(f"[EmbeddingJobs] Processed {len(jobs)} jobs, {updated} embeddings updated.")
+        return len(jobs)
+    finally:
+        db.close()
+
+
+def run_embedding_worker() -> None:
+    try:
+        resume_skipped_jobs()
+    except Exception as e:
+        print(f"[EmbeddingJobs] Resume failed: {e}")
+    try:
+        enqueue_stale_embeddings()
+    except Exception as e:
+        print(f"[EmbeddingJobs] Stale embeddings check failed: {e}")
+    while True:
+        try:
+            processed = process_embedding_jobs()
+        except Exception as e:
+            print(f"[EmbeddingJobs] Error: {e}")
+            processed = 0
+        if processed:
+            continue
+        _WAKEUP.wait(Config.EMBEDDING_JOB_POLL_INTERVAL)
+        _WAKEUP.clear()
+
+
+def start_embedding_worker() -> None:
+    if str(Config.EMBEDDING_WORKER_ENABLED).lower() in ("0", "false", "no"):
+        print("[EmbeddingJobs] Worker disabled.")
+        return
+    Thread(target=run_embedding_worker, daemon=True).start()
@@ -0,0 +1,154 @@
+from collections import Counter
+from threading import Lock
+from typing import Iterable, List, Optional, Sequence
+import hashlib
+import math
+import re
+
+import numpy as np
+from openai import OpenAI
+
+from .config import Config
+
+
+class EmbeddingProvider:
+    """Turns texts into fixed-size vectors.
+
+    name and dims go into the similar-cache version stamp, so switching
+    providers invalidates cached neighbour lists and vector snapshots.
+    """
+
+    name = ""
+    dims = 0
+
+    def is_available(self) -> bool:
+        return True
+
+    def embed(self, texts: Sequence[str]) -> List[list]:
+        raise NotImplementedError
+
+
+class OpenAIEmbeddingProvider(EmbeddingProvider):
+    def __init__(self, model: str, dims: int, api_key: Optional[str], batch_size: int = 256) -> None:
+        self.name = model
+        self.dims = dims
+        self.api_key = api_key
+        self.batch_size = max(1, batch_size)
+        self._client: Optional[OpenAI] = None
+        self._lock = Lock()
+
+    def is_available(self) -> bool:
+        return bool(self.api_key)
+
+    def get_client(self) -> Optional[OpenAI]:
+        """Shared client so HTTP connections are reused between embedding calls."""
+        if not self.api_key:
+            return None
+        with self._lock:
+            if self._client is None:
+                self._client = OpenAI(api_key=self.api_key)
+            return self._client
+
+    def embed(self, texts: Sequence[str]) -> List[list]:
+        client = self.get_client()
+        vectors: List[list] = []
+        for start in range(0, len(texts), self.batch_size):
+            chunk = list(texts[start:start + self.batch_size])
+            response = client.embeddings.create(model=self.name, input=chunk)
+            chunk_vectors: List[Optional[list]] = [None] * len(chunk)
+            for item in response.data:
+                chunk_vectors[item.index] = item.embedding
+            vectors.extend(chunk_vectors)
+        return vectors
+
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+class HashingEmbeddingProvider(EmbeddingProvider):
+    """Local, deterministic embeddings: hashed word, word-bigram and char n-gram TF.
+
+    Each feature is hashed (blake2b) into one of dims buckets with a hash
+    derived sign; counts are weighted 1 + log(tf) and the vector is
+    L2-normalized. No network and no corpus statistics, so the same text
+    always gives the same vector, which is what tests and benchmarks need.
+    Quality is far below a real model but similar wording still lands close.
+    """
+
+    def __init__(self, dims: int, char_ngrams: Iterable[int] = (3, 4)) -> None:
+        self.dims = dims
+        self.char_ngrams = tuple(char_ngrams)
+        self.name = f"hashing-ngram-v1-c{''.join(str(n) for n in self.char_ngrams)}"
+
+    def _features(self, text: str) -> Counter:
+        words = _TOKEN_RE.findall(text.lower())
+        features: Counter = Counter()
+        for word in words:
+            features["w:" + word] += 1
+            padded = f" {word} "
+            for n in self.char_ngrams:
+                for i in range(len(padded) - n + 1):
+                    features["c:" + padded[i:i + n]] += 1
+        for left, right in zip(words, words[1:]):
+            features["b:" + left + " " + right] += 1
+        return features
+
+    def _embed_one(self, text: str) -> list:
+        vector = np.zeros(self.dims, dtype=np.float32)
+        for feature, count in self._features(text).items():
+            h = int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "little")
+            sign = 1.0 if h >> 63 else -1.0
+            vector[h % self.dims] += sign * (1.0 + math.log(count))
+        norm = np.linalg.norm(vector)
+        if norm:
+            vector /= norm
+        return vector.tolist()
+
+    def embed(self, texts: Sequence[str]) -> List[list]:
+        return [self._embed_one(text) for text in texts]
+
+
+def _openai_model_and_dims():
+    model = getattr(Config, "OPENAI_EMBEDDING_MODEL", None) or "text-embedding-3-large"
+    dims_value = getattr(Config, "OPENAI_EMBEDDING_DIM", None)
+    if dims_value:
+        return model, int(dims_value)
+    if model.endswith("small"):
+        return model, 1536
+    if model.endswith("large"):
+        return model, 3072
+    return model, 3072
+
+
+def create_embedding_provider(name: Optional[str] = None) -> EmbeddingProvider:
+    name = (name or getattr(Config, "EMBEDDING_PROVIDER", "") or "openai").lower()
+    if name == "hashing":
+        return HashingEmbeddingProvider(int(getattr(Config, "EMBEDDING_HASHING_DIM", 3072)))
+    if name != "openai":
+        print(f"[Embedding] Unknown EMBEDDING_PROVIDER={name!r}, using openai.")
+    model, dims = _openai_model_and_dims()
+    return OpenAIEmbeddingProvider(
+        model,
+        dims,
+        Config.OPENAI_API_KEY,
+        getattr(Config, "OPENAI_EMBEDDING_BATCH_SIZE", 256),
+    )
+
+
+_PROVIDER: Optional[EmbeddingProvider] = None
+_PROVIDER_LOCK = Lock()
+
+
+def get_embedding_provider() -> EmbeddingProvider:
+    global _PROVIDER
+    with _PROVIDER_LOCK:
+        if _PROVIDER is None:
+            _PROVIDER = create_embedding_provider()
+        return _PROVIDER
+
+
+def set_embedding_provider(provider: Optional[EmbeddingProvider]) -> None:
+    """Swap the process-wide provider (benchmarks); None re-reads Config."""
+    global _PROVIDER
+    with _PROVIDER_LOCK:
+        _PROVIDER = provider
@@ -1,23 +1,16 @@
 from datetime import datetime
-from typing import Iterable, Optional, Tuple
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+import hashlib
 
-from openai import OpenAI
 from sqlalchemy.orm import Session
 
-from .config import Config
-from .models import Question, QuestionEmbedding, StepikModule
+from .embedding_providers import get_embedding_provider
+from .models import Question, QuestionAnswer, QuestionEmbedding, QuestionStepikModule, StepikModule
 
 
 def get_embedding_model_and_dims() -> Tuple[str, int]:
-    model = getattr(Config, "OPENAI_EMBEDDING_MODEL", None) or "text-embedding-3-large"
-    dims_value = getattr(Config, "OPENAI_EMBEDDING_DIM", None)
-    if dims_value:
-        return model, int(dims_value)
-    if model.endswith("small"):
-        return model, 1536
-    if model.endswith("large"):
-        return model, 3072
-    return model, 3072
+    provider = get_embedding_provider()
+    return provider.name, provider.dims
 
 
 def build_question_source_text(
@@ -37,13 +30,99 @@ def build_question_source_text(
     return "\n".join(parts).strip()
 
 
+def build_question_source_texts(db: Session, question_ids: Optional[Iterable[int]] = None) -> Dict[int, str]:
+    """Source texts for many questions (all when question_ids is None) in three queries."""
+    questions_query = db.query(Question)
+    links_query = (
+        db.query(QuestionStepikModule.question_id, StepikModule)
+        .join(StepikModule, StepikModule.id == QuestionStepikModule.module_id)
+        .order_by(StepikModule.position)
+    )
+    answers_query = db.query(QuestionAnswer.question_id, QuestionAnswer.summary)
+    if question_ids is not None:
+        question_ids = list(question_ids)
+        questions_query = questions_query.filter(Question.id.in_(question_ids))
+        links_query = links_query.filter(QuestionStepikModule.question_id.in_(question_ids))
+        answers_query = answers_query.filter(QuestionAnswer.question_id.in_(question_ids))
+
+    modules_by_qid: Dict[int, List[StepikModule]] = {}
+    for question_id, module in links_query.all():
+        modules_by_qid.setdefault(question_id, []).append(module)
+    summaries = {question_id: summary for question_id, summary in answers_query.all() if summary}
+
+    return {
+        question.id: build_question_source_text(
+            question, modules_by_qid.get(question.id, []), summaries.get(question.id)
+        )
+        for question in questions_query.all()
+    }
+
+
+def source_text_hash(source_text: str) -> str:
+    """sha256 of the text together with the provider name (model) and dims.
+
+    Switching EMBEDDING_PROVIDER or the model/dims changes every hash, so
+    unchanged questions are re-embedded instead of keeping vectors from
+    another space.
+    """
+    model, dims = get_embedding_model_and_dims()
+    return hashlib.sha256(f"{model}:{dims}\n{source_text}".encode("utf-8")).hexdigest()
+
+
+def find_stale_question_ids(db: Session, source_texts: Dict[int, str]) -> List[int]:
+    """Questions whose stored source_hash differs from the current one (or is missing)."""
+    if not source_texts:
+        return []
+    stored_hashes = dict(
+        db.query(QuestionEmbedding.question_id, QuestionEmbedding.source_hash)
+        .filter(QuestionEmbedding.question_id.in_(list(source_texts)))
+        .all()
+    )
+    return [
+        question_id
+        for question_id, source_text in source_texts.items()
+        if stored_hashes.get(question_id) != source_text_hash(source_text)
+    ]
+
+
 def generate_embedding(text: str) -> Optional[list]:
-    if not Config.OPENAI_API_KEY:
+    embeddings = generate_embeddings([text])
+    return embeddings[0] if embeddings else None
+
+
+def generate_embeddings(texts: Sequence[str]) -> Optional[List[list]]:
+    """Embed many texts with the configured provider; result order matches texts.
+
+    Returns None when the provider is not configured (no API key).
+    """
+    provider = get_embedding_provider()
+    if not provider.is_available():
         return None
-    model, _ = get_embedding_model_and_dims()
-    client = OpenAI(api_key=Config.OPENAI_API_KEY)
-    response = client.embeddings.create(model=model, input=text)
-    return response.data[0].embedding
+    if not texts:
+        return []
+
+    # Identical texts are embedded once.
+    unique_texts = list(dict.fromkeys(texts))
+    vectors = dict(zip(unique_texts, provider.embed(unique_texts)))
+    return [vectors[text] for text in texts]
+
+
+def _save_embedding(db: Session, existing, question_id: int, embedding, source_text: str) -> None:
+    if existing:
+        existing.embedding = embedding
+        existing.source_text = source_text
+        existing.source_hash = source_text_hash(source_text)
+        existing.updated_at = datetime.utcnow()
+    else:
+        db.add(
+            QuestionEmbedding(
+                question_id=question_id,
+                embedding=embedding,
+                source_text=source_text,
+                source_hash=source_text_hash(source_text),
+                updated_at=datetime.utcnow(),
+            )
+        )
 
 
 def upsert_question_embedding(
@@ -58,24 +137,44 @@ def upsert_question_embedding(
         .filter(QuestionEmbedding.question_id == question.id)
         .first()
     )
-    if existing and existing.source_text == source_text:
+    if existing and existing.source_hash == source_text_hash(source_text):
         return False
 
     embedding = generate_embedding(source_text)
     if embedding is None:
         return False
 
-    if existing:
-        existing.embedding = embedding
-        existing.source_text = source_text
-        existing.updated_at = datetime.utcnow()
-    else:
-        db.add(
-            QuestionEmbedding(
-                question_id=question.id,
-                embedding=embedding,
-                source_text=source_text,
-                updated_at=datetime.utcnow(),
-            )
-        )
+    _save_embedding(db, existing, question.id, embedding, source_text)
     return True
+
+
+def upsert_question_embeddings_batch(
+    db: Session,
+    source_texts: Dict[int, str],
+) -> int:
+    """Embed {question_id: source_text} in chunked requests, skipping unchanged texts.
+
+    A text is unchanged when source_text_hash (text + provider and dims)
+    matches the stored source_hash. Returns the number of embeddings written
+    (caller commits).
+    """
+    changed = {
+        question_id: source_texts[question_id]
+        for question_id in find_stale_question_ids(db, source_texts)
+    }
+    if not changed:
+        return 0
+
+    question_ids = list(changed)
+    embeddings = generate_embeddings([changed[qid] for qid in question_ids])
+    if embeddings is None:
+        return 0
+    existing_by_qid = {
+        row.question_id: row
+        for row in db.query(QuestionEmbedding)
+        .filter(QuestionEmbedding.question_id.in_(question_ids))
+        .all()
+    }
+    for question_id, embedding in zip(question_ids, embeddings):
+        _save_embedding(db, existing_by_qid.get(question_id), question_id, embedding, changed[question_id])
+    return len(question_ids)
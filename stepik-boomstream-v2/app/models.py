@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, UniqueConstraint, BigInteger, Text, Boolean, Index, JSON
+from sqlalchemy import Column, Integer, String, ForeignKey, DateTime, UniqueConstraint, BigInteger, Text, Boolean, Index, JSON, Float
+from sqlalchemy.dialects.postgresql import ARRAY, TSVECTOR
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from .db import Base
@@ -198,12 +199,65 @@ class Question(Base):
         return f"<Question id={self.id} status={self.status} title={self.title[:30] if self.title else 'Untitled'}>"
 
 
+class QuestionCard(Base):
+    """Денормализованная карточка вопроса для списков.
+
+    Заполняется только триггерами из migrations/add_question_cards.sql —
+    из приложения в неё не пишем.
+    """
+    __tablename__ = "question_cards"
+
+    question_id = Column(Integer, ForeignKey('questions.id', ondelete='CASCADE'), primary_key=True)
+    title = Column(String(200), nullable=True)
+    # Первые 300 символов текста — как в HTML-списке; /questions/api/questions раньше отдавал 250
+    body_preview = Column(Text, nullable=False)
+    status = Column(String(20), nullable=False)
+    status_label = Column(String(50), nullable=False)
+    votes_count = Column(Integer, default=0, nullable=False)
+    created_at = Column(DateTime, nullable=False)
+    posted_at = Column(DateTime, nullable=True)
+
+    # Модули в порядке position: id для фильтра, JSON для отображения
+    module_ids = Column(ARRAY(Integer), nullable=False, server_default="{}")
+    modules = Column(JSON, nullable=False, server_default="[]")
+    # Пример: [{"id": 561993, "title": "...", "short_title": "Раздел 1", "position": 1}]
+
+    summary = Column(String(500), nullable=True)
+    telegram_link = Column(String, nullable=True)
+    messages_count = Column(Integer, default=0, nullable=False)
+    close_at = Column(DateTime, nullable=True)
+
+    # Документ поиска: заголовок, текст, резюме и ответ (tsvector 'russian' + pg_trgm по search_text)
+    search_text = Column(Text, nullable=False, server_default="")
+    search_vector = Column(TSVECTOR, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('idx_question_cards_module_ids', 'module_ids', postgresql_using='gin'),
+        Index('idx_question_cards_search_vector', 'search_vector', postgresql_using='gin'),
+        # GIN-индекс pg_trgm по search_text создаётся в migrations/add_question_cards.sql
+    )
+
+    def __repr__(self):
+        return f"<QuestionCard question_id={self.question_id} status={self.status}>"
+
+
+# Keyset-индексы списков: те же имена и направления (DESC), что в migrations/add_question_cards.sql
+Index(
+    'idx_question_cards_votes_created_id_desc',
+    QuestionCard.votes_count.desc(), QuestionCard.created_at.desc(), QuestionCard.question_id.desc(),
+)
+Index('idx_question_cards_created_id_desc', QuestionCard.created_at.desc(), QuestionCard.question_id.desc())
+
+
 class QuestionEmbedding(Base):
     __tablename__ = "question_embeddings"
 
     question_id = Column(Integer, ForeignKey('questions.id', ondelete='CASCADE'), primary_key=True)
+    # В режиме EMBEDDING_INDEX_MODE=hnsw по embedding::halfvec строится индекс (utils/ensure_embedding_index.py)
     embedding = Column(Vector(3072), nullable=False)
     source_text = Column(Text, nullable=False)
+    source_hash = Column(String(64), nullable=True)  # sha256(провайдер:dims + source_text), чтобы не пересчитывать без изменений
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
     question = relationship("Question", back_populates="embedding")
@@ -212,6 +266,79 @@ class QuestionEmbedding(Base):
         return f"<QuestionEmbedding question_id={self.question_id} updated_at={self.updated_at}>"
 
 
+class SimilarQuestionsCache(Base):
+    """Общий для всех воркеров кеш похожих вопросов (бэкенд postgres в similar_cache)."""
+    __tablename__ = "similar_questions_cache"
+
+    question_id = Column(Integer, ForeignKey('questions.id', ondelete='CASCADE'), primary_key=True)
+    similar_ids = Column(ARRAY(Integer), nullable=False, server_default="{}")
+    # Косинусные расстояния до similar_ids (по возрастанию); NULL — список подобран по модулям
+    similar_distances = Column(ARRAY(Float), nullable=True)
+    computed_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Версия расчёта (модель и размерность эмбеддингов); записи другой версии считаются устаревшими
+    version = Column(String(100), nullable=False)
+
+    __table_args__ = (
+        Index('idx_similar_questions_cache_similar_ids', 'similar_ids', postgresql_using='gin'),
+    )
+
+    def __repr__(self):
+        return f"<SimilarQuestionsCache question_id={self.question_id} similar_ids={self.similar_ids}>"
+
+
+class EmbeddingJob(Base):
+    """Очередь пересчёта эмбеддингов: одна строка на вопрос, повторные правки схлопываются."""
+    __tablename__ = "embedding_jobs"
+
+    question_id = Column(Integer, ForeignKey('questions.id', ondelete='CASCADE'), primary_key=True)
+    # PENDING / RUNNING / FAILED / SKIPPED (нет провайдера эмбеддингов; снова PENDING при его появлении)
+    status = Column(String(20), nullable=False, default="PENDING")
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime, default=datetime.utcnow, nullable=False)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    # Меняется при каждой постановке в очередь; воркер удаляет задачу, только если она не менялась
+    enqueued_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('idx_embedding_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+    def __repr__(self):
+        return f"<EmbeddingJob question_id={self.question_id} status={self.status} attempts={self.attempts}>"
+
+
+class TelegramOutbox(Base):
+    """Исходящие операции Telegram (публикация, закрытие, архивирование темы).
+
+    Выполняются фоновым отправителем по порядку внутри чата; idempotency_key
+    не даёт поставить одну операцию дважды, в state сохраняются уже
+    выполненные шаги, чтобы повтор после ошибки не дублировал сообщения.
+    """
+    __tablename__ = "telegram_outbox"
+
+    id = Column(BigInteger, primary_key=True)
+    idempotency_key = Column(String(200), unique=True, nullable=False)
+    chat_id = Column(BigInteger, nullable=False)
+    operation = Column(String(50), nullable=False)
+    payload = Column(JSON, nullable=False, server_default="{}")
+    state = Column(JSON, nullable=False, server_default="{}")
+    status = Column(String(20), nullable=False, default="PENDING")  # PENDING / RUNNING / DONE / FAILED
+    attempts = Column(Integer, nullable=False, default=0)
+    run_after = Column(DateTime, default=datetime.utcnow, nullable=False)
+    locked_at = Column(DateTime, nullable=True)
+    last_error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    completed_at = Column(DateTime, nullable=True)
+
+    __table_args__ = (
+        Index('idx_telegram_outbox_chat_status_id', 'chat_id', 'status', 'id'),
+    )
+
+    def __repr__(self):
+        return f"<TelegramOutbox id={self.id} {self.operation} status={self.status} attempts={self.attempts}>"
+
+
 class QuestionStepikModule(Base):
     """Many-to-Many связь между вопросами и модулями Stepik (темами курса)."""
     __tablename__ = "question_stepik_modules"
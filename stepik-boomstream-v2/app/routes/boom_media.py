@@ -1,4 +1,4 @@
-from flask import Blueprint, redirect, render_template_string, request
+from flask import Blueprint, redirect, render_template, request
 
 import urllib.parse
 
@@ -11,44 +11,7 @@ boom_media_bp = Blueprint("boom_media", __name__, url_prefix="/boom")
 
 @boom_media_bp.route("/miniapp", methods=["GET"])
 def miniapp():
-    return render_template_string(
-        """\
-        <!doctype html>
-        <html lang="ru">
-        <head>
-          <meta charset="utf-8">
-          <meta name="viewport" content="width=device-width, initial-scale=1.0">
-          <title>Открываем видео...</title>
-        </head>
-        <body>
-          <script src="https://telegram.org/js/telegram-web-app.js"></script>
-          <script>
-            (function() {
-              if (!(window.Telegram && Telegram.WebApp)) {
-                document.body.textContent = 'Нет данных авторизации Telegram.';
-                return;
-              }
-              const initData = Telegram.WebApp.initData || '';
-              const startParam = Telegram.WebApp.initDataUnsafe?.start_param || '';
-              let media = '';
-              if (startParam.startsWith('boom_')) {
-                media = startParam.slice('boom_'.length);
-              } else {
-                const urlParams = new URLSearchParams(window.location.search);
-                media = urlParams.get('media') || '';
-              }
-              if (!initData || !media) {
-                document.body.textContent = 'Нет данных для открытия видео.';
-                return;
-              }
-              const url = `/boom/go?tg_init_data=${encodeURIComponent(initData)}&media=${encodeURIComponent(media)}`;
-              window.location.replace(url);
-            })();
-          </script>
-        </body>
-        </html>
-        """
-    )
+    return render_template("boom_media/miniapp.html")
 
 
 @boom_media_bp.route("/go", methods=["GET"])
@@ -58,34 +21,7 @@ def go_boom():
         init_data = urllib.parse.unquote(init_data)
 
     if not init_data:
-        return render_template_string(
-            """\
-            <!doctype html>
-            <html lang="ru">
-            <head>
-              <meta charset="utf-8">
-              <meta name="viewport" content="width=device-width, initial-scale=1.0">
-              <title>Открываем видео...</title>
-            </head>
-            <body>
-              <script src="https://telegram.org/js/telegram-web-app.js"></script>
-              <script>
-                (function() {
-                  if (window.Telegram && Telegram.WebApp) {
-                    const initData = Telegram.WebApp.initData || '';
-                    if (initData) {
-                      const url = `/boom/go?tg_init_data=${encodeURIComponent(initData)}`;
-                      window.location.replace(url);
-                      return;
-                    }
-                  }
-                  document.body.textContent = 'Нет данных авторизации Telegram.';
-                })();
-              </script>
-            </body>
-            </html>
-            """
-        )
+        return render_template("boom_media/go.html")
 
     media = request.args.get("media")
     if not media:
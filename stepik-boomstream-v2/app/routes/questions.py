@@ -1,26 +1,43 @@
 import token
-from flask import Blueprint, session, redirect, render_template, render_template_string, request, jsonify, url_for
-from sqlalchemy import func, exists, Integer, Boolean, case
+from flask import Blueprint, current_app, session, redirect, render_template, request, jsonify, url_for
+from sqlalchemy import func, exists, Integer, Boolean, case, tuple_, text
 from sqlalchemy.orm import aliased
 from datetime import datetime, timedelta
+from types import SimpleNamespace
+import base64
+import hashlib
+import json
 import urllib.parse
 from ..db import SessionLocal
-from ..models import Question, QuestionVote, QuestionStepikModule, StepikModule, TelegramUser, QuestionAnswer, TelegramTopic, User, QuestionEmbedding
+from ..models import Question, QuestionVote, QuestionStepikModule, StepikModule, TelegramUser, QuestionAnswer, TelegramTopic, QuestionEmbedding, QuestionCard
 from ..config import Config
-from ..auth import ensure_session_user
-from ..embeddings import upsert_question_embedding
+from ..auth import ensure_session_user, ensure_telegram_user_saved, get_principal, get_user_role
+from ..embedding_jobs import enqueue_embedding_job, notify_embedding_worker
+from ..embeddings import build_question_source_text
+from ..telegram_outbox import (
+    OutboxPermanentError,
+    enqueue_telegram_operation,
+    has_pending_telegram_operation,
+    next_idempotency_key,
+    notify_telegram_sender,
+    outbox_handler,
+)
 from ..telegram_service import (
-    post_forum_topic_with_message,
+    create_forum_topic,
+    topic_opening_text,
     send_message,
     close_forum_topic,
+    reopen_forum_topic,
     pin_notice_message,
     unpin_notice_message,
     edit_notice_reply_markup,
     get_topic_link,
 )
-from ..similar_cache import get_or_compute_similar_ids, refresh_similar_cache_async
+from ..search import get_text_embedding, search_question_ids
+from ..vote_stream import get_vote_broadcaster, stream_vote_events
+from ..similar_cache import find_near_duplicates, get_or_compute_similar_ids, invalidate_similar_cache
+from ..vector_index import remove_from_vector_index
 from openai import OpenAI
-import requests
 
 questions_bp = Blueprint("questions", __name__, url_prefix="/questions")
 
@@ -37,555 +54,6 @@ def generate_title_api():
   except Exception as e:
     return jsonify({"success": False, "error": str(e)}), 500
 
- 
-# ============================================================================
-# HTML TEMPLATE
-# ============================================================================
-
-QUESTIONS_PAGE_TEMPLATE = """
-<!doctype html>
-<html lang="ru">
-<head>
-  <meta charset="utf-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1.0">
-  <title>📚 Вопросы курса</title>
-  <style>
-    * { box-sizing: border-box; margin: 0; padding: 0; }
-    
-    body {
-      font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-      background: #f5f5f5;
-      color: #333;
-      line-height: 1.6;
-      padding-bottom: 40px;
-    }
-    
-    .header {
-      background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-      color: white;
-      padding: 20px;
-      box-shadow: 0 2px 8px rgba(0,0,0,0.1);
-    }
-    
-    .header h1 {
-      font-size: 24px;
-      margin-bottom: 10px;
-    }
-    
-    .header .subtitle {
-      opacity: 0.9;
-      font-size: 14px;
-    }
-    
-    .container {
-      max-width: 900px;
-      margin: 0 auto;
-      padding: 20px;
-    }
-    
-    /* Фильтры */
-    .filters {
-      background: white;
-      border-radius: 12px;
-      padding: 20px;
-      margin-bottom: 20px;
-      box-shadow: 0 2px 8px rgba(0,0,0,0.05);
-    }
-    
-    .filter-row {
-      margin-bottom: 15px;
-    }
-    
-    .filter-row:last-child {
-      margin-bottom: 0;
-    }
-    
-    .filter-label {
-      font-weight: 600;
-      font-size: 13px;
-      color: #666;
-      margin-bottom: 8px;
-      display: block;
-    }
-    
-    .filter-buttons {
-      display: flex;
-      flex-wrap: wrap;
-      gap: 8px;
-    }
-    
-    .filter-btn {
-      padding: 6px 12px;
-      border: 1px solid #e0e0e0;
-      background: white;
-      border-radius: 16px;
-      cursor: pointer;
-      font-size: 13px;
-      transition: all 0.2s;
-      text-decoration: none;
-      color: #333;
-      display: inline-block;
-    }
-    
-    .filter-btn:hover {
-      border-color: #667eea;
-      color: #667eea;
-    }
-    
-    .filter-btn.active {
-      background: #667eea;
-      color: white;
-      border-color: #667eea;
-    }
-    
-    /* Карточки вопросов */
-    .questions-list {
-      display: flex;
-      flex-direction: column;
-      gap: 16px;
-    }
-    
-    .question-card {
-      background: white;
-      border-radius: 12px;
-      padding: 20px;
-      box-shadow: 0 2px 8px rgba(0,0,0,0.05);
-      transition: transform 0.2s, box-shadow 0.2s;
-    }
-    
-    .question-card:hover {
-      transform: translateY(-2px);
-      box-shadow: 0 4px 16px rgba(0,0,0,0.1);
-    }
-    
-    .question-header {
-      display: flex;
-      justify-content: space-between;
-      align-items: flex-start;
-      margin-bottom: 12px;
-      gap: 12px;
-    }
-    
-    .question-header-left {
-      flex: 1;
-      min-width: 0;
-    }
-    
-    .question-header-right {
-      display: flex;
-      align-items: center;
-      gap: 8px;
-      flex-shrink: 0;
-    }
-    
-    .question-modules {
-      display: flex;
-      flex-wrap: wrap;
-      gap: 6px;
-      margin-bottom: 8px;
-    }
-    
-    .module-badge {
-      background: #e3f2fd;
-      color: #1976d2;
-      padding: 4px 10px;
-      border-radius: 12px;
-      font-size: 12px;
-      font-weight: 500;
-      cursor: pointer;
-      transition: all 0.2s;
-      text-decoration: none;
-      display: inline-block;
-    }
-    
-    .module-badge:hover {
-      background: #1976d2;
-      color: white;
-      transform: translateY(-1px);
-    }
-    
-    .status-badge {
-      padding: 4px 12px;
-      border-radius: 12px;
-      font-size: 12px;
-      font-weight: 600;
-      white-space: nowrap;
-      cursor: pointer;
-      transition: all 0.2s;
-      text-decoration: none;
-      display: inline-block;
-    }
-    
-    .status-badge:hover {
-      transform: translateY(-1px);
-      opacity: 0.8;
-    }
-    
-    .status-voting { background: #fff3e0; color: #f57c00; }
-    .status-scheduled { background: #e1f5fe; color: #0288d1; }
-    .status-posted { background: #e8f5e9; color: #388e3c; }
-    .status-closed { background: #f3e5f5; color: #7b1fa2; }
-    .status-archived { background: #ede7f6; color: #512da8; }
-    
-    .question-title {
-      font-size: 19px;
-      font-weight: 600;
-      color: #222;
-      margin-bottom: 8px;
-    }
-    
-    .question-body {
-      color: #555;
-      font-size: 15px;
-      line-height: 1.5;
-      margin-bottom: 12px;
-    }
-    
-    .vote-button {
-      display: flex;
-      align-items: center;
-      gap: 6px;
-      background: none;
-      border: none;
-      cursor: pointer;
-      font-size: 16px;
-      padding: 6px 12px;
-      border-radius: 20px;
-      transition: all 0.2s;
-    }
-    
-    .vote-button:hover {
-      background: #f5f5f5;
-    }
-    
-    .vote-button.voted {
-      color: #e91e63;
-    }
-    
-    .vote-button.voted .heart {
-      animation: heartbeat 0.3s;
-    }
-    
-    @keyframes heartbeat {
-      0%, 100% { transform: scale(1); }
-      50% { transform: scale(1.2); }
-    }
-    
-    .summary-block {
-      background: #f9fbe7;
-      border-left: 4px solid #9ccc65;
-      padding: 12px;
-      margin-top: 12px;
-      border-radius: 4px;
-    }
-    
-    .summary-block strong {
-      color: #558b2f;
-      display: block;
-      margin-bottom: 6px;
-    }
-    
-    .read-more-btn {
-      display: inline-block;
-      margin-top: 8px;
-      color: #558b2f;
-      text-decoration: none;
-      font-weight: 600;
-      font-size: 14px;
-    }
-    
-    .read-more-btn:hover {
-      text-decoration: underline;
-    }
-    
-    .telegram-link {
-      display: inline-block;
-      padding: 6px 12px;
-      background: #0088cc;
-      color: white;
-      text-decoration: none;
-      border-radius: 6px;
-      font-size: 13px;
-    }
-    
-    .telegram-link:hover {
-      background: #006699;
-    }
-
-    .telegram-row {
-      display: flex;
-      align-items: center;
-      gap: 10px;
-      margin-top: 8px;
-    }
-
-    .telegram-close {
-      margin-left: auto;
-      font-size: 13px;
-      color: #6b7280;
-      white-space: nowrap;
-    }
-    
-    .empty-state {
-      text-align: center;
-      padding: 60px 20px;
-      color: #999;
-    }
-    
-    .empty-state-icon {
-      font-size: 64px;
-      margin-bottom: 16px;
-    }
-    
-    .edit-btn {
-      display: inline-flex;
-      align-items: center;
-      justify-content: center;
-      width: 28px;
-      height: 28px;
-      background: #667eea;
-      color: white;
-      text-decoration: none;
-      border-radius: 50%;
-      font-size: 14px;
-      transition: all 0.2s;
-      margin-right: 8px;
-    }
-    
-    .edit-btn:hover {
-      background: #5568d3;
-      transform: scale(1.1);
-    }
-    
-    .add-question-btn {
-      display: block;
-      width: fit-content;
-      margin: 20px auto;
-      padding: 12px 30px;
-      background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
-      color: white;
-      text-decoration: none;
-      border-radius: 8px;
-      font-size: 16px;
-      font-weight: 600;
-      box-shadow: 0 4px 12px rgba(102, 126, 234, 0.3);
-      transition: all 0.3s;
-    }
-    
-    .add-question-btn:hover {
-      transform: translateY(-2px);
-      box-shadow: 0 6px 16px rgba(102, 126, 234, 0.4);
-    }
-    
-    /* Адаптив */
-    @media (max-width: 600px) {
-      .container { padding: 12px; }
-      .header { padding: 16px; }
-      .header h1 { font-size: 20px; }
-      .question-card { padding: 16px; }
-      .filter-buttons { font-size: 13px; }
-    }
-  </style>
-</head>
-<body>
-  <div class="header">
-    <h1>📚 Вопросы курса</h1>
-    <div class="subtitle">Голосуйте за интересные вопросы — самые популярные обсуждаются в группе</div>
-  </div>
-  
-  <div class="container">
-    <!-- Фильтры -->
-    <div class="filters">
-      <!-- Строка 1: Темы -->
-      <div class="filter-row">
-        <div class="filter-label">📌 Тема:</div>
-        <div class="filter-buttons">
-          <a href="{{ url_for('questions.list_questions', status=current_status, period=current_period) }}" 
-             class="filter-btn {% if current_topic == 'all' %}active{% endif %}">Все</a>
-          {% for module in modules %}
-            <a href="{{ url_for('questions.list_questions', topic=module.id, status=current_status, period=current_period) }}" 
-               class="filter-btn {% if current_topic == module.id|string %}active{% endif %}">
-              {{ module.title }}
-            </a>
-          {% endfor %}
-        </div>
-      </div>
-      
-      <!-- Строка 2: Статусы -->
-      <div class="filter-row">
-        <div class="filter-label">🔖 Статус:</div>
-        <div class="filter-buttons">
-          <a href="{{ url_for('questions.list_questions', topic=current_topic, period=current_period) }}" 
-             class="filter-btn {% if current_status == 'all' %}active{% endif %}">Все</a>
-          <a href="{{ url_for('questions.list_questions', topic=current_topic, status='VOTING', period=current_period) }}" 
-             class="filter-btn {% if current_status == 'VOTING' %}active{% endif %}">В голосовании</a>
-          <a href="{{ url_for('questions.list_questions', topic=current_topic, status='POSTED', period=current_period) }}" 
-             class="filter-btn {% if current_status == 'POSTED' %}active{% endif %}">В обсуждении</a>
-          <a href="{{ url_for('questions.list_questions', topic=current_topic, status='CLOSED', period=current_period) }}" 
-             class="filter-btn {% if current_status == 'CLOSED' %}active{% endif %}">Закрыто</a>
-          <a href="{{ url_for('questions.list_questions', topic=current_topic, status='ARCHIVED', period=current_period) }}" 
-             class="filter-btn {% if current_status == 'ARCHIVED' %}active{% endif %}">Архив</a>
-        </div>
-      </div>
-      
-      <!-- Строка 3: Период -->
-      <div class="filter-row">
-        <div class="filter-label">📅 Период:</div>
-        <div class="filter-buttons">
-           <a href="{{ url_for('questions.list_questions', topic=current_topic, status=current_status) }}" 
-             class="filter-btn {% if current_period == 'all' %}active{% endif %}">Все время</a>
-           <a href="{{ url_for('questions.list_questions', topic=current_topic, status=current_status, period='last30') }}" 
-             class="filter-btn {% if current_period == 'last30' %}active{% endif %}">Новые</a>
-           <a href="{{ url_for('questions.list_questions', topic=current_topic, status=current_status, period='week') }}" 
-             class="filter-btn {% if current_period == 'week' %}active{% endif %}">За неделю</a>
-           <a href="{{ url_for('questions.list_questions', topic=current_topic, status=current_status, period='month') }}" 
-             class="filter-btn {% if current_period == 'month' %}active{% endif %}">За месяц</a>
-           <a href="{{ url_for('questions.list_questions', topic=current_topic, status=current_status, period='year') }}" 
-             class="filter-btn {% if current_period == 'year' %}active{% endif %}">За год</a>
-        </div>
-      </div>
-    </div>
-    
-    <!-- Список вопросов -->
-    <div class="questions-list">
-      {% if questions %}
-        {% for q in questions %}
-          <div class="question-card">
-            <div class="question-header">
-              <div class="question-header-left">
-                <div class="question-modules">
-                  {% for module in q.modules %}
-                    <a href="{{ url_for('questions.list_questions', topic=module.id, status=current_status, period=current_period) }}" 
-                       class="module-badge">{{ module.title }}</a>
-                  {% endfor %}
-                </div>
-              </div>
-              <div class="question-header-right">
-                {% if user_role and user_role >= 1 %}
-                  <a href="{{ url_for('questions.question_detail', question_id=q.id) }}#edit" class="edit-btn">
-                    📖
-                  </a>
-                {% endif %}
-                <a href="{{ url_for('questions.list_questions', topic=current_topic, status=q.status, period=current_period) }}" 
-                   class="status-badge status-{{ q.status.lower() }}">
-                  {{ q.status_label }}
-                </a>
-                <form method="post" action="{{ url_for('questions.vote', question_id=q.id) }}" class="vote-form" style="margin: 0;">
-                  <button type="submit" class="vote-button {% if q.my_vote %}voted{% endif %}" data-question-id="{{ q.id }}">
-                    <span class="heart">{% if q.my_vote %}❤️{% else %}🤍{% endif %}</span>
-                    <span class="vote-count">{{ q.votes_count }}</span>
-                  </button>
-                </form>
-              </div>
-            </div>
-            
-            {% if q.title %}
-              <div class="question-title">{{ q.title }}</div>
-            {% endif %}
-            
-            <div class="question-body">
-              {{ q.body_preview }}
-            </div>
-            
-            <!-- Итоговый ответ для архивных вопросов -->
-            {% if q.summary %}
-              <div class="summary-block">
-                <strong>✅ Итог:</strong>
-                {{ q.summary }}
-                <a href="{{ url_for('questions.question_detail', question_id=q.id) }}" class="read-more-btn">
-                  Читать полностью →
-                </a>
-              </div>
-            {% endif %}
-            
-            <!-- Ссылка на Telegram для обсуждения -->
-            {% if q.telegram_link %}
-              <a href="{{ q.telegram_link }}" target="_blank" class="telegram-link">
-                💬 Перейти к обсуждению в Telegram ({{ q.messages_count - 1 if q.messages_count > 0 else 0 }})
-              </a>
-            {% endif %}
-          </div>
-        {% endfor %}
-      {% else %}
-        <div class="empty-state">
-          <div class="empty-state-icon">🤔</div>
-          <h3>Вопросов не найдено</h3>
-          <p>Попробуйте изменить фильтры или задайте первый вопрос!</p>
-        </div>
-      {% endif %}
-    </div>
-    
-    {% if user_role and user_role >= 1 %}
-      <a href="{{ url_for('questions.question_detail', question_id=0) }}" class="add-question-btn">
-        ➕ Добавить вопрос
-      </a>
-    {% endif %}
-  </div>
-  
-  <script>
-    // AJAX для голосования (progressive enhancement)
-    document.querySelectorAll('.vote-form').forEach(form => {
-      form.addEventListener('submit', async (e) => {
-        e.preventDefault();
-        
-        const button = form.querySelector('.vote-button');
-        const questionId = button.dataset.questionId;
-        const heart = button.querySelector('.heart');
-        const voteCount = button.querySelector('.vote-count');
-        
-        try {
-          const response = await fetch(`/questions/${questionId}/vote`, {
-            method: 'POST',
-            headers: {
-              'Content-Type': 'application/json',
-            }
-          });
-          
-          if (!response.ok) {
-            // Если ошибка авторизации - редирект на login
-            if (response.status === 401) {
-              window.location.href = '/login';
-              return;
-            }
-            throw new Error('Ошибка голосования');
-          }
-          
-          const data = await response.json();
-          
-          // Обновляем UI
-          button.classList.toggle('voted', data.liked);
-          heart.textContent = data.liked ? '❤️' : '🤍';
-          voteCount.textContent = data.votes_count;
-          
-        } catch (error) {
-          console.error('Vote error:', error);
-          // Fallback на обычную отправку формы
-          form.submit();
-        }
-      });
-    });
-    
-    // Предотвращаем переход по ссылке если она ведёт на текущую страницу
-    document.querySelectorAll('.filter-btn, .module-badge, .status-badge').forEach(link => {
-      link.addEventListener('click', (e) => {
-        const linkUrl = new URL(link.href);
-        const currentUrl = new URL(window.location.href);
-        
-        // Сравниваем pathname и параметры запроса
-        if (linkUrl.pathname === currentUrl.pathname && 
-            linkUrl.search === currentUrl.search) {
-          e.preventDefault();
-          return false;
-        }
-      });
-    });
-  </script>
-</body>
-</html>
-"""
-
-
-
 
 # ============================================================================
 # CONSTANTS
@@ -736,31 +204,193 @@ def get_period_filter(period: str):
     return None
 
 
-def build_question_card_dict(question, modules, answer, topic, my_vote):
-    summary = answer.summary if answer and getattr(answer, 'summary', None) else None
-    telegram_link = None
-    messages_count = 0
-    if topic:
-        telegram_link = f"https://t.me/c/{str(topic.chat_id)[4:]}/{topic.message_thread_id}"
-        messages_count = topic.messages_count or 0
-    body_preview = question.body[:300] + '...' if len(question.body) > 300 else question.body
+def get_questions_sort_mode(status_filter: str, period_filter: str) -> str:
+    """Режим сортировки списка вопросов (совпадает с логикой list_questions)."""
+    if status_filter == 'POSTED':
+        return 'posted'
+    if period_filter == 'last30':
+        return 'recent'
+    return 'votes'
+
+
+def get_questions_sort_columns(sort_mode: str):
+    """Колонки keyset-сортировки (все по убыванию, id — тай-брейкер)."""
+    if sort_mode == 'posted':
+        return [func.coalesce(QuestionCard.posted_at, QuestionCard.created_at), QuestionCard.question_id]
+    if sort_mode == 'recent':
+        return [QuestionCard.created_at, QuestionCard.question_id]
+    return [QuestionCard.votes_count, QuestionCard.created_at, QuestionCard.question_id]
+
+
+def get_questions_cursor_values(sort_mode: str, card) -> list:
+    """Значения ключа сортировки для последней строки страницы."""
+    if sort_mode == 'posted':
+        return [card.posted_at or card.created_at, card.question_id]
+    if sort_mode == 'recent':
+        return [card.created_at, card.question_id]
+    return [card.votes_count, card.created_at, card.question_id]
+
+
+def encode_questions_cursor(sort_mode: str, values: list) -> str:
+    """Упаковывает ключ сортировки в непрозрачный токен next_cursor."""
+    payload = [sort_mode] + [
+        v.isoformat() if isinstance(v, datetime) else v for v in values
+    ]
+    raw = json.dumps(payload, separators=(',', ':')).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_questions_cursor(cursor: str, sort_mode: str):
+    """Распаковывает next_cursor. Возвращает None, если токен битый или от другой сортировки."""
+    if not cursor:
+        return None
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        payload = json.loads(raw.decode())
+    except (ValueError, UnicodeDecodeError):
+        return None
+    if not isinstance(payload, list) or not payload or payload[0] != sort_mode:
+        return None
+    values = payload[1:]
+    expected = len(get_questions_sort_columns(sort_mode))
+    if len(values) != expected:
+        return None
+    try:
+        if sort_mode == 'votes':
+            return [int(values[0]), datetime.fromisoformat(values[1]), int(values[2])]
+        return [datetime.fromisoformat(values[0]), int(values[1])]
+    except (TypeError, ValueError):
+        return None
+
+
+def query_question_cards(db, telegram_user_id):
+    """Запрос (QuestionCard, my_vote) по проекции question_cards."""
+    if telegram_user_id:
+        my_vote_exists = exists().where(
+            QuestionVote.question_id == QuestionCard.question_id,
+            QuestionVote.telegram_user_id == telegram_user_id
+        )
+        return db.query(QuestionCard, my_vote_exists.label('my_vote'))
+    return db.query(QuestionCard, func.cast(False, Boolean).label('my_vote'))
+
+
+def filter_question_cards(query, topic_filter: str, status_filter: str, period_filter: str):
+    """Фильтры списка вопросов по теме, статусу и периоду."""
+    if topic_filter != 'all':
+        query = query.filter(QuestionCard.module_ids.contains([int(topic_filter)]))
+    if status_filter != 'all':
+        query = query.filter(QuestionCard.status == status_filter)
+    period_date = get_period_filter(period_filter)
+    if period_date:
+        query = query.filter(QuestionCard.created_at >= period_date)
+    return query
+
+
+def build_question_card_dict(card, my_vote):
+    """Словарь карточки для шаблонов из строки question_cards."""
+    close_label = None
+    if card.status == 'POSTED' and card.close_at:
+        close_label = get_close_label(card.close_at)
     return {
-        'id': question.id,
-        'title': question.title,
-        'body_preview': body_preview,
-        'status': question.status,
-        'status_label': get_status_label(question.status),
-        'votes_count': question.votes_count,
+        'id': card.question_id,
+        'title': card.title,
+        'body_preview': card.body_preview,
+        'status': card.status,
+        'status_label': card.status_label,
+        'votes_count': card.votes_count,
         'my_vote': my_vote,
-        'modules': modules,
-        'summary': summary,
-        'telegram_link': telegram_link,
-        'messages_count': messages_count,
-        'created_at': question.created_at
+        'modules': card.modules or [],
+        'summary': card.summary,
+        'telegram_link': card.telegram_link,
+        'messages_count': card.messages_count,
+        'close_label': close_label,
+        'created_at': card.created_at
     }
 
 
 
+def make_etag(*parts) -> str:
+    """ETag из версии данных и параметров запроса (отдаётся слабым, см. set_revalidate_headers)."""
+    raw = json.dumps(parts, default=str, ensure_ascii=False, separators=(',', ':'))
+    return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+
+def get_question_cards_version(db):
+    """Глобальная версия карточек: (version, время её последнего сдвига).
+
+    Счётчик в question_cards_meta растёт при каждом commit, изменившем
+    карточки (включая голоса и удаления), в порядке commit — одна строка,
+    без прохода по выборке.
+    """
+    return db.execute(text(
+        "SELECT version, updated_at FROM question_cards_meta WHERE id = 1"
+    )).one()
+
+
+def set_revalidate_headers(response, etag, last_modified=None, max_age=0):
+    """ETag/Last-Modified и Cache-Control: WebView переспрашивает и получает 304.
+
+    ETag слабый (W/): тело может уйти сжатым gzip или brotli, а побайтовое
+    совпадение разных кодировок сильный ETag обещал бы ложно.
+    """
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = f'private, max-age={max_age}' if max_age else 'private, no-cache'
+    return response
+
+
+def not_modified_response(etag, last_modified=None, max_age=0):
+    return set_revalidate_headers(current_app.response_class(status=304), etag, last_modified, max_age)
+
+
+def build_api_question_dict(card, my_vote):
+    """Словарь карточки для JSON API Mini App из строки question_cards."""
+    return {
+        'id': card.question_id,
+        'title': card.title,
+        'body_preview': card.body_preview,
+        'status': card.status,
+        'status_label': card.status_label,
+        'votes_count': card.votes_count,
+        'my_vote': bool(my_vote),
+        'modules': [
+            {'id': m['id'], 'title': m.get('short_title') or m['title']}
+            for m in (card.modules or [])
+        ],
+        'summary': card.summary,
+        'telegram_link': card.telegram_link,
+        'messages_count': card.messages_count,
+        'close_label': get_close_label(card.close_at) if card.status == 'POSTED' else None,
+        'created_at': card.created_at.isoformat() if card.created_at else None
+    }
+
+
+# Порядок полей строки в компактном формате /api/questions?format=compact
+COMPACT_QUESTION_FIELDS = [
+    'id', 'title', 'body_preview', 'status', 'votes_count', 'my_vote', 'module_ids',
+    'summary', 'telegram_link', 'messages_count', 'close_label', 'created_at',
+]
+
+
+def build_compact_questions(questions_data):
+    """Компактный формат: строки-массивы, словари модулей и статусов передаются один раз."""
+    modules = {}
+    statuses = {}
+    rows = []
+    for item in questions_data:
+        for m in item['modules']:
+            modules[m['id']] = m['title']
+        statuses[item['status']] = item['status_label']
+        values = dict(item, module_ids=[m['id'] for m in item['modules']])
+        rows.append([values[field] for field in COMPACT_QUESTION_FIELDS])
+    return {
+        'fields': COMPACT_QUESTION_FIELDS,
+        'rows': rows,
+        'modules': modules,
+        'statuses': statuses,
+    }
+
 
 def get_similar_questions_by_modules(db, question_id, module_ids, limit=5):
     if not module_ids:
@@ -852,151 +482,21 @@ def list_questions():
 
     db = SessionLocal()
     try:
-        
-        # Основной запрос: votes_count теперь поле
-        if telegram_user_id:
-          my_vote_exists = exists().where(
-            QuestionVote.question_id == Question.id,
-            QuestionVote.telegram_user_id == telegram_user_id
-          )
-          query = (
-            db.query(
-              Question,
-              my_vote_exists.label('my_vote')
-            )
-          )
-        else:
-          query = (
-            db.query(
-              Question,
-              func.cast(False, Integer).label('my_vote')
-            )
-          )
-        
-        # Применяем фильтры
-        if topic_filter != 'all':
-            query = query.join(
-                QuestionStepikModule,
-                Question.id == QuestionStepikModule.question_id
-            ).filter(QuestionStepikModule.module_id == int(topic_filter))
-        
-        if status_filter != 'all':
-            query = query.filter(Question.status == status_filter)
-        
-        period_date = get_period_filter(period_filter)
-        if period_date:
-            query = query.filter(Question.created_at >= period_date)
+        # Основной запрос: одна таблица question_cards, без догрузки модулей/ответов/тем
+        query = query_question_cards(db, telegram_user_id)
+        query = filter_question_cards(query, topic_filter, status_filter, period_filter)
+
         # Сортировка: по количеству голосов DESC, затем по дате DESC
-        
-        if status_filter == 'POSTED':
-            query = query.order_by(
-              Question.posted_at.desc()
-            )
-        elif period_filter == 'last30':
-            query = query.order_by(
-              Question.created_at.desc()
-            )
-        else :    
-          query = query.order_by(
-            Question.votes_count.desc(),
-            Question.created_at.desc()
-          )
+        sort_mode = get_questions_sort_mode(status_filter, period_filter)
+        query = query.order_by(*[col.desc() for col in get_questions_sort_columns(sort_mode)])
         
         if period_filter == 'last30':
             query = query.limit(30)
         
-        results = query.all()
-
-        # Собираем id всех вопросов
-        question_ids = [q.id for q, *_ in results]
-
-        # Получаем все модули для всех вопросов одним запросом
-        modules_by_qid = {}
-        if question_ids:
-            qsm = db.query(QuestionStepikModule).filter(QuestionStepikModule.question_id.in_(question_ids)).all()
-            module_ids = list({m.module_id for m in qsm})
-            modules = db.query(StepikModule).filter(StepikModule.id.in_(module_ids)).all()
-            modules_dict = {m.id: m for m in modules}
-            for m in qsm:
-                modules_by_qid.setdefault(m.question_id, []).append(modules_dict.get(m.module_id))
-            # Сортируем модули по позиции
-            for qid in modules_by_qid:
-                modules_by_qid[qid] = sorted([mod for mod in modules_by_qid[qid] if mod], key=lambda m: m.position)
-
-        # Получаем все ответы одним запросом
-        answers = db.query(QuestionAnswer).filter(QuestionAnswer.question_id.in_(question_ids)).all() if question_ids else []
-        answers_by_qid = {a.question_id: a for a in answers}
-
-        # Получаем все Telegram темы одним запросом
-        topics = db.query(TelegramTopic).filter(TelegramTopic.question_id.in_(question_ids)).all() if question_ids else []
-        topics_by_qid = {t.question_id: t for t in topics}
-
-        questions_data = []
-        # Определяем количество колонок в results
-        if results and len(results[0]) == 3:
-            for question, votes_count, my_vote in results:
-                modules = modules_by_qid.get(question.id, [])
-                answer = answers_by_qid.get(question.id)
-                answer_preview = None
-                if answer and answer.summary:
-                    answer_preview = answer.summary
-                telegram_link = None
-                messages_count = 0
-                topic = topics_by_qid.get(question.id)
-                if topic:
-                    telegram_link = f"https://t.me/c/{str(topic.chat_id)[4:]}/{topic.message_thread_id}"
-                    messages_count = topic.messages_count or 0
-                close_label = None
-                if question.status == 'POSTED' and topic:
-                    close_label = get_close_label(topic.close_at)
-                body_preview = question.body[:300] + '...' if len(question.body) > 300 else question.body
-                questions_data.append({
-                    'id': question.id,
-                    'title': question.title,
-                    'body_preview': body_preview,
-                    'status': question.status,
-                    'status_label': get_status_label(question.status),
-                    'votes_count': votes_count,
-                    'my_vote': my_vote,
-                    'modules': modules,
-                    'summary': answer_preview,
-                    'telegram_link': telegram_link,
-                    'messages_count': messages_count,
-                    'close_label': close_label,
-                    'created_at': question.created_at
-                })
-        else:
-            for question, my_vote in results:
-                modules = modules_by_qid.get(question.id, [])
-                answer = answers_by_qid.get(question.id)
-                answer_preview = None
-                if answer and answer.summary:
-                    answer_preview = answer.summary
-                telegram_link = None
-                messages_count = 0
-                topic = topics_by_qid.get(question.id)
-                if topic:
-                    telegram_link = f"https://t.me/c/{str(topic.chat_id)[4:]}/{topic.message_thread_id}"
-                    messages_count = topic.messages_count or 0
-                close_label = None
-                if question.status == 'POSTED' and topic:
-                    close_label = get_close_label(topic.close_at)
-                body_preview = question.body[:300] + '...' if len(question.body) > 300 else question.body
-                questions_data.append({
-                    'id': question.id,
-                    'title': question.title,
-                    'body_preview': body_preview,
-                    'status': question.status,
-                    'status_label': get_status_label(question.status),
-                    'votes_count': question.votes_count,
-                    'my_vote': my_vote,
-                    'modules': modules,
-                    'summary': answer_preview,
-                    'telegram_link': telegram_link,
-                    'messages_count': messages_count,
-                    'close_label': close_label,
-                    'created_at': question.created_at
-                })
+        questions_data = [
+            build_question_card_dict(card, my_vote)
+            for card, my_vote in query.all()
+        ]
         
         # Получаем все модули для фильтров
         all_modules = db.query(StepikModule).order_by(StepikModule.position).all()
@@ -1035,6 +535,7 @@ def vote(question_id: int):
         return jsonify({'error': 'access_denied', 'message': 'Нет доступа'}), 403
     if not telegram_user_id:
         return jsonify({'error': 'No telegram_id', 'message': 'Telegram ID не найден'}), 400
+    ensure_telegram_user_saved(telegram_user_id)
 
     db = SessionLocal()
     try:
@@ -1086,8 +587,80 @@ def vote(question_id: int):
         db.close()
 
 
+_SET_VOTE_SQL = text(
+    """
+    WITH ins AS (
+        INSERT INTO question_votes (question_id, telegram_user_id, voted_at)
+        SELECT :question_id, :telegram_user_id, now() AT TIME ZONE 'utc'
+        WHERE EXISTS (SELECT 1 FROM questions WHERE id = :question_id)
+        ON CONFLICT DO NOTHING
+        RETURNING 1
+    )
+    SELECT q.votes_count + (SELECT COUNT(*) FROM ins), (SELECT COUNT(*) FROM ins)
+    FROM questions q
+    WHERE q.id = :question_id
+    """
+)
+
+_UNSET_VOTE_SQL = text(
+    """
+    WITH del AS (
+        DELETE FROM question_votes
+        WHERE question_id = :question_id AND telegram_user_id = :telegram_user_id
+        RETURNING 1
+    )
+    SELECT GREATEST(q.votes_count - (SELECT COUNT(*) FROM del), 0), (SELECT COUNT(*) FROM del)
+    FROM questions q
+    WHERE q.id = :question_id
+    """
+)
+
+
+@questions_bp.route("/<int:question_id>/vote", methods=["PUT", "DELETE"])
+def set_vote(question_id: int):
+    """Идемпотентная установка голоса: PUT — лайк стоит, DELETE — лайка нет.
+
+    Один SQL-запрос (INSERT ... ON CONFLICT DO NOTHING / DELETE ... RETURNING),
+    votes_count возвращается тем же запросом. Повторный запрос с тем же
+    состоянием ничего не меняет (changed=false), поэтому двойной тап безопасен.
+    Точное значение после конкурентных голосов приходит в SSE-потоке.
+    """
+    init_data = request.headers.get('X-Telegram-Init-Data', '')
+    auth = ensure_session_user(init_data)
+    if not auth["user_id"] or auth["user_role"] is None or auth["user_role"] < 0:
+        return jsonify({'error': 'access_denied', 'message': 'Нет доступа'}), 403
+    telegram_user_id = auth["telegram_id"]
+    if not telegram_user_id:
+        return jsonify({'error': 'No telegram_id', 'message': 'Telegram ID не найден'}), 400
+    ensure_telegram_user_saved(telegram_user_id)
+
+    liked = request.method == "PUT"
+    params = {'question_id': question_id, 'telegram_user_id': telegram_user_id}
+    db = SessionLocal()
+    try:
+        row = db.execute(_SET_VOTE_SQL if liked else _UNSET_VOTE_SQL, params).first()
+        if row is None:
+            db.rollback()
+            return jsonify({'error': 'Not found', 'message': 'Вопрос не найден'}), 404
+        db.commit()
+        return jsonify({
+            'success': True,
+            'liked': liked,
+            'changed': bool(row[1]),
+            'votes_count': int(row[0]),
+        })
+    except Exception as e:
+        db.rollback()
+        return jsonify({'error': 'Server error', 'message': str(e)}), 500
+    finally:
+        db.close()
+
+
 def publish_question_to_telegram(db, question):
-    """Publish a question to Telegram and update DB objects."""
+    """Queue publishing of a question; Telegram calls run in the outbox sender.
+
+    Commit db, then call notify_telegram_sender().
+    """
     if not Config.TELEGRAM_BOT_TOKEN or not Config.TELEGRAM_CHAT_ID:
         return {"ok": False, "error": "Telegram не настроен"}
 
@@ -1095,136 +668,172 @@ def publish_question_to_telegram(db, question):
     if existing_topic:
         return {"ok": False, "error": "Вопрос уже опубликован"}
 
-    topic_name = question.title or question.body[:100]
+    queued = enqueue_telegram_operation(
+        db,
+        "publish_question",
+        Config.TELEGRAM_CHAT_ID,
+        {"question_id": question.id},
+        f"publish_question:{question.id}",
+    )
+    if not queued:
+        return {"ok": False, "error": "Публикация уже в очереди"}
+    return {"ok": True}
+
+
+def _telegram_error_text(result) -> str:
+    body = result.get("body") or {}
+    return body.get("description") if isinstance(body, dict) else str(body)
+
+
+def _topic_not_modified(result) -> bool:
+    """Тема уже в нужном состоянии (повтор после потерянного ответа)."""
+    return "TOPIC_NOT_MODIFIED" in str(_telegram_error_text(result) or "")
+
+
+@outbox_handler("publish_question")
+def run_publish_question(db, payload, state):
+    """Создать тему, стартовый пост и уведомление; затем TelegramTopic и статус POSTED."""
+    question = db.query(Question).filter_by(id=payload["question_id"]).first()
+    if not question:
+        raise OutboxPermanentError("Вопрос не найден")
+    if db.query(TelegramTopic).filter_by(question_id=question.id).first():
+        return None
+
+    # Всё нужное для вызовов читаем сейчас: во время отправки сессии нет
+    question_id = question.id
+    question_title = question.title
+    question_body = question.body
+    chat_id = Config.TELEGRAM_CHAT_ID
+    topic_name = question_title or question_body[:100]
     if len(topic_name) > 100:
         topic_name = topic_name[:97] + '...'
 
     icon_custom_emoji_id = None
-    first_module = None
     if question.modules:
         first_module = question.modules[0]
         if first_module.forum_topic_icon:
             icon_custom_emoji_id = first_module.forum_topic_icon
 
-    post_result = post_forum_topic_with_message(
-        chat_id=Config.TELEGRAM_CHAT_ID,
-        topic_name=topic_name,
-        message_text=question.body,
-        icon_custom_emoji_id=icon_custom_emoji_id,
-        parse_mode='Markdown',
+    prev_notice = (
+        db.query(TelegramTopic)
+        .filter(TelegramTopic.question_id != question_id)
+        .order_by(TelegramTopic.opened_at.desc())
+        .first()
+    )
+    prev_notice_message_id = prev_notice.notice_message_id if prev_notice else None
+    prev_topic_link = (
+        get_topic_link(prev_notice.chat_id, prev_notice.message_thread_id)
+        if prev_notice_message_id else None
     )
-    if not post_result["ok"]:
-        return {"ok": False, "error": f"Ошибка публикации: {post_result.get('body')}"}
-
-    message_thread_id = int(post_result["message_thread_id"])
-    open_message_id = post_result.get("message_id")
-    topic_link = post_result.get("topic_link", "")
 
-    notice_message_id = None
-    notice_is_pinned = False
-    if Config.TELEGRAM_THREAD_ID:
-        try:
-            months = [
-                "января", "февраля", "марта", "апреля", "мая", "июня",
-                "июля", "августа", "сентября", "октября", "ноября", "декабря"
-            ]
-            now = datetime.utcnow()
-            date_text = f"{now.day} {months[now.month - 1]}"
-
-            module_title = first_module.title if first_module else "Без раздела"
-            emoji_tag = ""
-            if first_module and first_module.forum_topic_icon:
-                emoji_tag = f'<tg-emoji emoji-id="{first_module.forum_topic_icon}">✨</tg-emoji>'
-            notice_text = (
-                f"📌Вопрос дня - {date_text}\n\n"
-                f"<b>{question.title}</b>\n\n"
-                f"{question.body}\n"
+    def send():
+        if "message_thread_id" not in state:
+            topic_result = create_forum_topic(
+                chat_id=chat_id,
+                name=topic_name,
+                icon_custom_emoji_id=icon_custom_emoji_id,
             )
+            if not topic_result["ok"] or not topic_result["message_thread_id"]:
+                raise RuntimeError(f"Ошибка публикации: {topic_result.get('body')}")
+            state["message_thread_id"] = int(topic_result["message_thread_id"])
+        message_thread_id = state["message_thread_id"]
+        topic_link = get_topic_link(chat_id, message_thread_id)
+
+        if "open_message_id" not in state:
+            message_result = send_message(
+                chat_id=chat_id,
+                message_thread_id=message_thread_id,
+                text=topic_opening_text(topic_name, question_body),
+                parse_mode="HTML",
+            )
+            if not message_result["ok"]:
+                raise RuntimeError(f"Ошибка публикации: {message_result.get('body')}")
+            state["open_message_id"] = message_result.get("message_id")
+
+        # Уведомление — best effort, как и раньше: при ошибке не повторяем
+        if Config.TELEGRAM_THREAD_ID and "notice_message_id" not in state:
+            state["notice_message_id"] = None
+            try:
+                months = [
+                    "января", "февраля", "марта", "апреля", "мая", "июня",
+                    "июля", "августа", "сентября", "октября", "ноября", "декабря"
+                ]
+                now = datetime.utcnow()
+                date_text = f"{now.day} {months[now.month - 1]}"
+
+                notice_text = (
+                    f"📌Вопрос дня - {date_text}\n\n"
+                    f"<b>{question_title}</b>\n\n"
+                    f"{question_body}\n"
+                )
 
-            keyboard = []
-            if topic_link:
+                keyboard = []
+                if topic_link:
+                    keyboard.append([{
+                        "text": "🟢 Перейти к обсуждению",
+                        "url": topic_link
+                    }])
                 keyboard.append([{
-                    "text": "🟢 Перейти к обсуждению",
-                    "url": topic_link
+                    "text": "📌 Все открытые вопросы",
+                    "url": f"https://t.me/{Config.TELEGRAM_BOT_USERNAME}/questions?startapp=status_posted"
                 }])
-            keyboard.append([{
-                "text": "📌 Все открытые вопросы",
-                "url": f"https://t.me/{Config.TELEGRAM_BOT_USERNAME}/questions?startapp=status_posted"
-            }])
-            keyboard.append([{
-                "text": "❤️ Проголосовать за вопросы",
-                "url": f"https://t.me/{Config.TELEGRAM_BOT_USERNAME}/questions?startapp=status_voting"
-            }])
-
-            reply_markup = {"inline_keyboard": keyboard} if keyboard else None
-            notice_result = send_message(
-                chat_id=Config.TELEGRAM_CHAT_ID,
-                message_thread_id=int(Config.TELEGRAM_THREAD_ID),
-                text=notice_text,
-                parse_mode="HTML",
-                reply_markup=reply_markup,
-            )
-            notice_message_id = notice_result.get("message_id")
-            if notice_message_id:
-                prev_notice = (
-                    db.query(TelegramTopic)
-                    .filter(TelegramTopic.question_id != question.id)
-                    .order_by(TelegramTopic.opened_at.desc())
-                    .first()
+                keyboard.append([{
+                    "text": "❤️ Проголосовать за вопросы",
+                    "url": f"https://t.me/{Config.TELEGRAM_BOT_USERNAME}/questions?startapp=status_voting"
+                }])
+
+                reply_markup = {"inline_keyboard": keyboard} if keyboard else None
+                notice_result = send_message(
+                    chat_id=chat_id,
+                    message_thread_id=int(Config.TELEGRAM_THREAD_ID),
+                    text=notice_text,
+                    parse_mode="HTML",
+                    reply_markup=reply_markup,
                 )
-                if prev_notice and prev_notice.notice_message_id:
-                    old_topic_link = get_topic_link(
-                        prev_notice.chat_id,
-                        prev_notice.message_thread_id,
-                    )
+                notice_message_id = notice_result.get("message_id")
+                state["notice_message_id"] = notice_message_id
+                if notice_message_id and prev_notice_message_id:
                     old_keyboard = []
-                    if old_topic_link:
+                    if prev_topic_link:
                         old_keyboard.append(
-                            [{"text": "🔘 Перейти к обсуждению", "url": old_topic_link}]
+                            [{"text": "🔘 Перейти к обсуждению", "url": prev_topic_link}]
                         )
                     edit_notice_reply_markup(
-                        prev_notice.notice_message_id,
+                        prev_notice_message_id,
                         {"inline_keyboard": old_keyboard},
                     )
-        except Exception as e:
-            print(f"[WARNING] Failed to post publish notice: {e}")
-
-    telegram_topic = TelegramTopic(
-        question_id=question.id,
-        chat_id=int(Config.TELEGRAM_CHAT_ID),
-        message_thread_id=message_thread_id,
-        open_message_id=open_message_id,
-        notice_message_id=notice_message_id,
-        notice_is_pinned=notice_is_pinned,
-        opened_at=datetime.utcnow(),
-        close_at=datetime.utcnow() + timedelta(days=7),
-    )
-    db.add(telegram_topic)
+            except Exception as e:
+                print(f"[WARNING] Failed to post publish notice: {e}")
 
-    question.status = 'POSTED'
-    question.posted_at = datetime.utcnow()
+    def apply(db):
+        question = db.query(Question).filter_by(id=question_id).first()
+        if not question:
+            raise OutboxPermanentError("Вопрос не найден")
+        if db.query(TelegramTopic).filter_by(question_id=question_id).first():
+            return
 
-    return {
-        "ok": True,
-        "thread_id": message_thread_id,
-        "topic_link": topic_link,
-    }
+        telegram_topic = TelegramTopic(
+            question_id=question_id,
+            chat_id=int(chat_id),
+            message_thread_id=state["message_thread_id"],
+            open_message_id=state.get("open_message_id"),
+            notice_message_id=state.get("notice_message_id"),
+            notice_is_pinned=False,
+            opened_at=datetime.utcnow(),
+            close_at=datetime.utcnow() + timedelta(days=7),
+        )
+        db.add(telegram_topic)
+
+        question.status = 'POSTED'
+        question.posted_at = datetime.utcnow()
+
+    return send, apply
 
 
 @questions_bp.route("/<int:question_id>/publish", methods=["POST"])
 def publish_question(question_id: int):
     """Опубликовать вопрос в Telegram форум-группе."""
-    user_id = session.get("user_id")
-    user_role = None
-    if user_id:
-        db_temp = SessionLocal()
-        try:
-            user = db_temp.query(User).filter_by(id=user_id).first()
-            if user:
-                user_role = user.role
-        finally:
-            db_temp.close()
-
+    user_role = get_user_role(session.get("user_id"))
     if not user_role or user_role < 1:
         return jsonify({'success': False, 'error': 'Недостаточно прав'}), 403
 
@@ -1239,14 +848,14 @@ def publish_question(question_id: int):
 
         result = publish_question_to_telegram(db, question)
         if not result["ok"]:
-            return jsonify({'success': False, 'error': result["error"]}), 500
+            return jsonify({'success': False, 'error': result["error"]}), 409
 
         db.commit()
+        notify_telegram_sender()
         return jsonify({
             'success': True,
-            'message': 'Вопрос опубликован в Telegram',
-            'thread_id': result["thread_id"],
-            'topic_link': result["topic_link"],
+            'queued': True,
+            'message': 'Вопрос поставлен в очередь на публикацию в Telegram',
         })
     except Exception as e:
         db.rollback()
@@ -1262,12 +871,12 @@ def close_discussion(question_id):
     if not user_id:
         return jsonify({'success': False, 'error': 'Необходима авторизация'}), 401
 
+    principal = get_principal(user_id)
+    if not principal or principal.role < 1:
+        return jsonify({'success': False, 'error': 'Недостаточно прав'}), 403
+
     db = SessionLocal()
     try:
-        user = db.query(User).filter_by(id=user_id).first()
-        if not user or user.role < 1:
-            return jsonify({'success': False, 'error': 'Недостаточно прав'}), 403
-
         question = db.query(Question).filter_by(id=question_id).first()
         if not question:
             return jsonify({'success': False, 'error': 'Вопрос не найден'}), 404
@@ -1280,21 +889,23 @@ def close_discussion(question_id):
             return jsonify({'success': False, 'error': 'Тема в Telegram не найдена'}), 404
 
         telegram_user = None
-        if user.telegram_id:
-            telegram_user = db.query(TelegramUser).filter_by(id=user.telegram_id).first()
+        if principal.telegram_id:
+            telegram_user = db.query(TelegramUser).filter_by(id=principal.telegram_id).first()
 
         username_text = f"@{telegram_user.username}" if telegram_user and telegram_user.username else "администратором"
         notice_text = f"🔒 Тема закрыта пользователем {username_text}"
 
         close_result = close_discussion_for_question(db, question, topic, notice_text)
         if not close_result["ok"]:
-            return jsonify({'success': False, 'error': close_result["error"]}), 500
+            return jsonify({'success': False, 'error': close_result["error"]}), 409
 
         db.commit()
+        notify_telegram_sender()
 
         return jsonify({
             'success': True,
-            'message': 'Обсуждение закрыто'
+            'queued': True,
+            'message': 'Закрытие обсуждения поставлено в очередь'
         })
 
     except Exception as e:
@@ -1305,36 +916,69 @@ def close_discussion(question_id):
 
 
 def close_discussion_for_question(db, question, topic, notice_text):
-    """Close a Telegram topic and update DB."""
-    send_result = send_message(
-        chat_id=topic.chat_id,
-        message_thread_id=topic.message_thread_id,
-        text=notice_text,
-    )
-    if send_result.get("ok") and send_result.get("message_id") is not None:
-        topic.close_message_id = send_result["message_id"]
-    elif not send_result.get("ok"):
-        print(f"[WARNING] Failed to send close notice: {send_result.get('body')}")
-
-    close_result = close_forum_topic(
-        chat_id=topic.chat_id,
-        message_thread_id=topic.message_thread_id,
+    """Queue closing of a Telegram topic; commit db, then call notify_telegram_sender()."""
+    queued = enqueue_telegram_operation(
+        db,
+        "close_discussion",
+        topic.chat_id,
+        {"question_id": question.id, "notice_text": notice_text},
+        next_idempotency_key(db, f"close_discussion:{question.id}"),
     )
-    if not close_result.get("ok"):
-        body = close_result.get("body") or {}
-        error_text = body.get("description") if isinstance(body, dict) else str(body)
-        return {"ok": False, "error": f"Ошибка закрытия темы: {error_text}"}
-
-    question.status = 'CLOSED'
-    topic.closed_at = datetime.utcnow()
+    if not queued:
+        return {"ok": False, "error": "Закрытие уже в очереди"}
     return {"ok": True}
 
 
-def auto_close_due_discussions():
-    """Close discussions whose close_at has passed."""
-    db = SessionLocal()
-    try:
-        now = datetime.utcnow()
+@outbox_handler("close_discussion")
+def run_close_discussion(db, payload, state):
+    """Уведомление в тему и закрытие темы; затем статус CLOSED и closed_at."""
+    question_id = payload["question_id"]
+    question = db.query(Question).filter_by(id=question_id).first()
+    topic = db.query(TelegramTopic).filter_by(question_id=question_id).first()
+    if not question or not topic:
+        raise OutboxPermanentError("Вопрос или тема не найдены")
+    # Переход уже применён; вопрос, снова открытый после закрытия, закрывается заново
+    if question.status != 'POSTED':
+        return None
+    chat_id = topic.chat_id
+    message_thread_id = topic.message_thread_id
+
+    def send():
+        if "close_message_id" not in state:
+            send_result = send_message(
+                chat_id=chat_id,
+                message_thread_id=message_thread_id,
+                text=payload["notice_text"],
+            )
+            state["close_message_id"] = send_result.get("message_id") if send_result.get("ok") else None
+            if not send_result.get("ok"):
+                print(f"[WARNING] Failed to send close notice: {send_result.get('body')}")
+
+        close_result = close_forum_topic(
+            chat_id=chat_id,
+            message_thread_id=message_thread_id,
+        )
+        if not close_result.get("ok") and not _topic_not_modified(close_result):
+            raise RuntimeError(f"Ошибка закрытия темы: {_telegram_error_text(close_result)}")
+
+    def apply(db):
+        question = db.query(Question).filter_by(id=question_id).first()
+        topic = db.query(TelegramTopic).filter_by(question_id=question_id).first()
+        if not question or not topic:
+            raise OutboxPermanentError("Вопрос или тема не найдены")
+        if state["close_message_id"] is not None:
+            topic.close_message_id = state["close_message_id"]
+        question.status = 'CLOSED'
+        topic.closed_at = datetime.utcnow()
+
+    return send, apply
+
+
+def auto_close_due_discussions():
+    """Close discussions whose close_at has passed."""
+    db = SessionLocal()
+    try:
+        now = datetime.utcnow()
 
         if now.hour < 20:
             return
@@ -1349,6 +993,7 @@ def auto_close_due_discussions():
             )
             .all()
         )
+        queued = 0
         for topic, question in rows:
             result = close_discussion_for_question(
                 db,
@@ -1357,10 +1002,11 @@ def auto_close_due_discussions():
                 '🔒 Тема закрыта по расписанию',
             )
             if result["ok"]:
-                db.commit()
-            else:
-                db.rollback()
-                print(f"[AutoClose] Failed for question {question.id}: {result['error']}")
+                queued += 1
+        db.commit()
+        if queued:
+            notify_telegram_sender()
+            print(f"[AutoClose] Queued {queued} discussions for closing.")
     finally:
         db.close()
 
@@ -1387,6 +1033,10 @@ def auto_publish_daily_question():
         if posted_today:
             return
 
+        # Предыдущая публикация ещё в очереди отправки
+        if has_pending_telegram_operation(db, operation="publish_question"):
+            return
+
         status_order = case(
             (Question.status == 'SCHEDULED', 0),
             else_=1,
@@ -1403,7 +1053,8 @@ def auto_publish_daily_question():
         result = publish_question_to_telegram(db, candidate)
         if result.get('ok'):
             db.commit()
-            print(f"[AutoPublish] Published question {candidate.id}.")
+            notify_telegram_sender()
+            print(f"[AutoPublish] Queued question {candidate.id}.")
         else:
             db.rollback()
             print(f"[AutoPublish] Failed to publish: {result.get('error')}")
@@ -1413,6 +1064,233 @@ def auto_publish_daily_question():
     finally:
         db.close()
 
+@questions_bp.route("/api/duplicates", methods=["POST"])
+def api_duplicates():
+    """Проверка дублей перед сохранением вопроса.
+
+    JSON: {"title": ..., "body": ..., "modules": [id, ...], "question_id": 0}
+    Возвращает вопросы с косинусной близостью не ниже
+    Config.DUPLICATE_SIMILARITY_THRESHOLD (лучшие первыми).
+    """
+    user_role = get_user_role(session.get("user_id"))
+    if not user_role or user_role < 1:
+        return jsonify({'success': False, 'error': 'Недостаточно прав'}), 403
+
+    data = request.get_json(silent=True) or {}
+    body = (data.get('body') or '').strip()
+    if not body:
+        return jsonify({'success': True, 'duplicates': []})
+    exclude_id = int(data.get('question_id') or 0) or None
+
+    db = SessionLocal()
+    try:
+        module_ids = [int(m) for m in (data.get('modules') or [])]
+        modules = (
+            db.query(StepikModule)
+            .filter(StepikModule.id.in_(module_ids))
+            .order_by(StepikModule.position)
+            .all()
+        ) if module_ids else []
+        # Тот же формат текста, что и у сохранённых эмбеддингов
+        draft = SimpleNamespace(title=(data.get('title') or '').strip() or None, body=body)
+        # Через общий LRU и с таймаутом: черновик проверяется повторно при каждой правке
+        embedding = get_text_embedding(
+            build_question_source_text(draft, modules), Config.QUERY_EMBEDDING_TIMEOUT
+        )
+        if embedding is None:
+            return jsonify({'success': True, 'duplicates': []})
+
+        candidates = find_near_duplicates(
+            db,
+            embedding,
+            Config.DUPLICATE_SIMILARITY_THRESHOLD,
+            Config.DUPLICATE_CANDIDATES_LIMIT,
+            exclude_id=exclude_id,
+        )
+        similarity = dict(candidates)
+        rows = (
+            query_question_cards(db, None)
+            .filter(QuestionCard.question_id.in_(list(similarity)))
+            .all()
+        ) if similarity else []
+        rows.sort(key=lambda row: similarity[row[0].question_id], reverse=True)
+
+        duplicates = []
+        for card, my_vote in rows:
+            item = build_api_question_dict(card, my_vote)
+            item['similarity'] = round(similarity[card.question_id], 4)
+            item['url'] = url_for('questions.question_detail', question_id=card.question_id)
+            duplicates.append(item)
+        return jsonify({'success': True, 'duplicates': duplicates})
+    except Exception as e:
+        print(f"[Duplicates] Check failed: {e}")
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        db.close()
+
+
+@questions_bp.route("/<int:question_id>/merge", methods=["POST"])
+def merge_question(question_id):
+    """Объединить дубль с другим вопросом.
+
+    Голоса и разделы курса переносятся в target_id, сам дубль удаляется.
+    Объединять можно только неопубликованный вопрос (VOTING, без темы в Telegram).
+    Итоговый ответ дубля переносится, если у target_id ответа нет; иначе
+    объединение отклоняется, чтобы ответ не удалился каскадом.
+    """
+    user_role = get_user_role(session.get("user_id"))
+    if not user_role or user_role < 1:
+        return jsonify({'success': False, 'error': 'Недостаточно прав'}), 403
+
+    data = request.get_json(silent=True) or {}
+    try:
+        target_id = int(data.get('target_id') or 0)
+    except (TypeError, ValueError):
+        target_id = 0
+    if not target_id or target_id == question_id:
+        return jsonify({'success': False, 'error': 'Укажите другой вопрос для объединения'}), 400
+
+    db = SessionLocal()
+    try:
+        source = db.query(Question).filter_by(id=question_id).with_for_update(of=Question).first()
+        target = db.query(Question).filter_by(id=target_id).first()
+        if not source or not target:
+            return jsonify({'success': False, 'error': 'Вопрос не найден'}), 404
+        if source.status != 'VOTING' or db.query(TelegramTopic).filter_by(question_id=question_id).first():
+            return jsonify({'success': False, 'error': 'Объединять можно только вопросы в голосовании'}), 400
+
+        source_answer = db.query(QuestionAnswer).filter_by(question_id=question_id).first()
+        if source_answer and db.query(QuestionAnswer.id).filter_by(question_id=target_id).first():
+            return jsonify({
+                'success': False,
+                'error': 'У обоих вопросов есть итоговый ответ — объедините ответы вручную',
+            }), 409
+
+        params = {"source": question_id, "target": target_id}
+        moved_votes = db.execute(
+            text(
+                """
+                INSERT INTO question_votes (question_id, telegram_user_id, voted_at)
+                SELECT :target, telegram_user_id, voted_at
+                FROM question_votes
+                WHERE question_id = :source
+                ON CONFLICT DO NOTHING
+                """
+            ),
+            params,
+        ).rowcount
+        moved_modules = db.execute(
+            text(
+                """
+                INSERT INTO question_stepik_modules (question_id, module_id, is_primary, created_at)
+                SELECT :target, module_id, FALSE, NOW() AT TIME ZONE 'utc'
+                FROM question_stepik_modules
+                WHERE question_id = :source
+                ON CONFLICT DO NOTHING
+                """
+            ),
+            params,
+        ).rowcount
+        if source_answer:
+            source_answer.question_id = target_id
+            db.flush()
+        # Голоса, связи с разделами, эмбеддинг и карточка удаляются каскадом в БД
+        db.query(Question).filter_by(id=question_id).delete(synchronize_session=False)
+        if moved_modules or source_answer:
+            enqueue_embedding_job(db, target_id)
+        db.commit()
+
+        remove_from_vector_index(question_id)
+        invalidate_similar_cache(question_id)
+        invalidate_similar_cache(target_id)
+        if moved_modules or source_answer:
+            notify_embedding_worker()
+        votes_count = db.query(Question.votes_count).filter_by(id=target_id).scalar()
+        print(f"[Merge] Question {question_id} -> {target_id}: {moved_votes} votes, {moved_modules} modules moved")
+        return jsonify({
+            'success': True,
+            'target_id': target_id,
+            'moved_votes': moved_votes,
+            'moved_modules': moved_modules,
+            'moved_answer': bool(source_answer),
+            'votes_count': votes_count,
+            'url': url_for('questions.question_detail', question_id=target_id),
+        })
+    except Exception as e:
+        db.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        db.close()
+
+
+@outbox_handler("archive_question")
+def run_archive_question(db, payload, state):
+    """Открыть тему, опубликовать итоговый ответ, закрыть тему; затем статус ARCHIVED."""
+    question_id = payload["question_id"]
+    question = db.query(Question).filter_by(id=question_id).first()
+    topic = db.query(TelegramTopic).filter_by(question_id=question_id).first()
+    answer = db.query(QuestionAnswer).filter_by(question_id=question_id).first()
+    if not question or not topic or not answer or not answer.answer:
+        raise OutboxPermanentError("Вопрос, тема или ответ не найдены")
+    if question.status == 'ARCHIVED':
+        return None
+    chat_id = topic.chat_id
+    message_thread_id = topic.message_thread_id
+    answer_text = answer.answer
+    sources_text = None
+    if answer.sources:
+        sources_text = answer.sources.text if hasattr(answer.sources, 'text') else str(answer.sources)
+
+    def send():
+        # 1. Открываем тему
+        if not state.get("reopened"):
+            reopen_result = reopen_forum_topic(
+                chat_id=chat_id,
+                message_thread_id=message_thread_id,
+            )
+            if not reopen_result["ok"] and not _topic_not_modified(reopen_result):
+                raise RuntimeError(f'Ошибка открытия темы: {_telegram_error_text(reopen_result) or "Неизвестная ошибка"}')
+            state["reopened"] = True
+
+        # 2. Отправляем итоговый ответ (максимум 4096 символов в Telegram)
+        if not state.get("answer_sent"):
+            message_text = answer_text
+            if len(message_text) > 4000:
+                message_text = message_text[:4000] + '...\n\n(ответ обрезан, полный текст см. на сайте)'
+
+            final_message = f"✅ **ИТОГОВЫЙ ОТВЕТ**\n\n{message_text}"
+
+            if sources_text:
+                final_message += f"\n\n📚 Источники: {sources_text}"
+
+            message_result = send_message(
+                chat_id=chat_id,
+                message_thread_id=message_thread_id,
+                text=final_message,
+                parse_mode='Markdown',
+            )
+            if not message_result["ok"]:
+                print(f"[WARNING] Не удалось отправить итоговый ответ: {message_result['body']}")
+            state["answer_sent"] = True
+
+        # 3. Закрываем тему
+        close_result = close_forum_topic(
+            chat_id=chat_id,
+            message_thread_id=message_thread_id,
+        )
+        if not close_result["ok"] and not _topic_not_modified(close_result):
+            raise RuntimeError(f'Ошибка закрытия темы: {_telegram_error_text(close_result) or "Неизвестная ошибка"}')
+
+    # 4. Обновляем статус вопроса
+    def apply(db):
+        question = db.query(Question).filter_by(id=question_id).first()
+        if not question:
+            raise OutboxPermanentError("Вопрос не найден")
+        question.status = 'ARCHIVED'
+
+    return send, apply
+
+
 @questions_bp.route("/<int:question_id>/archive", methods=["POST"])
 def archive_question(question_id):
     """Архивировать вопрос: открыть тему, опубликовать ответ, закрыть тему."""
@@ -1420,13 +1298,13 @@ def archive_question(question_id):
     if not user_id:
         return jsonify({'success': False, 'error': 'Необходима авторизация'}), 401
     
+    # Проверяем права пользователя
+    user_role = get_user_role(user_id)
+    if not user_role or user_role < 1:
+        return jsonify({'success': False, 'error': 'Недостаточно прав'}), 403
+
     db = SessionLocal()
     try:
-        # Проверяем права пользователя
-        user = db.query(User).filter_by(id=user_id).first()
-        if not user or user.role < 1:
-            return jsonify({'success': False, 'error': 'Недостаточно прав'}), 403
-        
         # Получаем вопрос
         question = db.query(Question).filter_by(id=question_id).first()
         if not question:
@@ -1446,64 +1324,23 @@ def archive_question(question_id):
         if not topic:
             return jsonify({'success': False, 'error': 'Тема в Telegram не найдена'}), 404
         
-        # 1. Открываем тему
-        reopen_url = f'https://api.telegram.org/bot{Config.TELEGRAM_BOT_TOKEN}/reopenForumTopic'
-        reopen_response = requests.post(reopen_url, json={
-            'chat_id': topic.chat_id,
-            'message_thread_id': topic.message_thread_id
-        })
-        
-        if not reopen_response.ok:
-            error_data = reopen_response.json()
-            return jsonify({
-                'success': False,
-                'error': f'Ошибка открытия темы: {error_data.get("description", "Неизвестная ошибка")}'
-            }), 500
-        
-        # 2. Отправляем итоговый ответ (максимум 4096 символов в Telegram)
-        answer_text = answer.answer
-        if len(answer_text) > 4000:
-            answer_text = answer_text[:4000] + '...\n\n(ответ обрезан, полный текст см. на сайте)'
-        
-        final_message = f"✅ **ИТОГОВЫЙ ОТВЕТ**\n\n{answer_text}"
-        
-        if answer.sources:
-            sources_text = answer.sources.text if hasattr(answer.sources, 'text') else str(answer.sources)
-            final_message += f"\n\n📚 Источники: {sources_text}"
-        
-        message_url = f'https://api.telegram.org/bot{Config.TELEGRAM_BOT_TOKEN}/sendMessage'
-        message_response = requests.post(message_url, json={
-            'chat_id': topic.chat_id,
-            'message_thread_id': topic.message_thread_id,
-            'text': final_message,
-            'parse_mode': 'Markdown'
-        })
-        
-        if not message_response.ok:
-            print(f"[WARNING] Не удалось отправить итоговый ответ: {message_response.text}")
-        
-        # 3. Закрываем тему
-        close_url = f'https://api.telegram.org/bot{Config.TELEGRAM_BOT_TOKEN}/closeForumTopic'
-        close_response = requests.post(close_url, json={
-            'chat_id': topic.chat_id,
-            'message_thread_id': topic.message_thread_id
-        })
-        
-        if not close_response.ok:
-            error_data = close_response.json()
-            return jsonify({
-                'success': False,
-                'error': f'Ошибка закрытия темы: {error_data.get("description", "Неизвестная ошибка")}'
-            }), 500
-        
-        # 4. Обновляем статус вопроса
-        question.status = 'ARCHIVED'
-        
+        queued = enqueue_telegram_operation(
+            db,
+            "archive_question",
+            topic.chat_id,
+            {"question_id": question_id},
+            next_idempotency_key(db, f"archive_question:{question_id}"),
+        )
+        if not queued:
+            return jsonify({'success': False, 'error': 'Архивирование уже в очереди'}), 409
+
         db.commit()
+        notify_telegram_sender()
         
         return jsonify({
             'success': True,
-            'message': 'Вопрос перемещен в архив'
+            'queued': True,
+            'message': 'Вопрос поставлен в очередь на архивирование'
         })
         
     except Exception as e:
@@ -1642,18 +1479,13 @@ def question_detail(question_id: int):
                     answer.sources = sources_json
                     answer.updated_at = datetime.utcnow()
 
-            modules_for_embedding = []
-            if selected_modules:
-                module_ids = [int(m) for m in selected_modules]
-                modules_for_embedding = db.query(StepikModule).filter(StepikModule.id.in_(module_ids)).all()
-            try:
-                upsert_question_embedding(db, question, modules_for_embedding, answer_summary)
-            except Exception as e:
-                print(f"[Embedding] Update failed: {e}")
+            # Эмбеддинг и похожие вопросы пересчитает фоновый воркер (embedding_jobs)
+            enqueue_embedding_job(db, new_question_id)
             
             db.commit()
             db.close()
-            refresh_similar_cache_async(new_question_id)
+            invalidate_similar_cache(new_question_id)
+            notify_embedding_worker()
             
             # Редирект обратно на просмотр
             return redirect(url_for('questions.question_detail', question_id=new_question_id))
@@ -1737,542 +1569,18 @@ def question_detail(question_id: int):
                 db, question, modules, answer_summary, limit=5
             )
             if similar_ids:
-                similar_qs = db.query(Question).filter(Question.id.in_(similar_ids)).all()
-                q_map = {q.id: q for q in similar_qs}
-
-                qsm = (
-                    db.query(QuestionStepikModule)
-                    .filter(QuestionStepikModule.question_id.in_(similar_ids))
+                cards = (
+                    query_question_cards(db, telegram_user_id)
+                    .filter(QuestionCard.question_id.in_(similar_ids))
                     .all()
                 )
-                module_ids = list({m.module_id for m in qsm})
-                modules_list = (
-                    db.query(StepikModule).filter(StepikModule.id.in_(module_ids)).all()
-                    if module_ids else []
-                )
-                modules_dict = {m.id: m for m in modules_list}
-                modules_by_qid = {}
-                for m in qsm:
-                    modules_by_qid.setdefault(m.question_id, []).append(modules_dict.get(m.module_id))
-                for qid in modules_by_qid:
-                    modules_by_qid[qid] = sorted(
-                        [mod for mod in modules_by_qid[qid] if mod],
-                        key=lambda m: m.position
-                    )
-
-                answers = db.query(QuestionAnswer).filter(QuestionAnswer.question_id.in_(similar_ids)).all()
-                answers_by_qid = {a.question_id: a for a in answers}
-
-                topics = db.query(TelegramTopic).filter(TelegramTopic.question_id.in_(similar_ids)).all()
-                topics_by_qid = {t.question_id: t for t in topics}
-
-                my_votes = set()
-                if telegram_user_id:
-                    my_votes = {
-                        row[0] for row in db.query(QuestionVote.question_id)
-                        .filter(
-                            QuestionVote.telegram_user_id == telegram_user_id,
-                            QuestionVote.question_id.in_(similar_ids)
-                        )
-                        .all()
-                    }
-
+                cards_by_qid = {card.question_id: (card, my_vote) for card, my_vote in cards}
                 for qid in similar_ids:
-                    q = q_map.get(qid)
-                    if not q:
+                    row = cards_by_qid.get(qid)
+                    if not row:
                         continue
-                    similar_questions.append(
-                        build_question_card_dict(
-                            q,
-                            modules_by_qid.get(qid, []),
-                            answers_by_qid.get(qid),
-                            topics_by_qid.get(qid),
-                            qid in my_votes
-                        )
-                    )
+                    similar_questions.append(build_question_card_dict(row[0], bool(row[1])))
 
-        detail_template = """
-        <!doctype html>
-        <html lang="ru">
-
-        <head>
-          <meta charset="utf-8">
-          <meta name="viewport" content="width=device-width, initial-scale=1.0">
-          <title>{{ question.title or 'Вопрос #' + question.id|string }}</title>
-          <script src="https://telegram.org/js/telegram-web-app.js"></script>
-          <style>
-            body {
-              font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-              max-width: 800px;
-              margin: 0 auto;
-              padding: 12px 16px; /* увеличенные отступы по краям */
-              line-height: 1.5;
-              background: #f5f5f5;
-            }
-            .back-link { display: inline-block; margin-bottom: 12px; color: #667eea; text-decoration: none; font-size: 15px; }
-            .back-link:hover { text-decoration: underline; }
-            .card { background: white; padding: 16px 12px; border-radius: 10px; box-shadow: 0 1px 4px rgba(0,0,0,0.04); }
-            /* --- EDIT FORM FIELDS: убираем ограничения, делаем ширину 100% --- */
-            .edit-form .form-group input[type="text"],
-            .edit-form .form-group select,
-            .edit-form .form-group textarea {
-              width: 100%;
-              box-sizing: border-box;
-              font-size: 15px;
-              border-radius: 8px;
-              border: 1px solid #e0e0e0;
-              padding: 8px 10px;
-              resize: vertical;
-              background: #fff;
-              color: #222;
-              margin: 0;
-            }
-            .edit-form .form-group textarea#body { min-height: 180px; }
-            .edit-form .form-group textarea#answer { min-height: 220px; }
-            .edit-form .form-group textarea#summary { min-height: 80px; }
-            /* Убираем все мобильные/миниапп-специфичные стили для edit-form */
-            .modules-status-row {
-              display: flex;
-              justify-content: space-between;
-              align-items: flex-start; /* keep status aligned to top */
-              margin-bottom: 8px;
-              gap: 8px;
-            }
-            .modules { display: flex; gap: 6px; overflow: hidden; min-width: 0; }
-            .module-badge { background: #e3f2fd; color: #1976d2; padding: 4px 8px; border-radius: 10px; font-size: 12px; white-space: nowrap; flex: 0 0 auto; text-overflow: ellipsis; overflow: hidden; max-width: 160px; }
-            .modules-selector { display: flex; flex-wrap: wrap; gap: 8px; }
-            .module-checkbox-label { display: inline-flex; }
-            .module-checkbox-badge {
-              background: #e3f2fd;
-              color: #1976d2;
-              padding: 6px 12px;
-              border-radius: 999px;
-              font-size: 13px;
-              font-weight: 600;
-              cursor: pointer;
-              transition: background 0.2s, color 0.2s, box-shadow 0.2s;
-              box-shadow: inset 0 0 0 1px rgba(25, 118, 210, 0.2);
-            }
-            .module-checkbox-label.selected .module-checkbox-badge {
-              background: #1976d2;
-              color: #fff;
-              box-shadow: inset 0 0 0 1px rgba(25, 118, 210, 0.6);
-            }
-            .module-checkbox-badge:hover {
-              background: #d7ecfb;
-            }
-            .module-checkbox-label.selected .module-checkbox-badge:hover {
-              background: #1565c0;
-            }
-            .status-badge { padding: 4px 10px; border-radius: 10px; font-size: 12px; font-weight: 600; white-space: nowrap; align-self: flex-start; margin-left: 8px; flex: 0 0 auto; }
-            .status-voting { background: #fff3e0; color: #f57c00; }
-            .status-scheduled { background: #e1f5fe; color: #0288d1; }
-            .status-posted { background: #e8f5e9; color: #388e3c; }
-            .status-closed { background: #f3e5f5; color: #7b1fa2; }
-            .status-archived { background: #ede7f6; color: #512da8; }
-            h1 { margin: 0 0 8px 0; color: #222; font-size: 19px; line-height: 1.2; }
-            .meta { color: #999; font-size: 12px; margin-bottom: 8px; }
-            .body { white-space: pre-wrap; margin-bottom: 12px; color: #333; font-size: 15px; }
-            .answer-section { background: #f9fbe7; border-left: 3px solid #9ccc65; padding: 10px; border-radius: 4px; margin-top: 12px; }
-            .answer-section h2 { color: #558b2f; margin-bottom: 8px; font-size: 15px; }
-            .telegram-btn { display: inline-block; padding: 8px 16px; background: #0088cc; color: white; text-decoration: none; border-radius: 7px; margin-top: 10px; border: none; cursor: pointer; font-size: 13px; }
-            .telegram-btn:hover { background: #006699; }
-            .edit-btn { display: inline-block; padding: 7px 14px; background: #667eea; color: white; text-decoration: none; border-radius: 7px; margin-top: 10px; font-size: 13px; }
-            .edit-btn:hover { background: #5568d3; }
-            .close-discussion-btn, .archive-btn { display: inline-block; padding: 7px 14px; color: white; text-decoration: none; border-radius: 7px; margin-top: 10px; border: none; cursor: pointer; font-size: 13px; }
-            .close-discussion-btn { background: #f44336; }
-            .close-discussion-btn:hover { background: #d32f2f; }
-            .archive-btn { background: #9c27b0; }
-            .archive-btn:hover { background: #7b1fa2; }
-            .action-buttons { display: flex; justify-content: space-between; align-items: center; margin-top: 10px; gap: 8px; }
-            /* @media (max-width: 600px) { ... } — удалено для edit-form */
-          </style>
-        </head>
-        <body>
-          <a href="{{ url_for('questions.list_questions') }}" class="back-link" id="back-link">← Назад к списку вопросов</a>
-          {% if question.id != 0 %}
-          <div class=\"card\">
-            <div class=\"modules-status-row\">
-              <div class=\"modules\">
-                {% for module in modules %}
-                  <span class=\"module-badge\">{{ module.short_title or module.title }}</span>
-                {% endfor %}
-              </div>
-              <span class=\"status-badge status-{{ question.status.lower() }}\">
-                {{ get_status_label(question.status) }}
-              </span>
-            </div>
-            <h1>{{ question.title or ('Вопрос #' + question.id|string) }}</h1>
-            <div class=\"meta\">❤️ {{ votes_count }} голосов | 📅 {{ question.created_at.strftime('%d.%m.%Y %H:%M') }}</div>
-            <div class=\"body\">{{ question.body }}</div>
-            {% if answer %}
-              <div class=\"answer-section\">
-                <h2>✅ Итоговый ответ</h2>
-                {% if answer.summary %}
-                  <div style=\"background: #f5f5f5; padding: 8px; border-radius: 6px; margin-bottom: 8px; border-left: 3px solid #558b2f; font-size: 13px;\">
-                    <strong style=\"color: #558b2f;\">Краткий ответ:</strong>
-                    <p style=\"margin: 6px 0 0 0;\">{{ answer.summary }}</p>
-                  </div>
-                {% endif %}
-                <div style=\"white-space: pre-wrap; font-size: 13px;\">{{ answer.answer }}</div>
-                {% if answer.sources %}
-                  <p style=\"margin-top: 10px; font-size: 12px; color: #666;\">📚 Источники: {{ answer.sources.text if answer.sources.text else answer.sources }}</p>
-                {% endif %}
-              </div>
-            {% endif %}
-            {% if user_role and user_role >= 1 %}
-              <div class=\"action-buttons\">
-                <a href=\"#edit\" class=\"edit-btn\" onclick=\"document.getElementById('edit-form').style.display='block'; this.parentElement.style.display='none'; return false;\">✏️ Редактировать</a>
-                {% if telegram_link and question.status == 'POSTED' %}
-                  <a href="{{ telegram_link }}" target="_blank" class="telegram-btn">💬 Обсуждение ({{ messages_count - 1 if messages_count > 0 else 0 }})</a>
-                  <button onclick=\"closeDiscussion({{ question.id }})\" class=\"close-discussion-btn\" id=\"close-btn\">🔒 Закрыть обсуждение</button>
-                {% elif telegram_link and question.status == 'CLOSED' %}
-                  <a href="{{ telegram_link }}" target="_blank" class="telegram-btn">💬 Обсуждение в Telegram ({{ messages_count - 1 if messages_count > 0 else 0 }})</a>
-                  <button onclick=\"archiveQuestion({{ question.id }})\" class=\"archive-btn\" id=\"archive-btn\">📦 В архив</button>
-                {% elif telegram_link %}
-                  <a href="{{ telegram_link }}" target="_blank" class="telegram-btn">💬 Обсуждение в Telegram ({{ messages_count - 1 if messages_count > 0 else 0 }})</a>
-                {% elif question.status == 'VOTING' %}
-                  <button onclick=\"publishQuestion({{ question.id }})\" class=\"telegram-btn\" id=\"publish-btn\" style=\"background: #26a69a;\">📢 Опубликовать в Telegram</button>
-                {% endif %}
-              </div>
-            {% elif telegram_link %}
-              <a href=\"{{ telegram_link }}\" target=\"_blank\" class=\"telegram-btn\">💬 Обсуждение в Telegram ({{ messages_count - 1 if messages_count > 0 else 0 }})</a>
-            {% endif %}
-          </div>
-          {% endif %}
-          
-          {% if user_role and user_role >= 1 %}
-          <div id="edit-form" class="edit-form" style="display: {% if question.id == 0 or '#edit' in request.url %}block{% else %}none{% endif %};">
-            <h2>{% if question.id == 0 %}Создание нового вопроса{% else %}Редактирование вопроса{% endif %}</h2>
-            <form method="post" action="{{ url_for('questions.question_detail', question_id=question.id) }}">
-              <div class="form-group">
-                <label for="body">Текст вопроса:</label>
-                <textarea id="body" name="body" required>{{ question.body }}</textarea>
-              </div>
-              
-
-
-              <div class="form-group">
-                <label for="title">Краткий текст (для автозаполнения оставьте пустым):</label>
-                <div style="display: flex; gap: 8px; align-items: flex-start;">
-                  <input type="text" id="title" name="title" value="{{ question.title or '' }}" style="flex: 1;">
-                  <button type="button" class="btn btn-secondary" id="generate-title-btn" style="height: 40px;">⚡ Сгенерировать</button>
-                </div>
-                <small style="color: #666;">Автоматически создается через AI на основе текста вопроса</small>
-                <div id="title-gen-status" style="color: #888; font-size: 13px; margin-top: 4px;"></div>
-              </div>
-              
-              <div class="form-group">
-                <label for="status">Статус:</label>
-                <select id="status" name="status" onchange="toggleAnswerSection()">
-                  <option value="VOTING" {% if question.status == 'VOTING' %}selected{% endif %}>В голосовании</option>
-                  <option value="POSTED" {% if question.status == 'POSTED' %}selected{% endif %}>В обсуждении</option>
-                  <option value="CLOSED" {% if question.status == 'CLOSED' %}selected{% endif %}>Закрыто</option>
-                  <option value="ARCHIVED" {% if question.status == 'ARCHIVED' %}selected{% endif %}>Архив</option>
-                </select>
-              </div>
-              
-              <div class="form-group">
-                <label>Разделы курса:</label>
-                <div class="modules-selector">
-                  {% for module in all_modules %}
-                    <label class="module-checkbox-label {% if module.id in selected_module_ids %}selected{% endif %}" data-module-id="{{ module.id }}">
-                      <input type="checkbox" name="modules" value="{{ module.id }}" {% if module.id in selected_module_ids %}checked{% endif %} style="display: none;">
-                      <span class="module-checkbox-badge">{{ module.short_title or module.title }}</span>
-                    </label>
-                  {% endfor %}
-                </div>
-              </div>
-              
-              <div id="answer-section" style="display: {% if question.status in ['CLOSED', 'ARCHIVED'] %}block{% else %}none{% endif %};">
-                <hr style="margin: 24px 0; border: none; border-top: 1px solid #ddd;">
-                
-                <h3 style="color: #558b2f; margin-bottom: 16px;">Итоговый ответ</h3>
-                
-                <div class="form-group">
-                  <label for="answer">Полный ответ:</label>
-                  <textarea id="answer" name="answer" style="min-height: 200px;">{{ answer.answer if answer else '' }}</textarea>
-                  <small style="color: #666;">Подробный структурированный ответ после обсуждения</small>
-                </div>
-                
-
-                <div class="form-group">
-                  <label for="summary">Краткий ответ (для автозаполнения оставьте пустым):</label>
-                  <div style="display: flex; gap: 8px; align-items: flex-start;">
-                    <textarea id="summary" name="summary" style="min-height: 80px; flex: 1;">{{ answer.summary if answer else '' }}</textarea>
-                    <button type="button" class="btn btn-secondary" id="generate-summary-btn" style="height: 40px;">⚡ Сгенерировать</button>
-                  </div>
-                  <small style="color: #666;">Автоматически создается через AI на основе полного ответа</small>
-                  <div id="summary-gen-status" style="color: #888; font-size: 13px; margin-top: 4px;"></div>
-                </div>
-                
-                <div class="form-group">
-                  <label for="sources">Источники (ссылки на уроки, сообщения):</label>
-                  <input type="text" id="sources" name="sources" value="{{ answer.sources.text if (answer and answer.sources and answer.sources.text) else '' }}" placeholder="Урок 10, сообщение в форуме, https://...">
-                  <small style="color: #666;">Укажите источники информации для ответа</small>
-                </div>
-              </div>
-              
-              <div class="form-actions" style="display: flex; gap: 10px; margin-top: 18px;">
-                <button type="submit" class="edit-btn" style="background: #667eea; color: #fff; border: none; border-radius: 8px; padding: 10px 22px; font-size: 15px; font-weight: 600; cursor: pointer; transition: background 0.2s;">
-                  💾 Сохранить
-                </button>
-                <button type="button" class="cancel-btn" style="background: #f5f5f5; color: #667eea; border: 1px solid #d1d5db; border-radius: 8px; padding: 10px 22px; font-size: 15px; font-weight: 600; cursor: pointer; transition: background 0.2s;"
-                  onclick="document.getElementById('edit-form').style.display='none'; const actionButtons = document.querySelector('.action-buttons'); if (actionButtons) actionButtons.style.display='flex';">
-                  Отмена
-                </button>
-              </div>
-            </form>
-          </div>
-          {% endif %}
-          
-          <script>
-            // Публикация вопроса в Telegram
-            async function publishQuestion(questionId) {
-              const btn = document.getElementById('publish-btn');
-              if (!btn) return;
-              
-              const originalText = btn.innerHTML;
-              btn.disabled = true;
-              btn.innerHTML = '⏳ Публикуем...';
-              
-              try {
-                const response = await fetch(`/questions/${questionId}/publish`, {
-                  method: 'POST',
-                  headers: {
-                    'Content-Type': 'application/json'
-                  }
-                });
-                
-                const data = await response.json();
-                
-                if (data.success) {
-                  btn.innerHTML = '✅ Опубликовано!';
-                  btn.style.background = '#4caf50';
-                  
-                  // Перезагружаем страницу через 1 секунду
-                  setTimeout(() => {
-                    window.location.reload();
-                  }, 1000);
-                } else {
-                  alert('Ошибка: ' + (data.error || 'Не удалось опубликовать'));
-                  btn.disabled = false;
-                  btn.innerHTML = originalText;
-                }
-              } catch (error) {
-                alert('Ошибка сети: ' + error.message);
-                btn.disabled = false;
-                btn.innerHTML = originalText;
-              }
-            }
-            
-            // Закрытие обсуждения в Telegram
-            async function closeDiscussion(questionId) {
-              if (!confirm('Вы уверены, что хотите закрыть обсуждение? Это действие нельзя отменить.')) {
-                return;
-              }
-              
-              const btn = document.getElementById('close-btn');
-              const originalText = btn.innerHTML;
-              btn.disabled = true;
-              btn.innerHTML = '⏳ Закрываем...';
-              
-              try {
-                const response = await fetch(`/questions/${questionId}/close-discussion`, {
-                  method: 'POST',
-                  headers: {
-                    'Content-Type': 'application/json'
-                  }
-                });
-                
-                const data = await response.json();
-                
-                if ( data.success) {
-                  btn.innerHTML = '✅ Закрыто!';
-                  btn.style.background = '#4caf50';
-                  
-                  // Перезагружаем страницу через 1 секунду
-                  setTimeout(() => {
-                    window.location.reload();
-                  }, 1000);
-                } else {
-                  alert('Ошибка: ' + (data.error || 'Не удалось закрыть обсуждение'));
-                  btn.disabled = false;
-                  btn.innerHTML = originalText;
-                }
-              } catch (error) {
-                alert('Ошибка сети: ' + error.message);
-                btn.disabled = false;
-                btn.innerHTML = originalText;
-              }
-            }
-            
-            // Архивирование вопроса
-            async function archiveQuestion(questionId) {
-              if (!confirm('Вопрос будет перемещен в архив. Убедитесь, что итоговый ответ заполнен. Продолжить?')) {
-                return;
-              }
-              
-              const btn = document.getElementById('archive-btn');
-              const originalText = btn.innerHTML;
-              btn.disabled = true;
-              btn.innerHTML = '⏳ Архивируем...';
-              
-              try {
-                const response = await fetch(`/questions/${questionId}/archive`, {
-                  method: 'POST',
-                  headers: {
-                    'Content-Type': 'application/json'
-                  }
-                });
-                
-                const data = await response.json();
-                
-                if (data.success) {
-                  btn.innerHTML = '✅ В архиве!';
-                  btn.style.background = '#4caf50';
-                  
-                  // Перезагружаем страницу через 1 секунду
-                  setTimeout(() => {
-                    window.location.reload();
-                  }, 1000);
-                } else {
-                  alert('Ошибка: ' + (data.error || 'Не удалось архивировать'));
-                  btn.disabled = false;
-                  btn.innerHTML = originalText;
-                }
-              } catch (error) {
-                alert('Ошибка сети: ' + error.message);
-                btn.disabled = false;
-                btn.innerHTML = originalText;
-              }
-            }
-            
-            // Показ/скрытие раздела итогового ответа в зависимости от статуса
-            function toggleAnswerSection() {
-              const status = document.getElementById('status').value;
-              const answerSection = document.getElementById('answer-section');
-              
-              if (status === 'CLOSED' || status === 'ARCHIVED') {
-                answerSection.style.display = 'block';
-              } else {
-                answerSection.style.display = 'none';
-              }
-            }
-            
-            // Toggle модулей при клике
-            document.addEventListener('DOMContentLoaded', function() {
-              document.querySelectorAll('.module-checkbox-label').forEach(label => {
-                label.addEventListener('click', function(e) {
-                  e.preventDefault(); // Предотвращаем автоматическое переключение label
-                  
-                  const checkbox = this.querySelector('input[type="checkbox"]');
-                  checkbox.checked = !checkbox.checked;
-                  this.classList.toggle('selected');
-                });
-              });
-            });
-            
-            // Проверяем, открыто ли в Telegram WebApp
-            if (window.Telegram && window.Telegram.WebApp && window.Telegram.WebApp.initData) {
-              const tg = window.Telegram.WebApp;
-              tg.ready();
-              tg.expand();
-              
-              // Меняем ссылку "Назад" на Mini App версию
-              const backLink = document.getElementById('back-link');
-              if (backLink) {
-                backLink.href = '{{ url_for("questions.miniapp") }}';
-              }
-              
-              // Применяем цветовую схему Telegram
-              if (tg.themeParams.bg_color) {
-                document.body.style.background = tg.themeParams.bg_color;
-              }
-            }
-
-            // Генерация краткого заголовка (title) по кнопке
-            document.addEventListener('DOMContentLoaded', function() {
-              const genTitleBtn = document.getElementById('generate-title-btn');
-              if (genTitleBtn) {
-                genTitleBtn.addEventListener('click', async function() {
-                  const bodyField = document.getElementById('body');
-                  const titleField = document.getElementById('title');
-                  const statusDiv = document.getElementById('title-gen-status');
-                  if (!bodyField || !titleField) return;
-                  const bodyText = bodyField.value.trim();
-                  if (!bodyText) {
-                    statusDiv.textContent = 'Сначала заполните текст вопроса.';
-                    return;
-                  }
-                  genTitleBtn.disabled = true;
-                  statusDiv.textContent = '⏳ Генерируется...';
-                  try {
-                    const resp = await fetch('/questions/generate-title', {
-                      method: 'POST',
-                      headers: { 'Content-Type': 'application/json' },
-                      body: JSON.stringify({ body_text: bodyText })
-                    });
-                    const data = await resp.json();
-                    if (data.success) {
-                      titleField.value = data.title;
-                      statusDiv.textContent = '✅ Краткий текст сгенерирован';
-                    } else {
-                      statusDiv.textContent = 'Ошибка: ' + (data.error || 'Не удалось сгенерировать');
-                    }
-                  } catch (e) {
-                    statusDiv.textContent = 'Ошибка сети: ' + e.message;
-                  } finally {
-                    genTitleBtn.disabled = false;
-                  }
-                });
-              }
-            });
-
-            // Генерация краткого ответа (summary) по кнопке
-            document.addEventListener('DOMContentLoaded', function() {
-              const genBtn = document.getElementById('generate-summary-btn');
-              if (genBtn) {
-                genBtn.addEventListener('click', async function() {
-                  const answerField = document.getElementById('answer');
-                  const summaryField = document.getElementById('summary');
-                  const statusDiv = document.getElementById('summary-gen-status');
-                  const bodyField = document.getElementById('body');
-                  if (!answerField || !summaryField || !bodyField) return;
-                  const answerText = answerField.value.trim();
-                  const questionText = bodyField.value.trim();
-                  if (!answerText) {
-                    statusDiv.textContent = 'Сначала заполните полный ответ.';
-                    return;
-                  }
-                  genBtn.disabled = true;
-                  statusDiv.textContent = '⏳ Генерируется...';
-                  try {
-                    const resp = await fetch('/questions/generate-summary', {
-                      method: 'POST',
-                      headers: { 'Content-Type': 'application/json' },
-                      body: JSON.stringify({ answer_text: answerText, question_text: questionText })
-                    });
-                    const data = await resp.json();
-                    if (data.success) {
-                      summaryField.value = data.summary;
-                      statusDiv.textContent = '✅ Краткий ответ сгенерирован';
-                    } else {
-                      statusDiv.textContent = 'Ошибка: ' + (data.error || 'Не удалось сгенерировать');
-                    }
-                  } catch (e) {
-                    statusDiv.textContent = 'Ошибка сети: ' + e.message;
-                  } finally {
-                    genBtn.disabled = false;
-                  }
-                });
-              }
-            });
-          </script>
-        </body>
-        </html>
-        """
-        
         return render_template(
             "questions_detail.html",
             question=question,
@@ -2296,755 +1604,25 @@ def question_detail(question_id: int):
 # TELEGRAM MINI APP
 # ============================================================================
 
-MINIAPP_TEMPLATE = """
-<!doctype html>
-<html lang="ru">
-<head>
-  <meta charset="utf-8">
-  <meta name="viewport" content="width=device-width, initial-scale=1.0, maximum-scale=1.0, user-scalable=no">
-  <title>Вопросы курса</title>
-  <script src="https://telegram.org/js/telegram-web-app.js"></script>
-  <style>
-    :root {
-      --tg-theme-bg-color: #ffffff; 
-      --tg-theme-text-color: #000000;
-      --tg-theme-hint-color: #999999;
-      --tg-theme-link-color: #2481cc;
-      --tg-theme-button-color: #2481cc;
-      --tg-theme-button-text-color: #ffffff;
-      --tg-theme-secondary-bg-color: #f4f4f5;
-    }
-    
-    * { 
-      box-sizing: border-box; 
-      margin: 0; 
-      padding: 0; 
-      -webkit-tap-highlight-color: transparent;
-    }
-    
-    body {
-      font-family: -apple-system, BlinkMacSystemFont, 'Segoe UI', Roboto, sans-serif;
-      background: var(--tg-theme-bg-color);
-      color: var(--tg-theme-text-color);
-      line-height: 1.5;
-      padding: 0;
-      margin: 0;
-      overflow-x: hidden;
-    }
-    
-    .container {
-      padding: 8px;
-      max-width: 100%;
-    }
-    
-    /* Фильтры компактные */
-    .filters {
-      background: var(--tg-theme-secondary-bg-color);
-      border-radius: 8px;
-      padding: 8px;
-      margin-bottom: 8px;
-    }
-    
-    .filter-row {
-      margin-bottom: 6px;
-      display: flex;
-      align-items: center;
-      gap: 8px;
-    }
-    
-    .filter-row:last-child {
-      margin-bottom: 0;
-    }
-    
-    .filter-label {
-      font-weight: 600;
-      font-size: 11px;
-      color: var(--tg-theme-hint-color);
-      white-space: nowrap;
-      flex-shrink: 0;
-    }
-    
-    .filter-buttons {
-      display: flex;
-      flex-wrap: wrap;
-      gap: 4px;
-      flex: 1;
-    }
-    
-    .filter-btn {
-      padding: 3px 8px;
-      border: none;
-      background: transparent;
-      border-radius: 10px;
-      cursor: pointer;
-      font-size: 12px;
-      transition: all 0.2s;
-      text-decoration: none;
-      color: var(--tg-theme-link-color);
-      display: inline-block;
-      white-space: nowrap;
-    }
-    
-    .filter-btn.active {
-      background: var(--tg-theme-button-color);
-      color: var(--tg-theme-button-text-color);
-      font-weight: 600;
-    }
-    
-    /* Карточки */
-    .questions-list {
-      display: flex;
-      flex-direction: column;
-      gap: 8px;
-      padding-bottom: 60px;
-    }
-    
-    .question-card {
-      background: var(--tg-theme-secondary-bg-color);
-      border-radius: 8px;
-      padding: 10px;
-      border: 1px solid rgba(0, 0, 0, 0.08);
-      transition: opacity 0.2s;
-    }
-    
-    .question-card:active {
-      opacity: 0.7;
-    }
-    
-    .question-header {
-      display: flex;
-      justify-content: space-between;
-      align-items: flex-start;
-      margin-bottom: 6px;
-      gap: 8px;
-    }
-    
-    .question-header-left {
-      flex: 1;
-      min-width: 0;
-    }
-    
-    .question-header-right {
-      display: flex;
-      align-items: center;
-      gap: 8px;
-      flex-shrink: 0;
-    }
-
-    .view-btn {
-      display: inline-flex;
-      align-items: center;
-      justify-content: center;
-      width: 24px;
-      height: 24px;
-      border-radius: 50%;
-      background: var(--tg-theme-button-color);
-      color: var(--tg-theme-button-text-color);
-      text-decoration: none;
-      font-size: 12px;
-      flex-shrink: 0;
-    }
-    
-    .view-btn:active {
-      transform: scale(0.95);
-    }
-    
-    .question-modules {
-      display: flex;
-      flex-wrap: wrap;
-      gap: 3px;
-      flex: 1;
-    }
-    
-    .module-badge {
-      background: var(--tg-theme-button-color);
-      color: var(--tg-theme-button-text-color);
-      padding: 2px 6px;
-      border-radius: 8px;
-      font-size: 10px;
-      font-weight: 500;
-      opacity: 0.8;
-    }
-    
-    .status-badge {
-      padding: 2px 8px;
-      border-radius: 8px;
-      font-size: 10px;
-      font-weight: 600;
-      white-space: nowrap;
-      flex-shrink: 0;
-    }
-    
-    .status-voting { background: #fff3e0; color: #f57c00; }
-    .status-scheduled { background: #e1f5fe; color: #0288d1; }
-    .status-posted { background: #e8f5e9; color: #388e3c; }
-    .status-closed { background: #f3e5f5; color: #7b1fa2; }
-    .status-archived { background: #ede7f6; color: #512da8; }
-    
-    .question-title {
-      font-size: 14px;
-      font-weight: 600;
-      color: var(--tg-theme-text-color);
-      margin-bottom: 4px;
-      line-height: 1.3;
-    }
-    
-    .question-body {
-      color: var(--tg-theme-text-color);
-      font-size: 14px;
-      line-height: 1.4;
-    }
-    
-    .vote-button {
-      display: flex;
-      align-items: center;
-      gap: 4px;
-      background: var(--tg-theme-bg-color);
-      border: none;
-      cursor: pointer;
-      font-size: 14px;
-      padding: 4px 8px;
-      border-radius: 12px;
-      transition: all 0.2s;
-      color: var(--tg-theme-text-color);
-      flex-shrink: 0;
-    }
-    
-    .vote-button:active {
-      transform: scale(0.95);
-    }
-    
-    .vote-button.voted {
-      color: #e91e63;
-    }
-    
-    .vote-button.voted .heart {
-      animation: heartbeat 0.3s;
-    }
-    
-    @keyframes heartbeat {
-      0%, 100% { transform: scale(1); }
-      50% { transform: scale(1.3); }
-    }
-    
-    .question-meta {
-      display: flex;
-      gap: 10px;
-      font-size: 12px;
-      color: var(--tg-theme-hint-color);
-    }
-    
-    .summary-block {
-      background: rgba(156, 204, 101, 0.1);
-      border-left: 3px solid #9ccc65;
-      padding: 10px;
-      margin-top: 10px;
-      border-radius: 6px;
-    }
-    
-    .summary-block strong {
-      color: #558b2f;
-      display: block;
-      margin-bottom: 4px;
-      font-size: 12px;
-    }
-    
-    .summary-block p {
-      font-size: 12px;
-      line-height: 1.4;
-      color: var(--tg-theme-text-color);
-    }
-    
-    .read-more-btn {
-      display: inline-block;
-      margin-top: 6px;
-      color: var(--tg-theme-link-color);
-      text-decoration: none;
-      font-weight: 600;
-      font-size: 12px;
-    }
-    
-    .telegram-link {
-      display: inline-flex;
-      align-items: center;
-      gap: 4px;
-      margin-top: 8px;
-      padding: 6px 10px;
-      background: var(--tg-theme-button-color);
-      color: var(--tg-theme-button-text-color);
-      text-decoration: none;
-      border-radius: 8px;
-      font-size: 12px;
-    }
-    
-    .empty-state {
-      text-align: center;
-      padding: 40px 20px;
-      color: var(--tg-theme-hint-color);
-    }
-    
-    .empty-state-icon {
-      font-size: 48px;
-      margin-bottom: 12px;
-    }
-    
-    .loading {
-      text-align: center;
-      padding: 40px 20px;
-      color: var(--tg-theme-hint-color);
-    }
-    
-    .spinner {
-      border: 3px solid var(--tg-theme-secondary-bg-color);
-      border-top: 3px solid var(--tg-theme-button-color);
-      border-radius: 50%;
-      width: 40px;
-      height: 40px;
-      animation: spin 1s linear infinite;
-      margin: 0 auto 16px;
-    }
-    
-    @keyframes spin {
-      0% { transform: rotate(0deg); }
-      100% { transform: rotate(360deg); }
-    }
-    
-    /* Компактность на малых экранах */
-    @media (max-width: 360px) {
-      .container { padding: 8px; }
-      .question-card { padding: 12px; }
-      .filter-btn { font-size: 12px; padding: 5px 10px; }
-    }
-  </style>
-</head>
-<body>
-  <div class="container">
-    <!-- Фильтры -->
-    <div class="filters">
-      <!-- Строка 1: Темы -->
-      <div class="filter-row">
-        <div class="filter-label">📌</div>
-        <div class="filter-buttons" id="topic-filters">
-          <a href="#" class="filter-btn active" data-topic="all">Все</a>
-        </div>
-      </div>
-      
-      <!-- Строка 2: Статусы -->
-      <div class="filter-row">
-        <div class="filter-label">🔖</div>
-        <div class="filter-buttons" id="status-filters">
-          <a href="#" class="filter-btn active" data-status="all">Все</a>
-          <a href="#" class="filter-btn" data-status="VOTING">Голосование</a>
-          <a href="#" class="filter-btn" data-status="POSTED">Обсуждение</a>
-          <a href="#" class="filter-btn" data-status="CLOSED">Закрыто</a>
-          <a href="#" class="filter-btn" data-status="ARCHIVED">Архив</a>
-        </div>
-      </div>
-      
-      <!-- Строка 3: Период -->
-      <div class="filter-row">
-        <div class="filter-label">📅</div>
-        <div class="filter-buttons" id="period-filters">
-          <a href="#" class="filter-btn active" data-period="all">Все</a>
-          <a href="#" class="filter-btn" data-period="last30">Новые</a>
-          <a href="#" class="filter-btn" data-period="week">Неделя</a>
-          <a href="#" class="filter-btn" data-period="month">Месяц</a>
-        </div>
-      </div>
-    </div>
-    
-    <!-- Список вопросов -->
-    <div id="questions-container">
-      <div class="loading">
-        <div class="spinner"></div>
-        <p>Загрузка вопросов...</p>
-      </div>
-    </div>
-  </div>
-  
-  <script>
-    // Инициализация Telegram WebApp
-    const tg = window.Telegram.WebApp;
-    tg.expand();
-    
-    // Применяем цветовую схему Telegram
-    document.documentElement.style.setProperty('--tg-theme-bg-color', tg.themeParams.bg_color || '#ffffff');
-    document.documentElement.style.setProperty('--tg-theme-text-color', tg.themeParams.text_color || '#000000');
-    document.documentElement.style.setProperty('--tg-theme-hint-color', tg.themeParams.hint_color || '#999999');
-    document.documentElement.style.setProperty('--tg-theme-link-color', tg.themeParams.link_color || '#2481cc');
-    document.documentElement.style.setProperty('--tg-theme-button-color', tg.themeParams.button_color || '#2481cc');
-    document.documentElement.style.setProperty('--tg-theme-button-text-color', tg.themeParams.button_text_color || '#ffffff');
-    document.documentElement.style.setProperty('--tg-theme-secondary-bg-color', tg.themeParams.secondary_bg_color || '#f4f4f5');
-    
-    // Состояние фильтров
-    let currentFilters = {
-      topic: 'all',
-      status: 'all',
-      period: 'all'
-    };
-    
-    // Получаем initData для авторизации
-    const initData = tg.initData;
-    const user = tg.initDataUnsafe?.user;
-    let startParam = tg.initDataUnsafe?.start_param || '';
-    if (!startParam) {
-      const urlParams = new URLSearchParams(window.location.search);
-      startParam = urlParams.get('tgWebAppStartParam') || urlParams.get('startapp') || '';
-    }
-    
-    console.log('Telegram User:', user);
-    console.log('Init Data:', initData);
-    if (startParam) {
-      console.log('[MiniApp] start_param:', startParam);
-    }
-
-    function applyStartParamFilters() {
-      if (!startParam) {
-        return false;
-      }
-      if (startParam === 'status_voting') {
-        filterByStatus('VOTING');
-        return true;
-      }
-      if (startParam === 'status_posted') {
-        filterByStatus('POSTED');
-        return true;
-      }
-      return false;
-    }
-
-    function redirectFromStartParam() {
-      if (!startParam) {
-        return false;
-      }
-      let questionId = '';
-      if (startParam.startsWith('question_')) {
-        questionId = startParam.slice('question_'.length);
-      } else if (/^\d+$/.test(startParam)) {
-        questionId = startParam;
-      }
-      if (!questionId || !/^\d+$/.test(questionId)) {
-        return false;
-      }
-      const redirectKey = `miniapp_redirect_${questionId}`;
-      if (sessionStorage.getItem(redirectKey)) {
-        return false;
-      }
-      sessionStorage.setItem(redirectKey, '1');
-      window.location.href = `/questions/${questionId}?tg_init_data=${encodeURIComponent(initData)}`;
-      return true;
-    }
-
-    if (redirectFromStartParam()) {
-      // stop further initialization on this load
-    }
-    
-    // Функция загрузки вопросов
-    async function loadQuestions() {
-      const container = document.getElementById('questions-container');
-      container.innerHTML = `
-        <div class="loading">
-          <div class="spinner"></div>
-          <p>Загрузка вопросов...</p>
-        </div>
-      `;
-      
-      try {
-        const params = new URLSearchParams({
-          topic: currentFilters.topic,
-          status: currentFilters.status,
-          period: currentFilters.period
-        });
-        
-        console.log('[MiniApp] Loading questions with params:', params.toString());
-        console.log('[MiniApp] initData length:', initData ? initData.length : 0);
-        
-        const response = await fetch(`/questions/api/questions?${params}`, {
-          headers: {
-            'X-Telegram-Init-Data': initData
-          }
-        });
-        
-        console.log('[MiniApp] Response status:', response.status);
-        
-        if (!response.ok) {
-          const errorText = await response.text();
-          let errorMessage = `Failed to load questions: ${response.status}`;
-          try {
-            const errorData = JSON.parse(errorText);
-            if (errorData && errorData.message) {
-              errorMessage = errorData.message;
-            }
-          } catch (e) {
-            if (errorText) {
-              errorMessage = errorText;
-            }
-          }
-          console.error('[MiniApp] Error response:', errorText);
-          throw new Error(errorMessage);
-        }
-        
-        const data = await response.json();
-        console.log('[MiniApp] Questions loaded:', data.questions ? data.questions.length : 0);
-        renderQuestions(data.questions, data.user_role || 0);
-        
-      } catch (error) {
-        console.error('[MiniApp] Error loading questions:', error);
-        container.innerHTML = `
-          <div class="empty-state">
-            <div class="empty-state-icon">❌</div>
-            <h3>Ошибка загрузки</h3>
-            <p>Не удалось загрузить вопросы.</p>
-            <p style="font-size: 12px; color: #888;">${error.message}</p>
-          </div>
-        `;
-        tg.showAlert('Ошибка: ' + error.message);
-      }
-    }
-    
-    // Функция рендеринга вопросов
-    function renderQuestions(questions, userRole) {
-      const container = document.getElementById('questions-container');
-      const canManage = Number(userRole) >= 1;
-      
-      if (questions.length === 0) {
-        container.innerHTML = `
-          <div class="empty-state">
-            <div class="empty-state-icon">🤔</div>
-            <h3>Вопросов не найдено</h3>
-            <p>Попробуйте изменить фильтры</p>
-          </div>
-        `;
-        return;
-      }
-      
-      const html = `
-        <div class="questions-list">
-          ${questions.map(q => `
-            <div class="question-card">
-              <div class="question-header">
-                <div class="question-header-left">
-                  <div class="question-modules">
-                    ${q.modules.map(m => `<span class="module-badge" onclick="filterByModule(${m.id})">${m.title}</span>`).join('')}
-                  </div>
-                </div>
-                <div class="question-header-right">
-                  <a href="/questions/${q.id}?tg_init_data=${encodeURIComponent(initData)}" class="view-btn">📖</a>
-                  <span class="status-badge status-${q.status.toLowerCase()}" onclick="filterByStatus('${q.status}')">${q.status_label}</span>
-                  <button class="vote-button ${q.my_vote ? 'voted' : ''}" 
-                          data-question-id="${q.id}" 
-                          onclick="toggleVote(${q.id}, this)">
-                    <span class="heart">${q.my_vote ? '❤️' : '🤍'}</span>
-                    <span class="vote-count">${q.votes_count}</span>
-                  </button>
-                </div>
-              </div>
-              
-              ${q.title ? `<div class="question-title">${q.title}</div>` : ''}
-              
-              <div class="question-body">${q.body_preview}</div>
-                            ${q.summary ? `
-                <div class="summary-block">
-                  <strong>✅ Итог</strong>
-                  <p>${q.summary}</p>
-                  <a href="/questions/${q.id}" class="read-more-btn">Читать полностью →</a>
-                </div>
-              ` : ''}
-              
-              ${q.telegram_link ? `
-                <div class="telegram-row">
-                  <a href="${q.telegram_link}" class="telegram-link">
-                    💬 Перейти к обсуждению в Telegram (${q.messages_count > 0 ? q.messages_count - 1 : 0})
-                  </a>
-                  ${q.close_label ? `<div class="telegram-close">${q.close_label}</div>` : ''}
-                </div>
-              ` : ''}
-            </div>
-          `).join('')}
-        </div>
-      `;
-      
-      container.innerHTML = html;
-    }
-    
-    // Функция голосования
-    async function toggleVote(questionId, button) {
-      const heart = button.querySelector('.heart');
-      const voteCount = button.querySelector('.vote-count');
-      const wasVoted = button.classList.contains('voted');
-      
-      // Оптимистичное обновление UI
-      button.classList.toggle('voted');
-      heart.textContent = button.classList.contains('voted') ? '❤️' : '🤍';
-      
-      // Haptic feedback
-      tg.HapticFeedback.impactOccurred('light');
-      
-      try {
-        const response = await fetch(`/questions/${questionId}/vote`, {
-          method: 'POST',
-          headers: {
-            'Content-Type': 'application/json',
-            'X-Telegram-Init-Data': initData
-          }
-        });
-        
-        if (!response.ok) {
-          throw new Error('Vote failed');
-        }
-        
-        const data = await response.json();
-        
-        // Обновляем счетчик
-        voteCount.textContent = data.votes_count;
-        button.classList.toggle('voted', data.liked);
-        heart.textContent = data.liked ? '❤️' : '🤍';
-        
-        // Haptic feedback при успехе
-        tg.HapticFeedback.notificationOccurred('success');
-        
-      } catch (error) {
-        console.error('Vote error:', error);
-        // Откатываем изменения при ошибке
-        button.classList.toggle('voted', wasVoted);
-        heart.textContent = wasVoted ? '❤️' : '🤍';
-        tg.HapticFeedback.notificationOccurred('error');
-        tg.showAlert('Ошибка голосования. Попробуйте еще раз.');
-      }
-    }
-    
-    // Фильтрация по модулю
-    function filterByModule(moduleId) {
-      // Проверяем, не выбран ли уже этот фильтр
-      if (currentFilters.topic === moduleId.toString()) {
-        return; // Ничего не делаем, фильтр уже активен
-      }
-      
-      // Обновляем фильтр
-      currentFilters.topic = moduleId.toString();
-      
-      // Обновляем активную кнопку в фильтрах
-      document.querySelectorAll('#topic-filters .filter-btn').forEach(b => b.classList.remove('active'));
-      const btn = document.querySelector(`#topic-filters .filter-btn[data-topic="${moduleId}"]`);
-      if (btn) btn.classList.add('active');
-      
-      tg.HapticFeedback.selectionChanged();
-      loadQuestions();
-    }
-    
-    // Фильтрация по статусу
-    function filterByStatus(status) {
-      // Проверяем, не выбран ли уже этот фильтр
-      if (currentFilters.status === status) {
-        return; // Ничего не делаем, фильтр уже активен
-      }
-      
-      // Обновляем фильтр
-      currentFilters.status = status;
-      
-      // Обновляем активную кнопку в фильтрах
-      document.querySelectorAll('#status-filters .filter-btn').forEach(b => b.classList.remove('active'));
-      const btn = document.querySelector(`#status-filters .filter-btn[data-status="${status}"]`);
-      if (btn) btn.classList.add('active');
-      
-      tg.HapticFeedback.selectionChanged();
-      loadQuestions();
-    }
-    
-    // Форматирование даты
-    function formatDate(dateString) {
-      const date = new Date(dateString);
-      const day = String(date.getDate()).padStart(2, '0');
-      const month = String(date.getMonth() + 1).padStart(2, '0');
-      const year = date.getFullYear();
-      return `${day}.${month}.${year}`;
-    }
-    
-    // Обработчики фильтров
-    function setupFilters() {
-      // Topic filters
-      document.querySelectorAll('#topic-filters .filter-btn').forEach(btn => {
-        btn.addEventListener('click', (e) => {
-          e.preventDefault();
-          document.querySelectorAll('#topic-filters .filter-btn').forEach(b => b.classList.remove('active'));
-          btn.classList.add('active');
-          currentFilters.topic = btn.dataset.topic;
-          loadQuestions();
-          tg.HapticFeedback.selectionChanged();
-        });
-      });
-      
-      // Status filters
-      document.querySelectorAll('#status-filters .filter-btn').forEach(btn => {
-        btn.addEventListener('click', (e) => {
-          e.preventDefault();
-          document.querySelectorAll('#status-filters .filter-btn').forEach(b => b.classList.remove('active'));
-          btn.classList.add('active');
-          currentFilters.status = btn.dataset.status;
-          loadQuestions();
-          tg.HapticFeedback.selectionChanged();
-        });
-      });
-      
-      // Period filters
-      document.querySelectorAll('#period-filters .filter-btn').forEach(btn => {
-        btn.addEventListener('click', (e) => {
-          e.preventDefault();
-          document.querySelectorAll('#period-filters .filter-btn').forEach(b => b.classList.remove('active'));
-          btn.classList.add('active');
-          currentFilters.period = btn.dataset.period;
-          loadQuestions();
-          tg.HapticFeedback.selectionChanged();
-        });
-      });
-    }
-    
-    // Загрузка модулей для фильтров
-    async function loadModules() {
-      try {
-        const response = await fetch('/questions/api/modules');
-        if (response.ok) {
-          const modules = await response.json();
-          const topicFilters = document.getElementById('topic-filters');
-          
-          modules.forEach(module => {
-            const btn = document.createElement('a');
-            btn.href = '#';
-            btn.className = 'filter-btn';
-            btn.dataset.topic = module.id;
-            btn.textContent = module.title;
-            topicFilters.appendChild(btn);
-          });
-          
-          setupFilters();
-        }
-      } catch (error) {
-        console.error('Error loading modules:', error);
-      }
-    }
-    
-    // Инициализация
-    document.addEventListener('DOMContentLoaded', () => {
-      loadModules();
-      setupFilters();
-      const applied = applyStartParamFilters();
-      if (!applied) {
-        loadQuestions();
-      }
-      
-      // Сообщаем Telegram что приложение готово
-      tg.ready();
-    });
-  </script>
-</body>
-</html>
-"""
+# Оболочка Mini App не зависит от пользователя: рендерим один раз на процесс.
+# CSS/JS лежат в static/miniapp и кешируются браузером надолго (версия в URL).
+_MINIAPP_SHELL = {}
 
 
 @questions_bp.route("/miniapp", methods=["GET"])
 def miniapp():
     """Mini App версия для Telegram WebView."""
-    return render_template_string(MINIAPP_TEMPLATE)
+    shell = _MINIAPP_SHELL.get('page')
+    if shell is None:
+        body = render_template("questions/miniapp.html")
+        shell = (body, hashlib.sha1(body.encode('utf-8')).hexdigest())
+        _MINIAPP_SHELL['page'] = shell
+
+    body, etag = shell
+    if request.if_none_match.contains_weak(etag):
+        return not_modified_response(etag, max_age=300)
+    response = current_app.response_class(body, mimetype='text/html')
+    return set_revalidate_headers(response, etag, max_age=300)
 
 
 # ============================================================================
@@ -3060,6 +1638,13 @@ def api_questions():
       - status: статус вопроса или 'all'
       - period: 'all', 'last30', 'week', 'month', 'year'
         'last30' — последние 30 вопросов (после 'Все время')
+
+    Пагинация (keyset):
+      - limit: размер страницы (по умолчанию Config.QUESTIONS_PAGE_SIZE)
+      - cursor: значение next_cursor из предыдущего ответа
+
+    format=compact — вместо questions отдаются fields/rows и словари
+    modules/statuses (см. build_compact_questions).
     """
     
     print(f"[API] /api/questions called")
@@ -3069,6 +1654,7 @@ def api_questions():
     topic_filter = request.args.get('topic', 'all')
     status_filter = request.args.get('status', 'all')
     period_filter = request.args.get('period', 'all')
+    compact = request.args.get('format') == 'compact'
     
     # ???????? initData ?? ????????
     init_data = request.headers.get('X-Telegram-Init-Data', '')
@@ -3083,134 +1669,62 @@ def api_questions():
 
     db = SessionLocal()
     try:
-        # ??????? ?????? ??? ???????? ???????
-        votes_subquery = (
-            db.query(
-                QuestionVote.question_id,
-            )
-            .group_by(QuestionVote.question_id)
-            .subquery()
+        # Версия данных — глобальная версия карточек (голоса тоже её сдвигают).
+        # Совпала с If-None-Match — отвечаем 304 без запроса карточек и сериализации.
+        version, last_updated = get_question_cards_version(db)
+        etag = make_etag(
+            'questions', version, telegram_user_id, user_role,
+            topic_filter, status_filter, period_filter,
+            request.args.get('cursor', ''), request.args.get('limit', ''), compact,
+            datetime.utcnow().date(),  # close_label зависит от текущей даты
         )
+        if request.if_none_match.contains_weak(etag):
+            return not_modified_response(etag, last_updated)
+
+        # Основной запрос: одна таблица question_cards
+        query = query_question_cards(db, telegram_user_id)
+        query = filter_question_cards(query, topic_filter, status_filter, period_filter)
         
-        # Основной запрос
-        if telegram_user_id:
-            my_vote_exists = exists().where(
-                QuestionVote.question_id == Question.id,
-                QuestionVote.telegram_user_id == telegram_user_id
-            )
-            
-            query = (
-                db.query(
-                    Question,
-                    Question.votes_count.label('votes_count'),
-                    my_vote_exists.label('my_vote')
-                )
-            )
+        # Keyset-пагинация: сортировка по (votes_count, created_at, id),
+        # для POSTED — по posted_at; курсор указывает на последнюю строку страницы
+        sort_mode = get_questions_sort_mode(status_filter, period_filter)
+        sort_columns = get_questions_sort_columns(sort_mode)
+        cursor_values = decode_questions_cursor(request.args.get('cursor', ''), sort_mode)
+        if cursor_values:
+            query = query.filter(tuple_(*sort_columns) < tuple_(*cursor_values))
+        query = query.order_by(*[col.desc() for col in sort_columns])
+
+        if period_filter == 'last30':
+            # "Новые" — всегда ровно одна страница из 30 последних вопросов
+            page_size = 30
         else:
-            query = (
-                db.query(
-                    Question,
-                    Question.votes_count.label('votes_count'),
-                    func.cast(False, Integer).label('my_vote')
-                )
-            )
-        
-        # Применяем фильтры
-        if topic_filter != 'all':
-            query = query.join(
-                QuestionStepikModule,
-                Question.id == QuestionStepikModule.question_id
-            ).filter(QuestionStepikModule.module_id == int(topic_filter))
-        
-        if status_filter != 'all':
-            query = query.filter(Question.status == status_filter)
-        
-        period_date = get_period_filter(period_filter)
-        if period_date:
-          query = query.filter(Question.created_at >= period_date)
-        # Сортировка
-        if status_filter == 'POSTED':
-            query = query.order_by(
-              Question.posted_at.desc()
-            )
-        elif period_filter == 'last30':
-            query = query.order_by(
-              Question.created_at.desc()
+            page_size = request.args.get('limit', Config.QUESTIONS_PAGE_SIZE, type=int)
+            page_size = max(1, min(page_size, Config.QUESTIONS_PAGE_SIZE_MAX))
+
+        results = query.limit(page_size + 1).all()
+        has_more = len(results) > page_size and period_filter != 'last30'
+        results = results[:page_size]
+
+        next_cursor = None
+        if has_more and results:
+            next_cursor = encode_questions_cursor(
+                sort_mode, get_questions_cursor_values(sort_mode, results[-1][0])
             )
-        else :    
-             query = query.order_by(
-               Question.votes_count.desc(),
-               Question.created_at.desc()
-          )
-        
-        if period_filter == 'last30':
-          query = query.limit(30)
-        
-        results = query.all();
         
-        # Собираем id всех вопросов
-        question_ids = [q.id for q, *_ in results]
-
-        # Получаем все модули для всех вопросов одним запросом
-        modules_by_qid = {}
-        if question_ids:
-          qsm = db.query(QuestionStepikModule).filter(QuestionStepikModule.question_id.in_(question_ids)).all()
-          module_ids = list({m.module_id for m in qsm})
-          modules = db.query(StepikModule).filter(StepikModule.id.in_(module_ids)).all()
-          modules_dict = {m.id: m for m in modules}
-          for m in qsm:
-            modules_by_qid.setdefault(m.question_id, []).append(modules_dict.get(m.module_id))
-          # Сортируем модули по позиции
-          for qid in modules_by_qid:
-            modules_by_qid[qid] = sorted([mod for mod in modules_by_qid[qid] if mod], key=lambda m: m.position)
-
-        # Получаем все ответы одним запросом
-        answers = db.query(QuestionAnswer).filter(QuestionAnswer.question_id.in_(question_ids)).all() if question_ids else []
-        answers_by_qid = {a.question_id: a for a in answers}
-
-        # Получаем все Telegram темы одним запросом
-        topics = db.query(TelegramTopic).filter(TelegramTopic.question_id.in_(question_ids)).all() if question_ids else []
-        topics_by_qid = {t.question_id: t for t in topics}
-
-        questions_data = []
-        for question, votes_count, my_vote in results:
-            modules = modules_by_qid.get(question.id, [])
-            answer = answers_by_qid.get(question.id)
-            # Use summary (краткий ответ) if present
-            summary = answer.summary if answer and hasattr(answer, 'summary') and answer.summary else None
-            # Telegram тема
-            telegram_link = None
-            messages_count = 0
-            topic = topics_by_qid.get(question.id)
-            if topic:
-                telegram_link = f"https://t.me/c/{str(topic.chat_id)[4:]}/{topic.message_thread_id}"
-                messages_count = topic.messages_count or 0
-                print(f"[DEBUG] Question {question.id}: messages_count = {messages_count}")
-            close_label = None
-            if question.status == 'POSTED' and topic:
-                close_label = get_close_label(topic.close_at)
-            # Превью текста
-            body_preview = question.body[:250] + '...' if len(question.body) > 250 else question.body
-            questions_data.append({
-                'id': question.id,
-                'title': question.title,
-                'body_preview': body_preview,
-                'status': question.status,
-                'status_label': get_status_label(question.status),
-                'votes_count': votes_count,
-                'my_vote': bool(my_vote),
-                'modules': [{'id': m.id, 'title': m.short_title or m.title} for m in modules],
-                'summary': summary,
-                'telegram_link': telegram_link,
-                'messages_count': messages_count,
-                'close_label': close_label,
-                'created_at': question.created_at.isoformat() if question.created_at else None
-            })
-        return jsonify({
+        questions_data = [build_api_question_dict(card, my_vote) for card, my_vote in results]
+        payload = {
             'success': True,
             'user_role': user_role,
-            'questions': questions_data
-        })
+            'next_cursor': next_cursor,
+            'has_more': has_more,
+        }
+        if compact:
+            payload['format'] = 'compact'
+            payload.update(build_compact_questions(questions_data))
+        else:
+            payload['questions'] = questions_data
+        response = jsonify(payload)
+        return set_revalidate_headers(response, etag, last_updated)
         
     except Exception as e:
         print(f"[API] Error in api_questions: {e}")
@@ -3224,18 +1738,198 @@ def api_questions():
         db.close()
 
 
+@questions_bp.route("/api/votes/sync", methods=["POST"])
+def api_votes_sync():
+    """Пакетная синхронизация голосов: {"votes": [{"question_id": 1, "liked": true}, ...]}.
+
+    Mini App копит тапы и отправляет желаемые состояния одним запросом.
+    Всё применяется в одной транзакции тремя set-based запросами; при повторе
+    id в списке побеждает последнее значение. Строки questions блокируются
+    по возрастанию id (как их затронут триггеры), чтобы встречные пакеты не
+    ловили deadlock. Несуществующие вопросы пропускаются.
+    """
+    init_data = request.headers.get('X-Telegram-Init-Data', '')
+    auth = ensure_session_user(init_data)
+    if not auth["user_id"] or auth["user_role"] is None or auth["user_role"] < 0:
+        return jsonify({'success': False, 'error': 'access_denied', 'message': 'Нет доступа'}), 403
+    telegram_user_id = auth["telegram_id"]
+    if not telegram_user_id:
+        return jsonify({'success': False, 'error': 'No telegram_id', 'message': 'Telegram ID не найден'}), 400
+
+    data = request.get_json(silent=True) or {}
+    items = data.get('votes')
+    if not isinstance(items, list) or len(items) > Config.VOTES_SYNC_MAX_ITEMS:
+        return jsonify({'success': False, 'error': 'invalid_votes'}), 400
+
+    desired = {}
+    for item in items:
+        try:
+            desired[int(item['question_id'])] = bool(item['liked'])
+        except (TypeError, ValueError, KeyError):
+            return jsonify({'success': False, 'error': 'invalid_votes'}), 400
+    if not desired:
+        return jsonify({'success': True, 'added': 0, 'removed': 0, 'votes': []})
+
+    ensure_telegram_user_saved(telegram_user_id)
+    ids = sorted(desired)
+    like_ids = [qid for qid in ids if desired[qid]]
+    unlike_ids = [qid for qid in ids if not desired[qid]]
+    params = {'ids': ids, 'like_ids': like_ids, 'unlike_ids': unlike_ids, 'telegram_user_id': telegram_user_id}
+
+    db = SessionLocal()
+    try:
+        existing = [row[0] for row in db.execute(
+            text("SELECT id FROM questions WHERE id = ANY(:ids) ORDER BY id FOR NO KEY UPDATE"),
+            params,
+        )]
+        added = removed = 0
+        if like_ids:
+            added = db.execute(
+                text(
+                    """
+                    INSERT INTO question_votes (question_id, telegram_user_id, voted_at)
+                    SELECT q.id, :telegram_user_id, NOW() AT TIME ZONE 'utc'
+                    FROM questions q
+                    WHERE q.id = ANY(:like_ids)
+                    ORDER BY q.id
+                    ON CONFLICT DO NOTHING
+                    """
+                ),
+                params,
+            ).rowcount
+        if unlike_ids:
+            removed = db.execute(
+                text(
+                    """
+                    DELETE FROM question_votes
+                    WHERE telegram_user_id = :telegram_user_id
+                      AND question_id = ANY(:unlike_ids)
+                    """
+                ),
+                params,
+            ).rowcount
+        counts = []
+        if existing:
+            counts = db.execute(
+                text("SELECT id, votes_count FROM questions WHERE id = ANY(:ids) ORDER BY id"),
+                params,
+            ).all()
+        db.commit()
+        return jsonify({
+            'success': True,
+            'added': added,
+            'removed': removed,
+            'votes': [
+                {'question_id': qid, 'liked': desired[qid], 'votes_count': votes_count}
+                for qid, votes_count in counts
+            ],
+        })
+    except Exception as e:
+        db.rollback()
+        return jsonify({'success': False, 'error': 'Server error', 'message': str(e)}), 500
+    finally:
+        db.close()
+
+
+@questions_bp.route("/api/votes/stream", methods=["GET"])
+def api_votes_stream():
+    """SSE-поток изменений голосов: event "votes", data {question_id, votes_count}.
+
+    Источник — NOTIFY question_votes из триггера update_votes_count.
+    EventSource не умеет заголовки, а initData в URL попал бы в логи, поэтому
+    поток авторизуется только cookie сессии: её ставит предыдущий запрос
+    Mini App к /api/questions. Поток занимает поток воркера (gthread, см.
+    gunicorn.conf.py), поэтому клиентов не больше VOTES_STREAM_MAX_CLIENTS —
+    доли от GUNICORN_THREADS.
+    """
+    auth = ensure_session_user()
+    if not auth["user_id"] or auth["user_role"] is None or auth["user_role"] < 0:
+        return jsonify({"success": False, "error": "access_denied", "message": "Нет доступа"}), 403
+
+    queue = get_vote_broadcaster().try_subscribe(Config.VOTES_STREAM_MAX_CLIENTS)
+    if queue is None:
+        return jsonify({"success": False, "error": "too_many_streams"}), 503
+
+    response = current_app.response_class(
+        stream_vote_events(queue, Config.VOTES_STREAM_MAX_SECONDS),
+        mimetype='text/event-stream',
+    )
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@questions_bp.route("/api/search", methods=["GET"])
+def api_search():
+    """Гибридный поиск по вопросам и ответам (для Mini App).
+
+    Параметры:
+      - q: поисковый запрос (от 2 символов)
+      - limit: число результатов (по умолчанию 20, не больше 50)
+
+    Полнотекстовый поиск (tsvector 'russian'), pg_trgm и близость эмбеддингов
+    объединяются reciprocal-rank fusion одним запросом (см. app/search.py).
+    """
+    query_text = (request.args.get('q') or '').strip()
+    limit = max(1, min(request.args.get('limit', 20, type=int), 50))
+
+    init_data = request.headers.get('X-Telegram-Init-Data', '')
+    auth = ensure_session_user(init_data)
+    user_role = auth["user_role"]
+    telegram_user_id = auth["telegram_id"]
+    if not auth["user_id"] or user_role is None or user_role < 0:
+        return jsonify({"success": False, "error": "access_denied", "message": "Нет доступа"}), 403
+    if len(query_text) < 2:
+        return jsonify({'success': True, 'query': query_text, 'questions': []})
+
+    db = SessionLocal()
+    try:
+        ranked = search_question_ids(db, query_text[:200], limit)
+        scores = dict(ranked)
+        rows = (
+            query_question_cards(db, telegram_user_id)
+            .filter(QuestionCard.question_id.in_(list(scores)))
+            .all()
+        ) if scores else []
+        rows.sort(key=lambda row: scores[row[0].question_id], reverse=True)
+
+        questions_data = []
+        for card, my_vote in rows:
+            item = build_api_question_dict(card, my_vote)
+            item['score'] = round(scores[card.question_id], 6)
+            questions_data.append(item)
+        return jsonify({'success': True, 'query': query_text, 'questions': questions_data})
+    except Exception as e:
+        print(f"[API] Error in api_search: {e}")
+        db.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 500
+    finally:
+        db.close()
+
+
 @questions_bp.route("/api/modules", methods=["GET"])
 def api_modules():
     """API эндпоинт для получения списка модулей."""
     
     db = SessionLocal()
     try:
+        # Модули почти не меняются: версия — хеш отображаемых полей, считается в БД
+        version = db.execute(text(
+            "SELECT md5(COALESCE(string_agg("
+            "id || ':' || COALESCE(short_title, title) || ':' || position, ',' ORDER BY position, id"
+            "), '')) FROM stepik_modules"
+        )).scalar()
+        etag = make_etag('modules', version)
+        if request.if_none_match.contains_weak(etag):
+            return not_modified_response(etag, max_age=300)
+
         modules = db.query(StepikModule).order_by(StepikModule.position).all()
         
-        return jsonify([
+        response = jsonify([
             {'id': m.id, 'title': m.short_title or m.title, 'position': m.position}
             for m in modules
         ])
+        return set_revalidate_headers(response, etag, max_age=300)
         
     finally:
         db.close()
@@ -0,0 +1,143 @@
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+from threading import Lock
+from typing import List, Optional, Tuple
+
+from sqlalchemy import text
+
+from .config import Config
+from .embeddings import generate_embedding
+from .models import QuestionEmbedding
+
+# Константа reciprocal rank fusion (у Cormack et al. — 60).
+RRF_K = 60
+
+_QUERY_EMBEDDINGS: "OrderedDict[str, list]" = OrderedDict()
+_QUERY_EMBEDDINGS_LOCK = Lock()
+_QUERY_EMBEDDINGS_MAX = 512
+# Ограничивает число одновременных вызовов API эмбеддингов из запросов пользователей
+_EMBEDDING_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="query-embedding")
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.split()).lower()
+
+
+def _remember_embedding(key: str, future) -> None:
+    if future.cancelled() or future.exception() is not None or future.result() is None:
+        return
+    with _QUERY_EMBEDDINGS_LOCK:
+        _QUERY_EMBEDDINGS[key] = future.result()
+        _QUERY_EMBEDDINGS.move_to_end(key)
+        while len(_QUERY_EMBEDDINGS) > _QUERY_EMBEDDINGS_MAX:
+            _QUERY_EMBEDDINGS.popitem(last=False)
+
+
+def get_text_embedding(text_value: str, timeout: Optional[float] = None) -> Optional[list]:
+    """Эмбеддинг текста из LRU-кэша; вычисление ждём не дольше timeout секунд.
+
+    По таймауту возвращается None (поиск и проверка дублей работают без
+    векторной части), а досчитанный эмбеддинг всё равно попадает в кэш.
+    """
+    with _QUERY_EMBEDDINGS_LOCK:
+        if text_value in _QUERY_EMBEDDINGS:
+            _QUERY_EMBEDDINGS.move_to_end(text_value)
+            return _QUERY_EMBEDDINGS[text_value]
+    future = _EMBEDDING_EXECUTOR.submit(generate_embedding, text_value)
+    future.add_done_callback(lambda f: _remember_embedding(text_value, f))
+    try:
+        return future.result(timeout=timeout)
+    except TimeoutError:
+        future.cancel()
+        print(f"[Search] Embedding timed out after {timeout}s.")
+    except Exception as e:
+        print(f"[Search] Embedding failed: {e}")
+    return None
+
+
+def get_query_embedding(query: str) -> Optional[list]:
+    """Эмбеддинг поискового запроса; запоминается (LRU), потому что запросы часто повторяются."""
+    return get_text_embedding(_normalize_query(query), Config.QUERY_EMBEDDING_TIMEOUT)
+
+
+_LEXICAL_CTES = """
+    fts AS (
+        SELECT question_id, row_number() OVER (ORDER BY score DESC) AS rank
+        FROM (
+            SELECT c.question_id, ts_rank_cd(c.search_vector, tsq) AS score
+            FROM question_cards c, websearch_to_tsquery('russian', :q) AS tsq
+            WHERE c.search_vector @@ tsq
+            ORDER BY score DESC
+            LIMIT :depth
+        ) s
+    ),
+    trgm AS (
+        SELECT question_id, row_number() OVER (ORDER BY score DESC) AS rank
+        FROM (
+            SELECT c.question_id, word_similarity(:q, c.search_text) AS score
+            FROM question_cards c
+            WHERE :q <% c.search_text
+            ORDER BY score DESC
+            LIMIT :depth
+        ) s
+    )"""
+
+_VECTOR_CTE = """,
+    vec AS (
+        SELECT question_id, row_number() OVER (ORDER BY distance) AS rank
+        FROM (
+            SELECT e.question_id, {column} <=> CAST(:embedding AS {type}) AS distance
+            FROM question_embeddings e
+            ORDER BY distance
+            LIMIT :depth
+        ) s
+    )"""
+
+
+def search_question_ids(db, query: str, limit: int = 20) -> List[Tuple[int, float]]:
+    """Гибридный поиск: полнотекстовый, триграммный и векторный рейтинги, слитые RRF.
+
+    Каждый рейтинг даёт 1 / (RRF_K + rank) своим первым depth результатам,
+    всё в одном запросе. Без эмбеддинга запроса (или если его размерность
+    не совпадает с колонкой) векторный рейтинг пропускается.
+    Возвращает [(question_id, score)] от лучшего.
+    """
+    depth = max(limit * 3, 50)
+    params = {"q": query, "depth": depth, "limit": limit, "rrf_k": RRF_K}
+    ctes = _LEXICAL_CTES
+    rankings = ["fts", "trgm"]
+
+    embedding = get_query_embedding(query)
+    dims = QuestionEmbedding.embedding.type.dim
+    if embedding is not None and len(embedding) != dims:
+        # Провайдер с другой размерностью: <=> упал бы с ошибкой, ищем без векторного рейтинга
+        print(f"[Search] Query embedding has {len(embedding)} dims, column has {dims}; vector ranking skipped.")
+        embedding = None
+    if embedding is not None:
+        if (getattr(Config, "EMBEDDING_INDEX_MODE", "") or "").lower() == "hnsw":
+            db.execute(
+                text("SELECT set_config('hnsw.ef_search', :ef, true)"),
+                {"ef": str(max(int(Config.EMBEDDING_HNSW_EF_SEARCH), depth))},
+            )
+            column, vector_type = f"e.embedding::halfvec({dims})", f"halfvec({dims})"
+        else:
+            column, vector_type = "e.embedding", f"vector({dims})"
+        ctes += _VECTOR_CTE.format(column=column, type=vector_type)
+        rankings.append("vec")
+        params["embedding"] = "[" + ",".join(str(float(x)) for x in embedding) + "]"
+
+    union = " UNION ALL ".join(f"SELECT question_id, rank FROM {name}" for name in rankings)
+    rows = db.execute(
+        text(
+            f"""
+            WITH {ctes}
+            SELECT question_id, SUM(1.0 / (:rrf_k + rank)) AS score
+            FROM ({union}) ranked
+            GROUP BY question_id
+            ORDER BY score DESC, question_id DESC
+            LIMIT :limit
+            """
+        ),
+        params,
+    ).all()
+    return [(row[0], float(row[1])) for row in rows]
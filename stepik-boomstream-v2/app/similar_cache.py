@@ -1,33 +1,388 @@
+from bisect import bisect_right
+from collections import OrderedDict
+from datetime import datetime, timedelta
 from threading import Lock, Thread
-from typing import List, Optional
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+import json
+import os
+import tempfile
 import time
 
+from pgvector.sqlalchemy import HALFVEC
+from sqlalchemy import cast, delete, or_, select, text
+from sqlalchemy.dialects.postgresql import insert
+
+from .config import Config
 from .db import SessionLocal
-from .embeddings import upsert_question_embedding
-from .models import Question, QuestionAnswer, QuestionEmbedding, QuestionStepikModule, StepikModule
+from .embedding_jobs import enqueue_embedding_job, notify_embedding_worker
+from .embedding_providers import get_embedding_provider
+from .embeddings import get_embedding_model_and_dims
+from .models import (
+    Question,
+    QuestionAnswer,
+    QuestionEmbedding,
+    QuestionStepikModule,
+    SimilarQuestionsCache,
+    StepikModule,
+)
+from .vector_index import NumpyVectorIndex, get_vector_index, is_numpy_engine_enabled
+
+def get_similar_cache_version() -> str:
+    """Версия закэшированных списков соседей; меняется вместе с моделью эмбеддингов."""
+    model, dims = get_embedding_model_and_dims()
+    return f"{model}:{dims}"
+
+
+def _ttl_cutoff() -> Optional[datetime]:
+    ttl = getattr(Config, "SIMILAR_CACHE_TTL", 0)
+    if not ttl:
+        return None
+    return datetime.utcnow() - timedelta(seconds=ttl)
+
+
+class MemorySimilarCache:
+    """LRU-кэш в памяти процесса с TTL на запись (у каждого воркера gunicorn своя копия).
+
+    Запись — (similar_ids, distances, stored_at); distances — расстояния до
+    similar_ids по возрастанию или None, если список подобран по модулям.
+    """
+
+    def __init__(self, max_entries: int = 5000, ttl: int = 0) -> None:
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[int, Tuple[List[int], Optional[List[float]], float]]" = OrderedDict()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def _is_expired(self, stored_at: float, now: float) -> bool:
+        return bool(self.ttl) and now - stored_at > self.ttl
+
+    def get(self, question_id: int) -> Optional[List[int]]:
+        with self._lock:
+            entry = self._data.get(question_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            similar_ids, _, stored_at = entry
+            if self._is_expired(stored_at, time.time()):
+                del self._data[question_id]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._data.move_to_end(question_id)
+            self.hits += 1
+            return list(similar_ids)
+
+    def get_entries(self, question_ids: Iterable[int]) -> Dict[int, Tuple[List[int], Optional[List[float]]]]:
+        now = time.time()
+        result = {}
+        with self._lock:
+            for question_id in question_ids:
+                entry = self._data.get(question_id)
+                if entry is None or self._is_expired(entry[2], now):
+                    continue
+                similar_ids, distances, _ = entry
+                result[question_id] = (list(similar_ids), None if distances is None else list(distances))
+        return result
+
+    def set(self, question_id: int, similar_ids: List[int], distances: Optional[List[float]] = None) -> None:
+        with self._lock:
+            self._data[question_id] = (
+                list(similar_ids),
+                None if distances is None else list(distances),
+                time.time(),
+            )
+            self._data.move_to_end(question_id)
+            while self.max_entries and len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, question_ids: Iterable[int]) -> None:
+        ids = set(question_ids)
+        with self._lock:
+            for key in list(self._data):
+                if key in ids or ids.intersection(self._data[key][0]):
+                    del self._data[key]
+
+    def set_many(
+        self, entries: Dict[int, List[int]], distances: Optional[Dict[int, List[float]]] = None
+    ) -> None:
+        distances = distances or {}
+        for question_id, similar_ids in entries.items():
+            self.set(question_id, similar_ids, distances.get(question_id))
+
+    def cached_ids(self) -> Set[int]:
+        now = time.time()
+        with self._lock:
+            return {
+                key for key, (_, _, stored_at) in self._data.items()
+                if not self._is_expired(stored_at, now)
+            }
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class PostgresSimilarCache:
+    """Кэш в таблице similar_questions_cache: общий для всех воркеров и переживает рестарты."""
+
+    def _current(self, stmt):
+        stmt = stmt.where(SimilarQuestionsCache.version == get_similar_cache_version())
+        cutoff = _ttl_cutoff()
+        if cutoff is not None:
+            stmt = stmt.where(SimilarQuestionsCache.computed_at >= cutoff)
+        return stmt
+
+    def get(self, question_id: int) -> Optional[List[int]]:
+        db = SessionLocal()
+        try:
+            row = db.execute(
+                self._current(select(SimilarQuestionsCache.similar_ids)).where(
+                    SimilarQuestionsCache.question_id == question_id
+                )
+            ).first()
+            return list(row[0]) if row else None
+        finally:
+            db.close()
+
+    def get_entries(self, question_ids: Iterable[int]) -> Dict[int, Tuple[List[int], Optional[List[float]]]]:
+        ids = list(set(question_ids))
+        if not ids:
+            return {}
+        db = SessionLocal()
+        try:
+            rows = db.execute(
+                self._current(
+                    select(
+                        SimilarQuestionsCache.question_id,
+                        SimilarQuestionsCache.similar_ids,
+                        SimilarQuestionsCache.similar_distances,
+                    )
+                ).where(SimilarQuestionsCache.question_id.in_(ids))
+            ).all()
+            return {
+                row[0]: (list(row[1]), None if row[2] is None else list(row[2]))
+                for row in rows
+            }
+        finally:
+            db.close()
+
+    def set(self, question_id: int, similar_ids: List[int], distances: Optional[List[float]] = None) -> None:
+        self.set_many({question_id: similar_ids}, {question_id: distances} if distances is not None else None)
+
+    def set_many(
+        self, entries: Dict[int, List[int]], distances: Optional[Dict[int, List[float]]] = None
+    ) -> None:
+        if not entries:
+            return
+        now = datetime.utcnow()
+        version = get_similar_cache_version()
+        distances = distances or {}
+        stmt = insert(SimilarQuestionsCache).values([
+            {
+                "question_id": question_id,
+                "similar_ids": list(similar_ids),
+                "similar_distances": distances.get(question_id),
+                "computed_at": now,
+                "version": version,
+            }
+            for question_id, similar_ids in entries.items()
+        ])
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[SimilarQuestionsCache.question_id],
+            set_={
+                "similar_ids": stmt.excluded.similar_ids,
+                "similar_distances": stmt.excluded.similar_distances,
+                "computed_at": stmt.excluded.computed_at,
+                "version": stmt.excluded.version,
+            },
+        )
+        db = SessionLocal()
+        try:
+            db.execute(stmt)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
 
-_CACHE = {}
-_LOCK = Lock()
-_SESSION_START_KEY = "__session_start_ts__"
+    def invalidate(self, question_ids: Iterable[int]) -> None:
+        ids = list(set(question_ids))
+        if not ids:
+            return
+        db = SessionLocal()
+        try:
+            db.execute(
+                delete(SimilarQuestionsCache).where(
+                    or_(
+                        SimilarQuestionsCache.question_id.in_(ids),
+                        SimilarQuestionsCache.similar_ids.overlap(ids),
+                    )
+                )
+            )
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def cached_ids(self) -> Set[int]:
+        db = SessionLocal()
+        try:
+            rows = db.execute(self._current(select(SimilarQuestionsCache.question_id))).all()
+            return {row[0] for row in rows}
+        finally:
+            db.close()
+
+
+class DiskSimilarCache:
+    """По JSON-файлу на вопрос в общем каталоге (например, /dev/shm — общая память)."""
+
+    def __init__(self, directory: str) -> None:
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, question_id: int) -> str:
+        return os.path.join(self.directory, f"{question_id}.json")
+
+    def _read(self, path: str) -> Optional[dict]:
+        try:
+            with open(path, encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if entry.get("version") != get_similar_cache_version():
+            return None
+        cutoff = _ttl_cutoff()
+        if cutoff is not None and datetime.fromisoformat(entry["computed_at"]) < cutoff:
+            return None
+        return entry
+
+    def get(self, question_id: int) -> Optional[List[int]]:
+        entry = self._read(self._path(question_id))
+        return list(entry["similar_ids"]) if entry else None
+
+    def get_entries(self, question_ids: Iterable[int]) -> Dict[int, Tuple[List[int], Optional[List[float]]]]:
+        result = {}
+        for question_id in set(question_ids):
+            entry = self._read(self._path(question_id))
+            if entry:
+                result[question_id] = (list(entry["similar_ids"]), entry.get("distances"))
+        return result
+
+    def set(self, question_id: int, similar_ids: List[int], distances: Optional[List[float]] = None) -> None:
+        entry = {
+            "similar_ids": list(similar_ids),
+            "distances": None if distances is None else list(distances),
+            "computed_at": datetime.utcnow().isoformat(),
+            "version": get_similar_cache_version(),
+        }
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f)
+            os.replace(tmp_path, self._path(question_id))
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def invalidate(self, question_ids: Iterable[int]) -> None:
+        ids = set(question_ids)
+        for name in os.listdir(self.directory):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.directory, name)
+            entry = self._read(path)
+            stale = entry is None or int(name[:-5]) in ids or ids.intersection(entry["similar_ids"])
+            if stale:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+    def set_many(
+        self, entries: Dict[int, List[int]], distances: Optional[Dict[int, List[float]]] = None
+    ) -> None:
+        distances = distances or {}
+        for question_id, similar_ids in entries.items():
+            self.set(question_id, similar_ids, distances.get(question_id))
 
+    def cached_ids(self) -> Set[int]:
+        return {
+            int(name[:-5]) for name in os.listdir(self.directory)
+            if name.endswith(".json") and self._read(os.path.join(self.directory, name))
+        }
 
-def get_session_start_ts() -> int:
-    with _LOCK:
-        ts = _CACHE.get(_SESSION_START_KEY)
-        if not ts:
-            ts = int(time.time())
-            _CACHE[_SESSION_START_KEY] = ts
-        return ts
+
+def _create_backend():
+    backend = (getattr(Config, "SIMILAR_CACHE_BACKEND", None) or "memory").lower()
+    if backend == "postgres":
+        return PostgresSimilarCache()
+    if backend == "disk":
+        try:
+            return DiskSimilarCache(Config.SIMILAR_CACHE_DIR)
+        except OSError as e:
+            print(f"[Cache] Disk backend unavailable ({e}), falling back to memory.")
+    elif backend != "memory":
+        print(f"[Cache] Unknown SIMILAR_CACHE_BACKEND={backend!r}, using memory.")
+    return _create_memory_cache()
+
+
+def _create_memory_cache() -> MemorySimilarCache:
+    return MemorySimilarCache(
+        max_entries=getattr(Config, "SIMILAR_CACHE_MAX_ENTRIES", 5000),
+        ttl=getattr(Config, "SIMILAR_CACHE_TTL", 0),
+    )
+
+
+_BACKEND = _create_backend()
+
+
+def get_similar_cache_stats() -> Dict[str, object]:
+    stats: Dict[str, object] = {"backend": type(_BACKEND).__name__}
+    if hasattr(_BACKEND, "stats"):
+        stats.update(_BACKEND.stats())
+    return stats
 
 
 def get_cached_similar_ids(question_id: int) -> Optional[List[int]]:
-    with _LOCK:
-        return _CACHE.get(question_id)
+    try:
+        return _BACKEND.get(question_id)
+    except Exception as e:
+        print(f"[Cache] Read failed for question {question_id}: {e}")
+        return None
 
 
-def set_cached_similar_ids(question_id: int, similar_ids: List[int]) -> None:
-    with _LOCK:
-        _CACHE[question_id] = list(similar_ids)
+def set_cached_similar_ids(
+    question_id: int, similar_ids: List[int], distances: Optional[List[float]] = None
+) -> None:
+    try:
+        _BACKEND.set(question_id, similar_ids, distances)
+    except Exception as e:
+        print(f"[Cache] Write failed for question {question_id}: {e}")
+
+
+def invalidate_similar_cache(question_id: int) -> None:
+    """Сбрасывает список самого вопроса и все списки, в которые он входит."""
+    try:
+        _BACKEND.invalidate([question_id])
+    except Exception as e:
+        print(f"[Cache] Invalidate failed for question {question_id}: {e}")
 
 
 def _get_similar_questions_by_modules(db, question_id: int, module_ids: List[int], limit: int) -> List[int]:
@@ -46,52 +401,99 @@ def _get_similar_questions_by_modules(db, question_id: int, module_ids: List[int
     return [row[0] for row in rows]
 
 
-def _get_similar_question_ids_by_embedding(db, question_id: int, embedding, limit: int) -> List[int]:
-    try:
-        rows = (
-            db.query(QuestionEmbedding.question_id)
-            .filter(QuestionEmbedding.question_id != question_id)
-            .order_by(QuestionEmbedding.embedding.cosine_distance(embedding))
-            .limit(limit)
-            .all()
+def _nearest_by_embedding(db, embedding, limit: int, exclude_id: Optional[int] = None) -> List[Tuple[int, float]]:
+    """[(question_id, косинусное расстояние)] от ближайшего, через pgvector."""
+    if (getattr(Config, "EMBEDDING_INDEX_MODE", "") or "").lower() == "hnsw":
+        # Приближённый поиск: выражение совпадает с индексом idx_question_embeddings_half_hnsw.
+        db.execute(
+            text("SELECT set_config('hnsw.ef_search', :ef, true)"),
+            {"ef": str(max(int(Config.EMBEDDING_HNSW_EF_SEARCH), limit + 1))},
         )
-        return [row[0] for row in rows]
-    except Exception as e:
-        print(f"[Embedding] Similar search failed: {e}")
-        return []
+        half = cast(QuestionEmbedding.embedding, HALFVEC(QuestionEmbedding.embedding.type.dim))
+        distance = half.cosine_distance(embedding)
+    else:
+        distance = QuestionEmbedding.embedding.cosine_distance(embedding)
+    query = db.query(QuestionEmbedding.question_id, distance.label("distance"))
+    if exclude_id is not None:
+        query = query.filter(QuestionEmbedding.question_id != exclude_id)
+    rows = query.order_by(distance).limit(limit).all()
+    return [(row[0], float(row[1])) for row in rows]
 
 
-def compute_similar_ids(db, question, modules, answer_summary, limit: int = 5) -> List[int]:
-    embedding_row = (
-        db.query(QuestionEmbedding)
-        .filter(QuestionEmbedding.question_id == question.id)
+def _nearest_to_question(db, question_id: int, limit: int) -> Optional[List[Tuple[int, float]]]:
+    """[(question_id, косинусное расстояние)] ближайших к вопросу; None — у вопроса нет эмбеддинга."""
+    if is_numpy_engine_enabled():
+        try:
+            scored = get_vector_index(db).top_k_scored_for_question(question_id, limit)
+            if scored is None:
+                # Эмбеддинг мог записать другой процесс — сверяемся с БД
+                scored = get_vector_index(db, recheck=True).top_k_scored_for_question(question_id, limit)
+            if scored is not None:
+                return [(qid, 1.0 - similarity) for qid, similarity in scored]
+        except Exception as e:
+            print(f"[VectorIndex] Search failed, falling back to pgvector: {e}")
+    row = (
+        db.query(QuestionEmbedding.embedding)
+        .filter(QuestionEmbedding.question_id == question_id)
         .first()
     )
-    if not embedding_row:
+    if row is None:
+        return None
+    return _nearest_by_embedding(db, row[0], limit, exclude_id=question_id)
+
+
+def find_near_duplicates(
+    db, embedding, threshold: float, limit: int = 5, exclude_id: Optional[int] = None
+) -> List[Tuple[int, float]]:
+    """[(question_id, косинусная близость)] не ниже threshold, от самого похожего."""
+    try:
+        if is_numpy_engine_enabled():
+            # Дубль мог появиться только что в другом воркере — сверяем индекс с БД
+            index = get_vector_index(db, recheck=True)
+            scored = index.top_k_scored(embedding, limit, exclude_id=exclude_id)
+        else:
+            scored = [
+                (qid, 1.0 - distance)
+                for qid, distance in _nearest_by_embedding(db, embedding, limit, exclude_id)
+            ]
+    except Exception as e:
+        print(f"[Embedding] Duplicate search failed: {e}")
+        db.rollback()
+        return []
+    return [(qid, similarity) for qid, similarity in scored if similarity >= threshold]
+
+
+def compute_similar_ids(
+    db, question, modules, answer_summary, limit: int = 5, enqueue_missing: bool = True
+) -> Tuple[List[int], Optional[List[float]]]:
+    """Ближайшие вопросы по эмбеддингу, а пока его нет — по общим модулям.
+
+    Возвращает (similar_ids, distances); distances — None для подбора по модулям.
+    Недостающий эмбеддинг здесь не считается (это код GET-запросов);
+    при enqueue_missing он ставится в очередь фонового воркера — если
+    провайдер эмбеддингов настроен, иначе задача ничего бы не сделала.
+    """
+    try:
+        nearest = _nearest_to_question(db, question.id, limit)
+    except Exception as e:
+        print(f"[Embedding] Similar search failed: {e}")
+        db.rollback()
+        nearest = []
+
+    if nearest is None and enqueue_missing and get_embedding_provider().is_available():
         try:
-            if upsert_question_embedding(db, question, modules, answer_summary):
-                db.commit()
-            embedding_row = (
-                db.query(QuestionEmbedding)
-                .filter(QuestionEmbedding.question_id == question.id)
-                .first()
-            )
+            enqueue_embedding_job(db, question.id, requeue=False)
+            db.commit()
+            notify_embedding_worker()
         except Exception as e:
-            print(f"[Embedding] Update failed: {e}")
+            print(f"[EmbeddingJobs] Enqueue failed: {e}")
             db.rollback()
 
-    if embedding_row:
-        similar_ids = _get_similar_question_ids_by_embedding(
-            db, question.id, embedding_row.embedding, limit
-        )
-    else:
-        similar_ids = []
-
-    if not similar_ids:
-        module_ids = [m.id for m in modules] if modules else []
-        similar_ids = _get_similar_questions_by_modules(db, question.id, module_ids, limit)
+    if nearest:
+        return [qid for qid, _ in nearest], [distance for _, distance in nearest]
 
-    return similar_ids
+    module_ids = [m.id for m in modules] if modules else []
+    return _get_similar_questions_by_modules(db, question.id, module_ids, limit), None
 
 
 def get_or_compute_similar_ids(db, question, modules, answer_summary, limit: int = 5) -> List[int]:
@@ -99,11 +501,63 @@ def get_or_compute_similar_ids(db, question, modules, answer_summary, limit: int
     if cached is not None:
         return cached
 
-    similar_ids = compute_similar_ids(db, question, modules, answer_summary, limit)
-    set_cached_similar_ids(question.id, similar_ids)
+    similar_ids, distances = compute_similar_ids(db, question, modules, answer_summary, limit)
+    set_cached_similar_ids(question.id, similar_ids, distances)
     return similar_ids
 
 
+def update_neighbours_incrementally(db, question_id: int, limit: int = 5) -> int:
+    """Вставляет question_id в закэшированные top-k его ближайших вопросов.
+
+    Кандидаты — SIMILAR_INCREMENTAL_CANDIDATES ближайших к новому эмбеддингу
+    (numpy-индекс или pgvector/HNSW), весь кэш не читается. Список кандидата
+    меняется, только если новый вопрос ближе худшего сохранённого в записи
+    расстояния (или список короче limit); место вставки берётся из тех же
+    расстояний, без пересчёта. Вопрос, у которого новый попал бы в top-k,
+    но который сам не вошёл в кандидаты, обновится по TTL. Списки без
+    расстояний (подбор по модулям) и уже содержащие question_id не трогаем.
+    Возвращает число обновлённых списков.
+    """
+    depth = max(int(getattr(Config, "SIMILAR_INCREMENTAL_CANDIDATES", 50)), limit)
+    try:
+        candidates = _nearest_to_question(db, question_id, depth)
+    except Exception as e:
+        print(f"[Embedding] Incremental neighbour search failed: {e}")
+        db.rollback()
+        return 0
+    if not candidates:
+        return 0
+
+    try:
+        entries = _BACKEND.get_entries(qid for qid, _ in candidates)
+    except Exception as e:
+        print(f"[Cache] Could not read cached entries: {e}")
+        return 0
+
+    patched: Dict[int, List[int]] = {}
+    patched_distances: Dict[int, List[float]] = {}
+    for y, distance in candidates:
+        entry = entries.get(y)
+        if entry is None:
+            continue
+        ids, distances = entry
+        if distances is None or len(distances) != len(ids) or question_id in ids:
+            continue
+        if len(ids) >= limit and distance >= distances[-1]:
+            continue
+        pos = bisect_right(distances, distance)
+        patched[y] = (ids[:pos] + [question_id] + ids[pos:])[:limit]
+        patched_distances[y] = (distances[:pos] + [distance] + distances[pos:])[:limit]
+
+    if patched:
+        try:
+            _BACKEND.set_many(patched, patched_distances)
+        except Exception as e:
+            print(f"[Cache] Incremental write failed: {e}")
+            return 0
+    return len(patched)
+
+
 def refresh_similar_cache(question_id: int) -> None:
     db = SessionLocal()
     try:
@@ -119,39 +573,92 @@ def refresh_similar_cache(question_id: int) -> None:
         )
         answer = db.query(QuestionAnswer).filter_by(question_id=question_id).first()
         answer_summary = answer.summary if answer and getattr(answer, "summary", None) else None
-        similar_ids = compute_similar_ids(db, question, modules, answer_summary, limit=5)
-        set_cached_similar_ids(question_id, similar_ids)
+        similar_ids, distances = compute_similar_ids(
+            db, question, modules, answer_summary, limit=5, enqueue_missing=False
+        )
+        set_cached_similar_ids(question_id, similar_ids, distances)
+        patched = update_neighbours_incrementally(db, question_id, limit=5)
+        if patched:
+            print(f"[Cache] Question {question_id} added to {patched} neighbour lists.")
     finally:
         db.close()
 
 
-def refresh_similar_cache_async(question_id: int) -> None:
-    Thread(target=refresh_similar_cache, args=(question_id,), daemon=True).start()
+def _similar_ids_by_shared_modules(question_ids: Iterable[int], links, limit: int) -> Dict[int, List[int]]:
+    """То же, что _get_similar_questions_by_modules, но в памяти и сразу для многих вопросов."""
+    modules_by_qid: Dict[int, Set[int]] = {}
+    qids_by_module: Dict[int, List[int]] = {}
+    for question_id, module_id in links:
+        modules_by_qid.setdefault(question_id, set()).add(module_id)
+        qids_by_module.setdefault(module_id, []).append(question_id)
+
+    result = {}
+    for question_id in question_ids:
+        similar: List[int] = []
+        for module_id in sorted(modules_by_qid.get(question_id, ())):
+            for other_id in qids_by_module[module_id]:
+                if other_id != question_id and other_id not in similar:
+                    similar.append(other_id)
+        result[question_id] = similar[:limit]
+    return result
 
 
-def warmup_similar_cache() -> None:
+def warmup_similar_cache(limit: int = 5) -> None:
+    """Заполняет кэш для всех вопросов без записи за несколько запросов.
+
+    Эмбеддинги загружаются один раз, top-k считаются блочными матричными
+    произведениями. Для вопросов без эмбеддинга — подбор по общим модулям;
+    API эмбеддингов прогрев не вызывает.
+    """
     db = SessionLocal()
+    started = time.time()
     try:
         print("[Cache] Similar questions warmup started.")
         question_ids = [row[0] for row in db.query(Question.id).all()]
-        for question_id in question_ids:
-            if get_cached_similar_ids(question_id) is not None:
-                continue
-            question = db.query(Question).filter_by(id=question_id).first()
-            if not question:
-                continue
-            modules = (
-                db.query(StepikModule)
-                .join(QuestionStepikModule)
-                .filter(QuestionStepikModule.question_id == question_id)
-                .order_by(StepikModule.position)
-                .all()
-            )
-            answer = db.query(QuestionAnswer).filter_by(question_id=question_id).first()
-            answer_summary = answer.summary if answer and getattr(answer, "summary", None) else None
-            similar_ids = compute_similar_ids(db, question, modules, answer_summary, limit=5)
-            set_cached_similar_ids(question_id, similar_ids)
-        print(f"[Cache] Similar questions warmup finished. Cached: {len(question_ids)}.")
+        try:
+            already_cached = _BACKEND.cached_ids()
+        except Exception as e:
+            print(f"[Cache] Could not list cached entries: {e}")
+            already_cached = set()
+        pending = [qid for qid in question_ids if qid not in already_cached]
+        if not pending:
+            print(f"[Cache] Similar questions warmup finished. Nothing to do ({len(question_ids)} cached).")
+            return
+
+        if is_numpy_engine_enabled():
+            index = get_vector_index(db)
+        else:
+            index = NumpyVectorIndex()
+            index.load(db)
+        print(
+            f"[Cache] Warmup: {len(pending)} to compute, {len(index)} embeddings "
+            f"loaded in {time.time() - started:.1f}s."
+        )
+
+        def _progress(done: int, total: int) -> None:
+            print(f"[Cache] Warmup: {done}/{total} ({time.time() - started:.1f}s)")
+
+        results = index.top_k_batch(
+            pending,
+            limit,
+            block_size=getattr(Config, "SIMILAR_WARMUP_BLOCK_SIZE", 512),
+            progress=_progress,
+        )
+
+        entries = {qid: [other for other, _ in results[qid]] for qid in pending if results.get(qid)}
+        distances = {
+            qid: [1.0 - similarity for _, similarity in results[qid]] for qid in entries
+        }
+        missing = [qid for qid in pending if qid not in entries]
+        if missing:
+            links = db.query(QuestionStepikModule.question_id, QuestionStepikModule.module_id).all()
+            entries.update(_similar_ids_by_shared_modules(missing, links, limit))
+
+        _BACKEND.set_many(entries, distances)
+        print(
+            f"[Cache] Similar questions warmup finished. Cached: {len(pending)} "
+            f"(by modules: {len(missing)}) in {time.time() - started:.1f}s."
+        )
     except Exception as e:
         print(f"[Cache] Warmup failed: {e}")
     finally:
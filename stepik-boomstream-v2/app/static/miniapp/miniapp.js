@@ -0,0 +1,522 @@
+// Инициализация Telegram WebApp
+const tg = window.Telegram.WebApp;
+tg.expand();
+
+// Применяем цветовую схему Telegram
+document.documentElement.style.setProperty('--tg-theme-bg-color', tg.themeParams.bg_color || '#ffffff');
+document.documentElement.style.setProperty('--tg-theme-text-color', tg.themeParams.text_color || '#000000');
+document.documentElement.style.setProperty('--tg-theme-hint-color', tg.themeParams.hint_color || '#999999');
+document.documentElement.style.setProperty('--tg-theme-link-color', tg.themeParams.link_color || '#2481cc');
+document.documentElement.style.setProperty('--tg-theme-button-color', tg.themeParams.button_color || '#2481cc');
+document.documentElement.style.setProperty('--tg-theme-button-text-color', tg.themeParams.button_text_color || '#ffffff');
+document.documentElement.style.setProperty('--tg-theme-secondary-bg-color', tg.themeParams.secondary_bg_color || '#f4f4f5');
+
+// Состояние фильтров
+let currentFilters = {
+  topic: 'all',
+  status: 'all',
+  period: 'all'
+};
+
+// Курсор следующей страницы (keyset-пагинация)
+let nextCursor = null;
+let currentUserRole = 0;
+
+// Получаем initData для авторизации
+const initData = tg.initData;
+const user = tg.initDataUnsafe?.user;
+let startParam = tg.initDataUnsafe?.start_param || '';
+if (!startParam) {
+  const urlParams = new URLSearchParams(window.location.search);
+  startParam = urlParams.get('tgWebAppStartParam') || urlParams.get('startapp') || '';
+}
+
+console.log('Telegram User:', user);
+console.log('Init Data:', initData);
+if (startParam) {
+  console.log('[MiniApp] start_param:', startParam);
+}
+
+function applyStartParamFilters() {
+  if (!startParam) {
+    return false;
+  }
+  if (startParam === 'status_voting') {
+    filterByStatus('VOTING');
+    return true;
+  }
+  if (startParam === 'status_posted') {
+    filterByStatus('POSTED');
+    return true;
+  }
+  return false;
+}
+
+function redirectFromStartParam() {
+  if (!startParam) {
+    return false;
+  }
+  let questionId = '';
+  if (startParam.startsWith('question_')) {
+    questionId = startParam.slice('question_'.length);
+  } else if (/^\d+$/.test(startParam)) {
+    questionId = startParam;
+  }
+  if (!questionId || !/^\d+$/.test(questionId)) {
+    return false;
+  }
+  const redirectKey = `miniapp_redirect_${questionId}`;
+  if (sessionStorage.getItem(redirectKey)) {
+    return false;
+  }
+  sessionStorage.setItem(redirectKey, '1');
+  window.location.href = `/questions/${questionId}?tg_init_data=${encodeURIComponent(initData)}`;
+  return true;
+}
+
+if (redirectFromStartParam()) {
+  // stop further initialization on this load
+}
+
+// Компактный ответ API: строки-массивы + словари модулей и статусов
+function expandCompactQuestions(data) {
+  return data.rows.map(row => {
+    const q = {};
+    data.fields.forEach((field, i) => { q[field] = row[i]; });
+    q.status_label = data.statuses[q.status];
+    q.modules = (q.module_ids || []).map(id => ({ id: id, title: data.modules[id] }));
+    return q;
+  });
+}
+
+// Функция загрузки вопросов (append=true — следующая страница)
+async function loadQuestions(append = false) {
+  const container = document.getElementById('questions-container');
+  if (!append) {
+    nextCursor = null;
+    container.innerHTML = `
+      <div class="loading">
+        <div class="spinner"></div>
+        <p>Загрузка вопросов...</p>
+      </div>
+    `;
+  }
+
+  try {
+    const params = new URLSearchParams({
+      topic: currentFilters.topic,
+      status: currentFilters.status,
+      period: currentFilters.period,
+      format: 'compact'
+    });
+    if (append && nextCursor) {
+      params.set('cursor', nextCursor);
+    }
+
+    console.log('[MiniApp] Loading questions with params:', params.toString());
+    console.log('[MiniApp] initData length:', initData ? initData.length : 0);
+
+    const response = await fetch(`/questions/api/questions?${params}`, {
+      headers: {
+        'X-Telegram-Init-Data': initData
+      }
+    });
+
+    console.log('[MiniApp] Response status:', response.status);
+
+    if (!response.ok) {
+      const errorText = await response.text();
+      let errorMessage = `Failed to load questions: ${response.status}`;
+      try {
+        const errorData = JSON.parse(errorText);
+        if (errorData && errorData.message) {
+          errorMessage = errorData.message;
+        }
+      } catch (e) {
+        if (errorText) {
+          errorMessage = errorText;
+        }
+      }
+      console.error('[MiniApp] Error response:', errorText);
+      throw new Error(errorMessage);
+    }
+
+    const data = await response.json();
+    if (data.format === 'compact') {
+      data.questions = expandCompactQuestions(data);
+    }
+    console.log('[MiniApp] Questions loaded:', data.questions ? data.questions.length : 0);
+    nextCursor = data.next_cursor || null;
+    currentUserRole = data.user_role || 0;
+    renderQuestions(data.questions, currentUserRole, append);
+    subscribeVoteUpdates();
+
+  } catch (error) {
+    console.error('[MiniApp] Error loading questions:', error);
+    if (append) {
+      updateLoadMoreButton();
+      tg.showAlert('Ошибка: ' + error.message);
+      return;
+    }
+    container.innerHTML = `
+      <div class="empty-state">
+        <div class="empty-state-icon">❌</div>
+        <h3>Ошибка загрузки</h3>
+        <p>Не удалось загрузить вопросы.</p>
+        <p style="font-size: 12px; color: #888;">${error.message}</p>
+      </div>
+    `;
+    tg.showAlert('Ошибка: ' + error.message);
+  }
+}
+
+// Функция рендеринга одной карточки
+function renderQuestionCard(q) {
+  return `
+        <div class="question-card">
+          <div class="question-header">
+            <div class="question-header-left">
+              <div class="question-modules">
+                ${q.modules.map(m => `<span class="module-badge" onclick="filterByModule(${m.id})">${m.title}</span>`).join('')}
+              </div>
+            </div>
+            <div class="question-header-right">
+              <a href="/questions/${q.id}?tg_init_data=${encodeURIComponent(initData)}" class="view-btn">📖</a>
+              <span class="status-badge status-${q.status.toLowerCase()}" onclick="filterByStatus('${q.status}')">${q.status_label}</span>
+              <button class="vote-button ${q.my_vote ? 'voted' : ''}" 
+                      data-question-id="${q.id}" 
+                      onclick="toggleVote(${q.id}, this)">
+                <span class="heart">${q.my_vote ? '❤️' : '🤍'}</span>
+                <span class="vote-count">${q.votes_count}</span>
+              </button>
+            </div>
+          </div>
+
+          ${q.title ? `<div class="question-title">${q.title}</div>` : ''}
+
+          <div class="question-body">${q.body_preview}</div>
+                        ${q.summary ? `
+            <div class="summary-block">
+              <strong>✅ Итог</strong>
+              <p>${q.summary}</p>
+              <a href="/questions/${q.id}" class="read-more-btn">Читать полностью →</a>
+            </div>
+          ` : ''}
+
+          ${q.telegram_link ? `
+            <div class="telegram-row">
+              <a href="${q.telegram_link}" class="telegram-link">
+                💬 Перейти к обсуждению в Telegram (${q.messages_count > 0 ? q.messages_count - 1 : 0})
+              </a>
+              ${q.close_label ? `<div class="telegram-close">${q.close_label}</div>` : ''}
+            </div>
+          ` : ''}
+        </div>
+  `;
+}
+
+// Кнопка "Показать ещё" под списком
+function updateLoadMoreButton() {
+  const container = document.getElementById('questions-container');
+  let button = document.getElementById('load-more-btn');
+  if (!nextCursor) {
+    if (button) button.remove();
+    return;
+  }
+  if (!button) {
+    button = document.createElement('button');
+    button.id = 'load-more-btn';
+    button.className = 'load-more-btn';
+    button.addEventListener('click', () => {
+      button.disabled = true;
+      button.textContent = 'Загрузка...';
+      loadQuestions(true);
+    });
+    container.appendChild(button);
+  }
+  button.disabled = false;
+  button.textContent = 'Показать ещё';
+}
+
+// Функция рендеринга вопросов
+function renderQuestions(questions, userRole, append = false) {
+  const container = document.getElementById('questions-container');
+  const canManage = Number(userRole) >= 1;
+
+  if (append) {
+    const list = container.querySelector('.questions-list');
+    if (list) {
+      list.insertAdjacentHTML('beforeend', questions.map(renderQuestionCard).join(''));
+    }
+    updateLoadMoreButton();
+    return;
+  }
+
+  if (questions.length === 0) {
+    container.innerHTML = `
+      <div class="empty-state">
+        <div class="empty-state-icon">🤔</div>
+        <h3>Вопросов не найдено</h3>
+        <p>Попробуйте изменить фильтры</p>
+      </div>
+    `;
+    return;
+  }
+
+  const html = `
+    <div class="questions-list">
+      ${questions.map(renderQuestionCard).join('')}
+    </div>
+  `;
+
+  container.innerHTML = html;
+  updateLoadMoreButton();
+}
+
+// Голосование: тапы копятся и уходят одним запросом /questions/api/votes/sync
+const VOTE_FLUSH_DELAY = 400;
+const pendingVotes = new Map(); // questionId -> { liked, confirmed }
+let voteFlushTimer = null;
+
+function setVoteButtonState(questionId, liked, votesCount) {
+  document.querySelectorAll(`.vote-button[data-question-id="${questionId}"]`).forEach(button => {
+    button.classList.toggle('voted', liked);
+    button.querySelector('.heart').textContent = liked ? '❤️' : '🤍';
+    if (votesCount !== undefined) {
+      button.querySelector('.vote-count').textContent = votesCount;
+    }
+  });
+}
+
+function toggleVote(questionId, button) {
+  const liked = !button.classList.contains('voted');
+  const pending = pendingVotes.get(questionId);
+  // confirmed — состояние, подтверждённое сервером, для отката при ошибке
+  pendingVotes.set(questionId, { liked, confirmed: pending ? pending.confirmed : !liked });
+
+  // Оптимистичное обновление UI
+  setVoteButtonState(questionId, liked);
+  tg.HapticFeedback.impactOccurred('light');
+
+  clearTimeout(voteFlushTimer);
+  voteFlushTimer = setTimeout(flushVotes, VOTE_FLUSH_DELAY);
+}
+
+async function flushVotes(keepalive = false) {
+  clearTimeout(voteFlushTimer);
+  voteFlushTimer = null;
+
+  // Двойной тап по одному вопросу взаимно гасится и не отправляется
+  const batch = Array.from(pendingVotes, ([questionId, vote]) => ({ questionId, ...vote }))
+    .filter(vote => vote.liked !== vote.confirmed);
+  pendingVotes.clear();
+  if (!batch.length) {
+    return;
+  }
+
+  try {
+    const response = await fetch('/questions/api/votes/sync', {
+      method: 'POST',
+      keepalive,
+      headers: {
+        'Content-Type': 'application/json',
+        'X-Telegram-Init-Data': initData
+      },
+      body: JSON.stringify({
+        votes: batch.map(vote => ({ question_id: vote.questionId, liked: vote.liked }))
+      })
+    });
+
+    if (!response.ok) {
+      throw new Error('Vote failed');
+    }
+
+    const data = await response.json();
+
+    // Обновляем счетчики (если пользователь не успел тапнуть снова)
+    data.votes.forEach(vote => {
+      if (!pendingVotes.has(vote.question_id)) {
+        setVoteButtonState(vote.question_id, vote.liked, vote.votes_count);
+      }
+    });
+
+    tg.HapticFeedback.notificationOccurred('success');
+
+  } catch (error) {
+    console.error('Vote error:', error);
+    // Откатываем изменения при ошибке
+    batch.forEach(vote => {
+      if (!pendingVotes.has(vote.questionId)) {
+        setVoteButtonState(vote.questionId, vote.confirmed);
+      }
+    });
+    if (!keepalive) {
+      tg.HapticFeedback.notificationOccurred('error');
+      tg.showAlert('Ошибка голосования. Попробуйте еще раз.');
+    }
+  }
+}
+
+// Не теряем накопленные голоса при сворачивании Mini App
+document.addEventListener('visibilitychange', () => {
+  if (document.visibilityState === 'hidden') {
+    flushVotes(true);
+  }
+});
+
+// Фильтрация по модулю
+function filterByModule(moduleId) {
+  // Проверяем, не выбран ли уже этот фильтр
+  if (currentFilters.topic === moduleId.toString()) {
+    return; // Ничего не делаем, фильтр уже активен
+  }
+
+  // Обновляем фильтр
+  currentFilters.topic = moduleId.toString();
+
+  // Обновляем активную кнопку в фильтрах
+  document.querySelectorAll('#topic-filters .filter-btn').forEach(b => b.classList.remove('active'));
+  const btn = document.querySelector(`#topic-filters .filter-btn[data-topic="${moduleId}"]`);
+  if (btn) btn.classList.add('active');
+
+  tg.HapticFeedback.selectionChanged();
+  loadQuestions();
+}
+
+// Фильтрация по статусу
+function filterByStatus(status) {
+  // Проверяем, не выбран ли уже этот фильтр
+  if (currentFilters.status === status) {
+    return; // Ничего не делаем, фильтр уже активен
+  }
+
+  // Обновляем фильтр
+  currentFilters.status = status;
+
+  // Обновляем активную кнопку в фильтрах
+  document.querySelectorAll('#status-filters .filter-btn').forEach(b => b.classList.remove('active'));
+  const btn = document.querySelector(`#status-filters .filter-btn[data-status="${status}"]`);
+  if (btn) btn.classList.add('active');
+
+  tg.HapticFeedback.selectionChanged();
+  loadQuestions();
+}
+
+// Форматирование даты
+function formatDate(dateString) {
+  const date = new Date(dateString);
+  const day = String(date.getDate()).padStart(2, '0');
+  const month = String(date.getMonth() + 1).padStart(2, '0');
+  const year = date.getFullYear();
+  return `${day}.${month}.${year}`;
+}
+
+// Обработчики фильтров
+function setupFilters() {
+  // Topic filters
+  document.querySelectorAll('#topic-filters .filter-btn').forEach(btn => {
+    btn.addEventListener('click', (e) => {
+      e.preventDefault();
+      document.querySelectorAll('#topic-filters .filter-btn').forEach(b => b.classList.remove('active'));
+      btn.classList.add('active');
+      currentFilters.topic = btn.dataset.topic;
+      loadQuestions();
+      tg.HapticFeedback.selectionChanged();
+    });
+  });
+
+  // Status filters
+  document.querySelectorAll('#status-filters .filter-btn').forEach(btn => {
+    btn.addEventListener('click', (e) => {
+      e.preventDefault();
+      document.querySelectorAll('#status-filters .filter-btn').forEach(b => b.classList.remove('active'));
+      btn.classList.add('active');
+      currentFilters.status = btn.dataset.status;
+      loadQuestions();
+      tg.HapticFeedback.selectionChanged();
+    });
+  });
+
+  // Period filters
+  document.querySelectorAll('#period-filters .filter-btn').forEach(btn => {
+    btn.addEventListener('click', (e) => {
+      e.preventDefault();
+      document.querySelectorAll('#period-filters .filter-btn').forEach(b => b.classList.remove('active'));
+      btn.classList.add('active');
+      currentFilters.period = btn.dataset.period;
+      loadQuestions();
+      tg.HapticFeedback.selectionChanged();
+    });
+  });
+}
+
+// Загрузка модулей для фильтров
+async function loadModules() {
+  try {
+    const response = await fetch('/questions/api/modules');
+    if (response.ok) {
+      const modules = await response.json();
+      const topicFilters = document.getElementById('topic-filters');
+
+      modules.forEach(module => {
+        const btn = document.createElement('a');
+        btn.href = '#';
+        btn.className = 'filter-btn';
+        btn.dataset.topic = module.id;
+        btn.textContent = module.title;
+        topicFilters.appendChild(btn);
+      });
+
+      setupFilters();
+    }
+  } catch (error) {
+    console.error('Error loading modules:', error);
+  }
+}
+
+// Живые счётчики голосов (SSE). Поток авторизуется cookie сессии, которую
+// ставит первый успешный /api/questions, поэтому initData в URL не передаём.
+let voteSource = null;
+let voteRetryTimer = null;
+
+function subscribeVoteUpdates() {
+  if (!window.EventSource || voteSource || voteRetryTimer) {
+    return;
+  }
+  const source = new EventSource('/questions/api/votes/stream');
+  voteSource = source;
+  source.addEventListener('error', () => {
+    // Обрыв EventSource переподключает сам; CLOSED — сервер отказал
+    // (403 или 503 при лимите потоков), пробуем позже
+    if (source.readyState === EventSource.CLOSED) {
+      voteSource = null;
+      voteRetryTimer = setTimeout(() => {
+        voteRetryTimer = null;
+        subscribeVoteUpdates();
+      }, 30000 + Math.random() * 30000);
+    }
+  });
+  source.addEventListener('votes', (event) => {
+    try {
+      const data = JSON.parse(event.data);
+      document
+        .querySelectorAll(`.vote-button[data-question-id="${data.question_id}"] .vote-count`)
+        .forEach(el => { el.textContent = data.votes_count; });
+    } catch (error) {
+      console.error('Vote stream error:', error);
+    }
+  });
+}
+
+// Инициализация
+document.addEventListener('DOMContentLoaded', () => {
+  loadModules();
+  setupFilters();
+  const applied = applyStartParamFilters();
+  if (!applied) {
+    loadQuestions();
+  }
+
+  // Сообщаем Telegram что приложение готово
+  tg.ready();
+});
@@ -1,11 +1,23 @@
 import hashlib
 import hmac
 import json
+import time
 import urllib.parse
+from functools import lru_cache
 from typing import Dict, Optional
 from .config import Config
 
 
+@lru_cache(maxsize=4)
+def _webapp_secret_key(bot_token: str) -> bytes:
+    """HMAC-ключ для initData зависит только от токена — считаем один раз на процесс."""
+    return hmac.new(
+        key="WebAppData".encode(),
+        msg=bot_token.encode(),
+        digestmod=hashlib.sha256
+    ).digest()
+
+
 def verify_telegram_auth(data: Dict[str, str]) -> bool:
     """
     Проверка подписи данных от Telegram Login Widget.
@@ -48,7 +60,8 @@ def validate_webapp_init_data(init_data: str, bot_token: Optional[str] = None) -
     bot_token — токен бота (если не указан, берется из Config)
     
     Возвращает словарь с данными пользователя, если подпись валидна.
-    Возвращает None, если подпись невалидна.
+    Возвращает None, если подпись невалидна или auth_date старше
+    Config.WEBAPP_INIT_DATA_MAX_AGE.
     
     Документация:
     https://core.telegram.org/bots/webapps#validating-data-received-via-the-mini-app
@@ -61,9 +74,6 @@ def validate_webapp_init_data(init_data: str, bot_token: Optional[str] = None) -
         return None
     
     try:
-        token_hash = hashlib.sha256(bot_token.encode()).hexdigest()[:8]
-        print(f"[WebAppAuth] token_hash={token_hash} init_data_len={len(init_data)}")
-
         # Парсим параметры
         params = dict(urllib.parse.parse_qsl(init_data, keep_blank_values=True))
 
@@ -78,25 +88,27 @@ def validate_webapp_init_data(init_data: str, bot_token: Optional[str] = None) -
                 data_check_items.append(f"{key}={params[key]}")
         data_check_string = '\n'.join(data_check_items)
 
-        secret_key = hmac.new(
-            key="WebAppData".encode(),
-            msg=bot_token.encode(),
-            digestmod=hashlib.sha256
-        ).digest()
-
         computed_hash = hmac.new(
-            key=secret_key,
+            key=_webapp_secret_key(bot_token),
             msg=data_check_string.encode(),
             digestmod=hashlib.sha256
         ).hexdigest()
 
         if not hmac.compare_digest(computed_hash, received_hash):
             print("[WebAppAuth] Hash mismatch.")
-            print(f"[WebAppAuth] received_hash={received_hash}")
-            print(f"[WebAppAuth] computed_hash={computed_hash}")
-            print(f"[WebAppAuth] data_check_string={data_check_string}")
             return None
 
+        # Подписанные, но старые initData не принимаем (0 — без ограничения)
+        max_age = Config.WEBAPP_INIT_DATA_MAX_AGE
+        if max_age > 0:
+            try:
+                auth_date = int(params.get('auth_date') or 0)
+            except ValueError:
+                auth_date = 0
+            if time.time() - auth_date > max_age:
+                print("[WebAppAuth] init_data expired.")
+                return None
+
         user_data = json.loads(urllib.parse.unquote(params.get('user', '{}')))
         
         return {
@@ -0,0 +1,158 @@
+from collections import defaultdict, deque
+from threading import Lock
+from typing import Any, Deque, Dict, Optional
+import random
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .config import Config
+
+# Methods that post a message into the chat (forum topic open/close adds a
+# service message too); these count towards Telegram's per-group limit.
+RATE_LIMITED_METHODS = {
+    "sendMessage",
+    "createForumTopic",
+    "closeForumTopic",
+    "reopenForumTopic",
+}
+
+
+class ChatRateLimiter:
+    """Sliding-window limit of `limit` messages per `window` seconds per chat.
+
+    acquire() reserves the next free slot and sleeps until it; concurrent
+    callers get consecutive slots instead of all waking at once.
+    """
+
+    def __init__(self, limit: int, window: float = 60.0) -> None:
+        self.limit = limit
+        self.window = window
+        self._slots: Dict[str, Deque[float]] = defaultdict(deque)
+        self._lock = Lock()
+
+    def acquire(self, chat_id: Any) -> float:
+        if self.limit <= 0:
+            return 0.0
+        key = str(chat_id)
+        with self._lock:
+            now = time.monotonic()
+            slots = self._slots[key]
+            while slots and slots[0] <= now - self.window:
+                slots.popleft()
+            at = now
+            if len(slots) >= self.limit:
+                at = slots[-self.limit] + self.window
+            slots.append(at)
+        wait = at - now
+        if wait > 0:
+            time.sleep(wait)
+        return max(wait, 0.0)
+
+
+class TelegramClient:
+    """Bot API client: pooled keep-alive session, timeouts and retries.
+
+    * 429 — sleeps for parameters.retry_after (up to max_retry_after) and retries;
+    * 5xx and connection errors — exponential backoff with jitter;
+    * RATE_LIMITED_METHODS pass through a per-chat ChatRateLimiter.
+
+    A read timeout is not retried: the request may already have been applied.
+    call() never raises; it returns {"ok", "status_code", "body"} like the
+    helpers in telegram_service always did.
+    """
+
+    def __init__(
+        self,
+        token: Optional[str] = None,
+        connect_timeout: float = 5.0,
+        read_timeout: float = 15.0,
+        max_retries: int = 3,
+        backoff_base: float = 1.0,
+        backoff_max: float = 30.0,
+        max_retry_after: float = 60.0,
+        chat_rate_limit: int = 20,
+        pool_size: int = 16,
+    ) -> None:
+        self._token = token
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.max_retry_after = max_retry_after
+        self.rate_limiter = ChatRateLimiter(chat_rate_limit)
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=2, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+
+    @property
+    def token(self) -> Optional[str]:
+        return self._token or Config.TELEGRAM_BOT_TOKEN
+
+    def api_url(self, method: str) -> str:
+        return f"https://api.telegram.org/bot{self.token}/{method}"
+
+    def _backoff(self, attempt: int) -> float:
+        delay = min(self.backoff_max, self.backoff_base * (2 ** attempt))
+        return delay * (0.5 + random.random() / 2)
+
+    def call(self, method: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+        if method in RATE_LIMITED_METHODS and payload.get("chat_id") is not None:
+            self.rate_limiter.acquire(payload["chat_id"])
+
+        attempt = 0
+        while True:
+            try:
+                resp = self.session.post(self.api_url(method), json=payload, timeout=self.timeout)
+            except requests.ConnectionError as e:  # includes ConnectTimeout, not ReadTimeout
+                if attempt >= self.max_retries:
+                    return {"ok": False, "status_code": None, "body": {"ok": False, "error": str(e)}}
+                delay = self._backoff(attempt)
+                print(f"[TelegramClient] {method}: {e}; retry in {delay:.1f}s")
+                time.sleep(delay)
+                attempt += 1
+                continue
+            except requests.RequestException as e:
+                return {"ok": False, "status_code": None, "body": {"ok": False, "error": str(e)}}
+
+            try:
+                body = resp.json()
+            except ValueError:
+                body = {"ok": False, "error": resp.text}
+
+            if attempt < self.max_retries:
+                if resp.status_code == 429:
+                    retry_after = (body.get("parameters") or {}).get("retry_after") or 1
+                    if retry_after <= self.max_retry_after:
+                        print(f"[TelegramClient] {method}: 429, retry after {retry_after}s")
+                        time.sleep(retry_after)
+                        attempt += 1
+                        continue
+                elif resp.status_code >= 500:
+                    delay = self._backoff(attempt)
+                    print(f"[TelegramClient] {method}: HTTP {resp.status_code}; retry in {delay:.1f}s")
+                    time.sleep(delay)
+                    attempt += 1
+                    continue
+
+            return {"ok": resp.ok, "status_code": resp.status_code, "body": body}
+
+
+_CLIENT: Optional[TelegramClient] = None
+_CLIENT_LOCK = Lock()
+
+
+def get_telegram_client() -> TelegramClient:
+    global _CLIENT
+    with _CLIENT_LOCK:
+        if _CLIENT is None:
+            _CLIENT = TelegramClient(
+                connect_timeout=Config.TELEGRAM_API_CONNECT_TIMEOUT,
+                read_timeout=Config.TELEGRAM_API_READ_TIMEOUT,
+                max_retries=Config.TELEGRAM_API_MAX_RETRIES,
+                backoff_base=Config.TELEGRAM_API_BACKOFF_BASE,
+                max_retry_after=Config.TELEGRAM_API_MAX_RETRY_AFTER,
+                chat_rate_limit=Config.TELEGRAM_CHAT_RATE_LIMIT,
+            )
+        return _CLIENT
@@ -0,0 +1,329 @@
+from datetime import datetime, timedelta
+from threading import Event, Thread
+from typing import Any, Callable, Dict, List, Optional, Tuple
+import re
+import time
+
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import insert
+
+from .config import Config
+from .db import SessionLocal
+from .models import TelegramOutbox
+
+# Шаги операции: отправка в Telegram без БД и применение статуса к БД
+OutboxSteps = Tuple[Callable[[], None], Callable[[Any], None]]
+
+# operation -> handler(db, payload, state); регистрируется через @outbox_handler
+_HANDLERS: Dict[str, Callable[[Any, dict, dict], Optional[OutboxSteps]]] = {}
+
+# Будит отправителя в этом процессе сразу после постановки; другие процессы опрашивают таблицу
+_WAKEUP = Event()
+
+ACTIVE_STATUSES = ("PENDING", "RUNNING")
+
+
+class OutboxPermanentError(Exception):
+    """Повтор не поможет: задача сразу переходит в FAILED."""
+
+
+def outbox_handler(operation: str):
+    """Зарегистрировать обработчик операции.
+
+    handler(db, payload, state) только читает из БД то, что нужно для вызовов,
+    и возвращает (send, apply) или None, если делать уже нечего. Транзакция
+    чтения закрывается до вызовов Bot API: send() работает без БД (поэтому
+    замыкания держат обычные значения, а не ORM-объекты), apply(db) применяет
+    статус в новой транзакции вместе с отметкой DONE и не делает commit.
+    Выполненные шаги send() пишет в state — он сохраняется и при ошибке,
+    поэтому повтор продолжает с последнего успешного вызова. Исключение —
+    повтор с backoff, OutboxPermanentError — отказ.
+    """
+    def decorator(func):
+        _HANDLERS[operation] = func
+        return func
+    return decorator
+
+
+def enqueue_telegram_operation(
+    db,
+    operation: str,
+    chat_id: Any,
+    payload: Dict[str, Any],
+    idempotency_key: str,
+) -> bool:
+    """Поставить операцию в очередь в транзакции вызывающего кода.
+
+    Возвращает False, если idempotency_key уже в очереди, выполняется или
+    выполнен. FAILED-задача с тем же ключом сбрасывается и повторяется,
+    сохраняя state. После commit вызовите notify_telegram_sender().
+    """
+    now = datetime.utcnow()
+    stmt = insert(TelegramOutbox).values(
+        idempotency_key=idempotency_key,
+        chat_id=int(chat_id),
+        operation=operation,
+        payload=payload,
+        state={},
+        status="PENDING",
+        attempts=0,
+        run_after=now,
+        created_at=now,
+    )
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[TelegramOutbox.idempotency_key],
+        set_={
+            "status": "PENDING",
+            "attempts": 0,
+            "run_after": now,
+            "locked_at": None,
+            "last_error": None,
+            "payload": stmt.excluded.payload,
+        },
+        where=TelegramOutbox.status == "FAILED",
+    ).returning(TelegramOutbox.id)
+    return db.execute(stmt).first() is not None
+
+
+def next_idempotency_key(db, prefix: str) -> str:
+    """Ключ prefix:N для повторяемого перехода (закрытие, архивирование вопроса).
+
+    DONE-строки хранятся TELEGRAM_OUTBOX_RETENTION_DAYS, поэтому постоянный
+    ключ молча отбросил бы повторный переход (вопрос снова открыт и снова
+    закрыт). N на единицу больше номера последнего выполненного перехода:
+    пока переход в очереди или FAILED, ключ тот же и дубль отсекается.
+    """
+    last_done = db.execute(
+        text(
+            "SELECT max(substr(idempotency_key, :start)::int) FROM telegram_outbox "
+            "WHERE status = 'DONE' AND idempotency_key ~ :pattern"
+        ),
+        {"start": len(prefix) + 2, "pattern": "^" + re.escape(prefix) + r":\d+$"},
+    ).scalar()
+    return f"{prefix}:{0 if last_done is None else last_done + 1}"
+
+
+def has_pending_telegram_operation(db, operation: Optional[str] = None, idempotency_key: Optional[str] = None) -> bool:
+    query = db.query(TelegramOutbox.id).filter(TelegramOutbox.status.in_(ACTIVE_STATUSES))
+    if operation:
+        query = query.filter(TelegramOutbox.operation == operation)
+    if idempotency_key:
+        query = query.filter(TelegramOutbox.idempotency_key == idempotency_key)
+    return query.first() is not None
+
+
+def notify_telegram_sender() -> None:
+    _WAKEUP.set()
+
+
+def _claim_jobs(db, limit: int) -> List[Tuple[int, int]]:
+    """Захватить головную задачу не более чем limit чатов; возвращает [(id, attempts)].
+
+    Выполняется только самая старая незавершённая задача чата, поэтому
+    операции одного чата не обгоняют друг друга. RUNNING-задача с блокировкой
+    старше TELEGRAM_OUTBOX_LOCK_TIMEOUT принадлежит упавшему процессу и
+    перехватывается. Если два отправителя берут одну голову, блокировка строки
+    заставляет второго перепроверить статус и пропустить её.
+    """
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=Config.TELEGRAM_OUTBOX_LOCK_TIMEOUT)
+    rows = db.execute(
+        text(
+            """
+            UPDATE telegram_outbox o
+            SET status = 'RUNNING', locked_at = :now, attempts = o.attempts + 1
+            FROM (
+                SELECT head.id
+                FROM (
+                    SELECT DISTINCT ON (chat_id) id, status, run_after, locked_at
+                    FROM telegram_outbox
+                    WHERE status IN ('PENDING', 'RUNNING')
+                    ORDER BY chat_id, id
+                ) head
+                WHERE (head.status = 'PENDING' AND head.run_after <= :now)
+                   OR (head.status = 'RUNNING' AND head.locked_at < :stale)
+                ORDER BY head.id
+                LIMIT :limit
+            ) picked
+            WHERE o.id = picked.id
+              AND (o.status = 'PENDING' OR (o.status = 'RUNNING' AND o.locked_at < :stale))
+            RETURNING o.id, o.attempts
+            """
+        ),
+        {"now": now, "stale": stale, "limit": limit},
+    ).all()
+    db.commit()
+    return [(row[0], row[1]) for row in rows]
+
+
+def _backoff_seconds(attempts: int) -> int:
+    return min(
+        Config.TELEGRAM_OUTBOX_BACKOFF_BASE * 2 ** max(attempts - 1, 0),
+        Config.TELEGRAM_OUTBOX_BACKOFF_MAX,
+    )
+
+
+def _queued_behind(db, chat_id: int, job_id: int) -> int:
+    return (
+        db.query(TelegramOutbox.id)
+        .filter(
+            TelegramOutbox.chat_id == chat_id,
+            TelegramOutbox.status.in_(ACTIVE_STATUSES),
+            TelegramOutbox.id > job_id,
+        )
+        .count()
+    )
+
+
+def _fail_job(db, job_id: int, attempts: int, state: dict, error: str, permanent: bool = False) -> None:
+    job = db.get(TelegramOutbox, job_id)
+    if job is None:
+        return
+    if permanent or attempts >= Config.TELEGRAM_OUTBOX_MAX_ATTEMPTS:
+        job.status = "FAILED"
+    else:
+        job.status = "PENDING"
+        job.run_after = datetime.utcnow() + timedelta(seconds=_backoff_seconds(attempts))
+    job.state = state
+    job.locked_at = None
+    job.last_error = error[:2000]
+    db.commit()
+
+    # Все операции идут в один чат: повторяющаяся головная задача держит всю очередь
+    if job.status == "PENDING" and attempts >= Config.TELEGRAM_OUTBOX_BLOCKED_WARN_ATTEMPTS:
+        behind = _queued_behind(db, job.chat_id, job_id)
+        if behind:
+            print(
+                f"[TelegramOutbox] WARNING: {job.operation} #{job_id} blocks {behind} queued jobs "
+                f"in chat {job.chat_id} (attempt {attempts}/{Config.TELEGRAM_OUTBOX_MAX_ATTEMPTS}, "
+                f"next try at {job.run_after:%Y-%m-%d %H:%M:%S} UTC): {job.last_error}"
+            )
+
+
+def _finish_job(job_id: int, attempts: int, operation: str, state: dict, apply=None) -> None:
+    """Новая транзакция: статус операции (apply) и отметка DONE фиксируются вместе."""
+    db = SessionLocal()
+    try:
+        try:
+            if apply is not None:
+                apply(db)
+            job = db.get(TelegramOutbox, job_id)
+            if job is None:
+                db.rollback()
+                return
+            job.status = "DONE"
+            job.state = state
+            job.locked_at = None
+            job.last_error = None
+            job.completed_at = datetime.utcnow()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            print(f"[TelegramOutbox] {operation} #{job_id} failed to apply (attempt {attempts}): {e}")
+            _fail_job(db, job_id, attempts, state, str(e), permanent=isinstance(e, OutboxPermanentError))
+            return
+        print(f"[TelegramOutbox] {operation} #{job_id} done.")
+    finally:
+        db.close()
+
+
+def _run_job(job_id: int, attempts: int) -> None:
+    # 1. Короткая транзакция чтения: задача и данные для вызовов Bot API
+    db = SessionLocal()
+    try:
+        job = db.get(TelegramOutbox, job_id)
+        if job is None:
+            return
+        operation = job.operation
+        payload = dict(job.payload or {})
+        state = dict(job.state or {})
+        handler = _HANDLERS.get(operation)
+        if handler is None:
+            _fail_job(db, job_id, attempts, state, f"Unknown operation {operation}", permanent=True)
+            return
+        try:
+            steps = handler(db, payload, state)
+        except Exception as e:
+            db.rollback()
+            print(f"[TelegramOutbox] {operation} #{job_id} failed (attempt {attempts}): {e}")
+            _fail_job(db, job_id, attempts, state, str(e), permanent=isinstance(e, OutboxPermanentError))
+            return
+        db.rollback()
+    finally:
+        db.close()
+
+    if steps is None:
+        _finish_job(job_id, attempts, operation, state)
+        return
+    send, apply = steps
+
+    # 2. Вызовы Bot API (включая ожидание в rate limiter) без открытой транзакции
+    try:
+        send()
+    except Exception as e:
+        print(f"[TelegramOutbox] {operation} #{job_id} failed (attempt {attempts}): {e}")
+        db = SessionLocal()
+        try:
+            _fail_job(db, job_id, attempts, state, str(e), permanent=isinstance(e, OutboxPermanentError))
+        finally:
+            db.close()
+        return
+
+    # 3. Статус операции и DONE — в новой транзакции
+    _finish_job(job_id, attempts, operation, state, apply)
+
+
+def _purge_done_jobs() -> None:
+    """DONE-строки хранятся TELEGRAM_OUTBOX_RETENTION_DAYS, чтобы отсекать повторную постановку."""
+    db = SessionLocal()
+    try:
+        cutoff = datetime.utcnow() - timedelta(days=Config.TELEGRAM_OUTBOX_RETENTION_DAYS)
+        db.execute(
+            text("DELETE FROM telegram_outbox WHERE status = 'DONE' AND completed_at < :cutoff"),
+            {"cutoff": cutoff},
+        )
+        db.commit()
+    finally:
+        db.close()
+
+
+def process_telegram_outbox(limit: Optional[int] = None) -> int:
+    """Один раз выполнить головную задачу каждого готового чата; возвращает число захваченных задач."""
+    db = SessionLocal()
+    try:
+        jobs = _claim_jobs(db, limit or Config.TELEGRAM_OUTBOX_BATCH_SIZE)
+    finally:
+        db.close()
+    for job_id, attempts in jobs:
+        try:
+            _run_job(job_id, attempts)
+        except Exception as e:
+            print(f"[TelegramOutbox] Job #{job_id} error: {e}")
+    return len(jobs)
+
+
+def run_telegram_sender() -> None:
+    last_purge = 0.0
+    while True:
+        try:
+            processed = process_telegram_outbox()
+        except Exception as e:
+            print(f"[TelegramOutbox] Error: {e}")
+            processed = 0
+        if time.time() - last_purge > 3600:
+            try:
+                _purge_done_jobs()
+            except Exception as e:
+                print(f"[TelegramOutbox] Purge error: {e}")
+            last_purge = time.time()
+        if processed:
+            continue
+        _WAKEUP.wait(Config.TELEGRAM_OUTBOX_POLL_INTERVAL)
+        _WAKEUP.clear()
+
+
+def start_telegram_sender() -> None:
+    if str(Config.TELEGRAM_OUTBOX_ENABLED).lower() in ("0", "false", "no"):
+        print("[TelegramOutbox] Sender disabled.")
+        return
+    Thread(target=run_telegram_sender, daemon=True).start()
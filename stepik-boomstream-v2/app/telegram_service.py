@@ -1,15 +1,15 @@
 from typing import Any, Dict, Optional
 
 import json
-import requests
 
 from .config import Config
 from .db import SessionLocal
 from .models import TelegramMessage
+from .telegram_client import get_telegram_client
 
 
-def _api_url(method: str) -> str:
-    return f"https://api.telegram.org/bot{Config.TELEGRAM_BOT_TOKEN}/{method}"
+def _call(method: str, payload: Dict[str, Any]) -> Dict[str, Any]:
+    return get_telegram_client().call(method, payload)
 
 
 def _thread_id_from_config() -> Optional[int]:
@@ -37,15 +37,11 @@ def create_forum_topic(
     payload: Dict[str, Any] = {"chat_id": chat_id, "name": name}
     if icon_custom_emoji_id:
         payload["icon_custom_emoji_id"] = icon_custom_emoji_id
-    resp = requests.post(_api_url("createForumTopic"), json=payload)
-    data = {}
-    try:
-        data = resp.json()
-    except Exception:
-        data = {"ok": False, "error": resp.text}
+    resp = _call("createForumTopic", payload)
+    data = resp["body"]
     return {
-        "ok": resp.ok,
-        "status_code": resp.status_code,
+        "ok": resp["ok"],
+        "status_code": resp["status_code"],
         "body": data,
         "message_thread_id": data.get("result", {}).get("message_thread_id"),
     }
@@ -68,19 +64,15 @@ def send_message(
         payload["parse_mode"] = parse_mode
     if reply_markup:
         payload["reply_markup"] = reply_markup
-    resp = requests.post(_api_url("sendMessage"), json=payload)
-    data = {}
-    try:
-        data = resp.json()
-    except Exception:
-        data = {"ok": False, "error": resp.text}
+    resp = _call("sendMessage", payload)
+    data = resp["body"]
     result = {
-        "ok": resp.ok,
-        "status_code": resp.status_code,
+        "ok": resp["ok"],
+        "status_code": resp["status_code"],
         "body": data,
         "message_id": data.get("result", {}).get("message_id"),
     }
-    if resp.ok and result["message_id"] is not None:
+    if resp["ok"] and result["message_id"] is not None:
         try:
             session = SessionLocal()
             session.add(
@@ -112,17 +104,19 @@ def close_forum_topic(
         "chat_id": chat_id,
         "message_thread_id": message_thread_id,
     }
-    resp = requests.post(_api_url("closeForumTopic"), json=payload)
-    data = {}
-    try:
-        data = resp.json()
-    except Exception:
-        data = {"ok": False, "error": resp.text}
-    return {
-        "ok": resp.ok,
-        "status_code": resp.status_code,
-        "body": data,
+    return _call("closeForumTopic", payload)
+
+
+def reopen_forum_topic(
+    *,
+    chat_id: Any,
+    message_thread_id: int,
+) -> Dict[str, Any]:
+    payload: Dict[str, Any] = {
+        "chat_id": chat_id,
+        "message_thread_id": message_thread_id,
     }
+    return _call("reopenForumTopic", payload)
 
 
 def pin_notice_message(notification_message_id: int) -> Dict[str, Any]:
@@ -133,17 +127,7 @@ def pin_notice_message(notification_message_id: int) -> Dict[str, Any]:
     thread_id = _thread_id_from_config()
     if thread_id is not None:
         payload["message_thread_id"] = thread_id
-    resp = requests.post(_api_url("pinChatMessage"), json=payload)
-    data = {}
-    try:
-        data = resp.json()
-    except Exception:
-        data = {"ok": False, "error": resp.text}
-    return {
-        "ok": resp.ok,
-        "status_code": resp.status_code,
-        "body": data,
-    }
+    return _call("pinChatMessage", payload)
 
 
 def unpin_notice_message(notification_message_id: int) -> Dict[str, Any]:
@@ -154,17 +138,7 @@ def unpin_notice_message(notification_message_id: int) -> Dict[str, Any]:
     thread_id = _thread_id_from_config()
     if thread_id is not None:
         payload["message_thread_id"] = thread_id
-    resp = requests.post(_api_url("unpinChatMessage"), json=payload)
-    data = {}
-    try:
-        data = resp.json()
-    except Exception:
-        data = {"ok": False, "error": resp.text}
-    return {
-        "ok": resp.ok,
-        "status_code": resp.status_code,
-        "body": data,
-    }
+    return _call("unpinChatMessage", payload)
 
 
 def edit_notice_reply_markup(
@@ -179,17 +153,7 @@ def edit_notice_reply_markup(
     thread_id = _thread_id_from_config()
     if thread_id is not None:
         payload["message_thread_id"] = thread_id
-    resp = requests.post(_api_url("editMessageReplyMarkup"), json=payload)
-    data = {}
-    try:
-        data = resp.json()
-    except Exception:
-        data = {"ok": False, "error": resp.text}
-    return {
-        "ok": resp.ok,
-        "status_code": resp.status_code,
-        "body": data,
-    }
+    return _call("editMessageReplyMarkup", payload)
 
 
 def edit_message_text(
@@ -209,17 +173,7 @@ def edit_message_text(
     thread_id = message_thread_id if message_thread_id is not None else _thread_id_from_config()
     if thread_id is not None:
         payload["message_thread_id"] = thread_id
-    resp = requests.post(_api_url("editMessageText"), json=payload)
-    data = {}
-    try:
-        data = resp.json()
-    except Exception:
-        data = {"ok": False, "error": resp.text}
-    return {
-        "ok": resp.ok,
-        "status_code": resp.status_code,
-        "body": data,
-    }
+    return _call("editMessageText", payload)
 
 
 def edit_message_reply_markup(
@@ -236,17 +190,11 @@ def edit_message_reply_markup(
     thread_id = message_thread_id if message_thread_id is not None else _thread_id_from_config()
     if thread_id is not None:
         payload["message_thread_id"] = thread_id
-    resp = requests.post(_api_url("editMessageReplyMarkup"), json=payload)
-    data = {}
-    try:
-        data = resp.json()
-    except Exception:
-        data = {"ok": False, "error": resp.text}
-    return {
-        "ok": resp.ok,
-        "status_code": resp.status_code,
-        "body": data,
-    }
+    return _call("editMessageReplyMarkup", payload)
+
+
+def topic_opening_text(topic_name: str, message_text: str) -> str:
+    return f"❓<b>{topic_name}</b>❓\n{message_text}"
 
 
 def post_forum_topic_with_message(
@@ -274,7 +222,7 @@ def post_forum_topic_with_message(
     message_result = send_message(
         chat_id=chat_id,
         message_thread_id=message_thread_id,
-        text=f"❓<b>{topic_name}</b>❓\n{message_text}",
+        text=topic_opening_text(topic_name, message_text),
         parse_mode= "HTML",
         reply_markup=reply_markup,
     )
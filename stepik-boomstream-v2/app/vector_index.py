@@ -0,0 +1,378 @@
+from datetime import datetime, timedelta
+from threading import Lock
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import func
+
+from .config import Config
+from .embeddings import get_embedding_model_and_dims
+from .models import QuestionEmbedding
+
+# sync() перечитывает строки с updated_at не раньше прошлой отметки минус этот запас:
+# updated_at ставится до коммита, и строка может стать видимой позже более новых
+SYNC_OVERLAP = timedelta(minutes=5)
+
+
+class NumpyVectorIndex:
+    """Точный косинусный top-k перебором по всем эмбеддингам вопросов в памяти.
+
+    Строки — L2-нормированные float32, поэтому близость считается одним
+    умножением матрицы на вектор. Матрицу можно отобразить (mmap) из снимка
+    на диске, чтобы воркеры gunicorn делили одни страницы; первый upsert
+    в воркере переключает его на собственную копию.
+    """
+
+    def __init__(self, snapshot_dir: Optional[str] = None) -> None:
+        self.snapshot_dir = snapshot_dir
+        self._lock = Lock()
+        self._matrix = np.zeros((0, 0), dtype=np.float32)
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._rows: Dict[int, int] = {}
+        self._writable = True
+        self._stamp: Optional[dict] = None
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        norms[norms == 0] = 1.0
+        return vectors / norms
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+    def __contains__(self, question_id: int) -> bool:
+        return question_id in self._rows
+
+    # ------------------------------------------------------------------
+    # Загрузка и снимки
+    # ------------------------------------------------------------------
+
+    def _set_data(self, matrix: np.ndarray, ids: np.ndarray, writable: bool) -> None:
+        with self._lock:
+            self._matrix = matrix
+            self._ids = ids
+            self._rows = {int(qid): row for row, qid in enumerate(ids)}
+            self._writable = writable
+
+    def _snapshot_paths(self):
+        return (
+            os.path.join(self.snapshot_dir, "embeddings.npy"),
+            os.path.join(self.snapshot_dir, "ids.npy"),
+            os.path.join(self.snapshot_dir, "meta.json"),
+        )
+
+    def _db_stamp(self, db) -> dict:
+        count, last_updated = db.query(
+            func.count(QuestionEmbedding.question_id),
+            func.max(QuestionEmbedding.updated_at),
+        ).one()
+        model, dims = get_embedding_model_and_dims()
+        return {
+            "model": model,
+            "dims": dims,
+            "count": int(count or 0),
+            "last_updated": last_updated.isoformat() if last_updated else None,
+        }
+
+    @staticmethod
+    def _ids_hash(ids: np.ndarray) -> str:
+        return hashlib.sha256(np.ascontiguousarray(ids, dtype=np.int64).tobytes()).hexdigest()
+
+    def _load_snapshot(self) -> bool:
+        """Отображает снимок той же модели, даже устаревший: дальше его догоняет sync()."""
+        if not self.snapshot_dir:
+            return False
+        matrix_path, ids_path, meta_path = self._snapshot_paths()
+        try:
+            with open(meta_path, encoding="utf-8") as f:
+                stamp = json.load(f)
+            model, dims = get_embedding_model_and_dims()
+            if stamp.get("model") != model or stamp.get("dims") != dims:
+                return False
+            matrix = np.load(matrix_path, mmap_mode="r")
+            ids = np.load(ids_path)
+        except (OSError, ValueError):
+            return False
+        # Файлы заменяются по одному: не берём матрицу и id из разных записей
+        if matrix.shape[0] != len(ids) or stamp.pop("ids_sha256", None) != self._ids_hash(ids):
+            return False
+        self._set_data(matrix, ids, writable=False)
+        self._stamp = stamp
+        return True
+
+    def _write_snapshot(self, stamp: dict) -> None:
+        if not self.snapshot_dir:
+            return
+        with self._lock:
+            matrix, ids = self._matrix, self._ids
+        os.makedirs(self.snapshot_dir, exist_ok=True)
+        matrix_path, ids_path, meta_path = self._snapshot_paths()
+        for path, value in ((matrix_path, matrix), (ids_path, ids)):
+            fd, tmp_path = tempfile.mkstemp(dir=self.snapshot_dir, suffix=".npy")
+            with os.fdopen(fd, "wb") as f:
+                np.save(f, value)
+            os.replace(tmp_path, path)
+        fd, tmp_path = tempfile.mkstemp(dir=self.snapshot_dir, suffix=".json")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(dict(stamp, ids_sha256=self._ids_hash(ids)), f)
+        os.replace(tmp_path, meta_path)
+
+    def save_snapshot(self) -> None:
+        if self._stamp is None:
+            return
+        try:
+            self._write_snapshot(self._stamp)
+        except OSError as e:
+            print(f"[VectorIndex] Snapshot write failed: {e}")
+
+    def build(self, question_ids: List[int], vectors) -> None:
+        """Заменяет весь индекс переданными векторами (в порядке question_ids)."""
+        if len(question_ids):
+            ids = np.asarray(question_ids, dtype=np.int64)
+            matrix = self._normalize(np.stack([np.asarray(v) for v in vectors]))
+        else:
+            _, dims = get_embedding_model_and_dims()
+            ids = np.zeros(0, dtype=np.int64)
+            matrix = np.zeros((0, dims), dtype=np.float32)
+        self._set_data(np.ascontiguousarray(matrix), ids, writable=True)
+
+    def _rebuild(self, db) -> None:
+        stamp = self._db_stamp(db)
+        rows = db.query(QuestionEmbedding.question_id, QuestionEmbedding.embedding).all()
+        self.build([row[0] for row in rows], [row[1] for row in rows])
+        self._stamp = stamp
+        print(f"[VectorIndex] Loaded {len(self)} vectors from DB.")
+
+    def load(self, db) -> None:
+        """Отображает снимок и догоняет его по БД или собирает индекс из БД и пишет снимок."""
+        if self._load_snapshot():
+            print(f"[VectorIndex] Mapped snapshot with {len(self)} vectors.")
+            self.sync(db)
+            return
+        self._rebuild(db)
+        self.save_snapshot()
+
+    def sync(self, db) -> bool:
+        """Догоняет изменения question_embeddings, сделанные с прошлой загрузки.
+
+        Новые и изменённые строки читаются по updated_at (с запасом
+        SYNC_OVERLAP на поздние коммиты), удалённые и пропущенные находятся
+        сверкой id — только если число строк в БД разошлось с индексом.
+        Возвращает True, если индекс менялся.
+        """
+        stamp = self._db_stamp(db)
+        if stamp == self._stamp:
+            return False
+        previous = self._stamp
+        if previous is None or (previous["model"], previous["dims"]) != (stamp["model"], stamp["dims"]):
+            self._rebuild(db)
+            return True
+
+        query = db.query(QuestionEmbedding.question_id, QuestionEmbedding.embedding)
+        if previous["last_updated"]:
+            since = datetime.fromisoformat(previous["last_updated"]) - SYNC_OVERLAP
+            query = query.filter(QuestionEmbedding.updated_at >= since)
+        changed = query.all()
+        for question_id, vector in changed:
+            self.upsert(question_id, vector)
+
+        removed = missing = 0
+        if stamp["count"] != len(self):
+            db_ids = {row[0] for row in db.query(QuestionEmbedding.question_id).all()}
+            with self._lock:
+                indexed = set(self._rows)
+            removed = self.remove_many(indexed - db_ids)
+            missing_ids = list(db_ids - indexed)
+            if missing_ids:
+                rows = (
+                    db.query(QuestionEmbedding.question_id, QuestionEmbedding.embedding)
+                    .filter(QuestionEmbedding.question_id.in_(missing_ids))
+                    .all()
+                )
+                for question_id, vector in rows:
+                    self.upsert(question_id, vector)
+                missing = len(rows)
+        self._stamp = stamp
+        print(
+            f"[VectorIndex] Synced: {len(changed)} changed, {missing} missing, "
+            f"{removed} removed ({len(self)} vectors)."
+        )
+        return True
+
+    # ------------------------------------------------------------------
+    # Обновления
+    # ------------------------------------------------------------------
+
+    def upsert(self, question_id: int, vector) -> None:
+        vector = self._normalize(np.asarray(vector))
+        with self._lock:
+            if not self._writable:
+                self._matrix = np.array(self._matrix)
+                self._writable = True
+            row = self._rows.get(question_id)
+            if row is not None:
+                self._matrix[row] = vector
+                return
+            if self._matrix.size == 0:
+                self._matrix = vector.reshape(1, -1).copy()
+            else:
+                self._matrix = np.vstack([self._matrix, vector])
+            self._ids = np.append(self._ids, question_id)
+            self._rows[question_id] = len(self._ids) - 1
+
+    def remove_many(self, question_ids: Iterable[int]) -> int:
+        with self._lock:
+            rows = [self._rows[qid] for qid in question_ids if qid in self._rows]
+            if not rows:
+                return 0
+            self._matrix = np.delete(self._matrix, rows, axis=0)
+            self._ids = np.delete(self._ids, rows)
+            self._rows = {int(qid): i for i, qid in enumerate(self._ids)}
+            self._writable = True
+            return len(rows)
+
+    def remove(self, question_id: int) -> None:
+        self.remove_many([question_id])
+
+    # ------------------------------------------------------------------
+    # Поиск
+    # ------------------------------------------------------------------
+
+    def get_vector(self, question_id: int) -> Optional[np.ndarray]:
+        with self._lock:
+            row = self._rows.get(question_id)
+            return None if row is None else np.array(self._matrix[row])
+
+    def top_k_scored(self, vector, k: int, exclude_id: Optional[int] = None) -> List[Tuple[int, float]]:
+        """[(question_id, косинусная близость)] от лучшего."""
+        with self._lock:
+            matrix, ids, rows = self._matrix, self._ids, self._rows
+        if len(ids) == 0:
+            return []
+        scores = matrix @ self._normalize(np.asarray(vector))
+        if exclude_id is not None and exclude_id in rows:
+            scores = scores.copy()
+            scores[rows[exclude_id]] = -np.inf
+        n = min(k, len(ids) - (1 if exclude_id in rows else 0))
+        if n <= 0:
+            return []
+        top = np.argpartition(-scores, n - 1)[:n]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top]
+
+    def top_k(self, vector, k: int, exclude_id: Optional[int] = None) -> List[int]:
+        return [qid for qid, _ in self.top_k_scored(vector, k, exclude_id)]
+
+    def top_k_batch(
+        self,
+        question_ids: Iterable[int],
+        k: int,
+        block_size: int = 512,
+        progress: Optional[Callable[[int, int], None]] = None,
+    ) -> Dict[int, List[Tuple[int, float]]]:
+        """Top-k сразу для многих вопросов: одно произведение (блок x N) на блок.
+
+        Возвращает {question_id: [(id соседа, косинусная близость)]} от лучшего.
+        block_size ограничивает матрицу оценок размером block_size * N.
+        """
+        with self._lock:
+            matrix, ids, rows = self._matrix, self._ids, self._rows
+        query_rows = [rows[qid] for qid in question_ids if qid in rows]
+        n = min(k, len(ids) - 1)
+        if n <= 0:
+            return {int(ids[row]): [] for row in query_rows}
+
+        result: Dict[int, List[Tuple[int, float]]] = {}
+        block_size = max(1, block_size)
+        for start in range(0, len(query_rows), block_size):
+            block = np.asarray(query_rows[start:start + block_size])
+            scores = matrix[block] @ matrix.T
+            scores[np.arange(len(block)), block] = -np.inf
+            top = np.argpartition(-scores, n - 1, axis=1)[:, :n]
+            order = np.argsort(-np.take_along_axis(scores, top, axis=1), axis=1)
+            top = np.take_along_axis(top, order, axis=1)
+            for row, neighbours, row_scores in zip(block, top, np.take_along_axis(scores, top, axis=1)):
+                result[int(ids[row])] = [
+                    (int(ids[i]), float(score)) for i, score in zip(neighbours, row_scores)
+                ]
+            if progress:
+                progress(min(start + block_size, len(query_rows)), len(query_rows))
+        return result
+
+    def top_k_scored_for_question(self, question_id: int, k: int) -> Optional[List[Tuple[int, float]]]:
+        """Как top_k_scored для вектора вопроса; None, если вопроса нет в индексе."""
+        vector = self.get_vector(question_id)
+        if vector is None:
+            return None
+        return self.top_k_scored(vector, k, exclude_id=question_id)
+
+
+_INDEX: Optional[NumpyVectorIndex] = None
+_INDEX_LOCK = Lock()
+# Один sync за раз; остальные потоки в это время ищут по текущим данным
+_SYNC_LOCK = Lock()
+_LAST_SYNC = 0.0
+
+
+def is_numpy_engine_enabled() -> bool:
+    return (getattr(Config, "SIMILAR_ENGINE", "") or "").lower() == "numpy"
+
+
+def get_vector_index(db, recheck: bool = False) -> NumpyVectorIndex:
+    """Индекс процесса, загружается лениво при первом обращении.
+
+    Эмбеддинги пишут и другие процессы, поэтому раз в
+    VECTOR_INDEX_SYNC_INTERVAL секунд (с recheck — после промаха, не чаще
+    раза в секунду) индекс сверяется с БД и догоняет изменения.
+    """
+    global _INDEX, _LAST_SYNC
+    with _INDEX_LOCK:
+        if _INDEX is None:
+            index = NumpyVectorIndex(getattr(Config, "VECTOR_INDEX_SNAPSHOT_DIR", None))
+            index.load(db)
+            _INDEX = index
+            _LAST_SYNC = time.monotonic()
+            return index
+        index = _INDEX
+
+    interval = 1.0 if recheck else getattr(Config, "VECTOR_INDEX_SYNC_INTERVAL", 30)
+    if time.monotonic() - _LAST_SYNC >= interval and _SYNC_LOCK.acquire(blocking=False):
+        try:
+            _LAST_SYNC = time.monotonic()
+            index.sync(db)
+        except Exception as e:
+            print(f"[VectorIndex] Sync failed: {e}")
+            db.rollback()
+        finally:
+            _SYNC_LOCK.release()
+    return index
+
+
+def sync_vector_index(db, write_snapshot: bool = False) -> None:
+    """Сразу догоняет индекс по БД — после записи эмбеддингов этим процессом.
+
+    С write_snapshot обновлённый индекс пишется в снимок, чтобы другие
+    воркеры и следующий старт отобразили его, а не собирали из БД.
+    """
+    global _LAST_SYNC
+    index = get_vector_index(db)
+    with _SYNC_LOCK:
+        _LAST_SYNC = time.monotonic()
+        changed = index.sync(db)
+        if changed and write_snapshot:
+            index.save_snapshot()
+
+
+def remove_from_vector_index(question_id: int) -> None:
+    """Убирает удалённый вопрос из индекса процесса, если тот уже загружен."""
+    with _INDEX_LOCK:
+        index = _INDEX
+    if index is not None:
+        index.remove(question_id)
@@ -0,0 +1,62 @@
+from typing import List
+
+from sqlalchemy import text
+
+from .db import SessionLocal
+
+_DRIFTED_SQL = text(
+    """
+    SELECT q.id
+    FROM questions q
+    LEFT JOIN (
+        SELECT question_id, COUNT(*) AS cnt
+        FROM question_votes
+        GROUP BY question_id
+    ) v ON v.question_id = q.id
+    WHERE q.votes_count <> COALESCE(v.cnt, 0)
+    """
+)
+
+_LOCK_SQL = text("SELECT id FROM questions WHERE id = ANY(:ids) ORDER BY id FOR UPDATE")
+
+_REPAIR_SQL = text(
+    """
+    UPDATE questions q
+    SET votes_count = (
+        SELECT COUNT(*) FROM question_votes v WHERE v.question_id = q.id
+    )
+    WHERE q.id = ANY(:ids)
+      AND q.votes_count <> (
+        SELECT COUNT(*) FROM question_votes v WHERE v.question_id = q.id
+      )
+    RETURNING q.id
+    """
+)
+
+
+def reconcile_votes_counts() -> List[int]:
+    """Repair questions.votes_count drift left by the ±1 trigger; returns fixed ids.
+
+    The full scan is read-only. Only drifted rows are then locked and
+    recounted: once the row lock is held, no trigger can change the counter,
+    and the recount runs in a fresh snapshot that already sees every vote
+    whose trigger got the lock first, so the repair does not lose concurrent
+    votes.
+    """
+    db = SessionLocal()
+    try:
+        ids = [row[0] for row in db.execute(_DRIFTED_SQL)]
+        db.rollback()
+        if not ids:
+            return []
+        db.execute(_LOCK_SQL, {"ids": ids})
+        fixed = [row[0] for row in db.execute(_REPAIR_SQL, {"ids": ids})]
+        db.commit()
+        if fixed:
+            print(f"[VotesReconcile] Fixed votes_count for {len(fixed)} questions: {fixed[:20]}")
+        return fixed
+    except Exception:
+        db.rollback()
+        raise
+    finally:
+        db.close()
@@ -0,0 +1,110 @@
+from queue import Empty, Full, Queue
+from threading import Lock, Thread
+from typing import Optional, Set
+import json
+import select
+import time
+
+import psycopg2
+import psycopg2.extensions
+
+from .config import Config
+
+CHANNEL = "question_votes"
+
+
+class VoteBroadcaster:
+    """Раздаёт NOTIFY question_votes SSE-подписчикам этого процесса.
+
+    Одно LISTEN-соединение на процесс, открывается с первым подписчиком.
+    У каждого подписчика ограниченная очередь: отставший клиент теряет
+    изменения, а не копит память (догонит при следующей загрузке списка).
+    """
+
+    def __init__(self, queue_size: int = 200) -> None:
+        self.queue_size = queue_size
+        self._subscribers: Set[Queue] = set()
+        self._lock = Lock()
+        self._thread: Optional[Thread] = None
+
+    def try_subscribe(self, max_subscribers: int) -> Optional[Queue]:
+        """Очередь нового подписчика или None, если их уже max_subscribers (проверка и вставка под одной блокировкой)."""
+        queue: Queue = Queue(maxsize=self.queue_size)
+        with self._lock:
+            if len(self._subscribers) >= max_subscribers:
+                return None
+            self._subscribers.add(queue)
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = Thread(target=self._listen_forever, daemon=True)
+                self._thread.start()
+        return queue
+
+    def unsubscribe(self, queue: Queue) -> None:
+        with self._lock:
+            self._subscribers.discard(queue)
+
+    def publish(self, payload: str) -> None:
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for queue in subscribers:
+            try:
+                queue.put_nowait(payload)
+            except Full:
+                pass
+
+    def _listen_forever(self) -> None:
+        while True:
+            try:
+                self._listen()
+            except Exception as e:
+                print(f"[VoteStream] Listener error: {e}")
+            time.sleep(5)
+
+    def _listen(self) -> None:
+        conn = psycopg2.connect(Config.DATABASE_URL)
+        try:
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {CHANNEL};")
+            print("[VoteStream] Listening for vote updates.")
+            while True:
+                if select.select([conn], [], [], 60) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    notify = conn.notifies.pop(0)
+                    self.publish(notify.payload)
+        finally:
+            conn.close()
+
+
+_BROADCASTER = VoteBroadcaster()
+
+
+def get_vote_broadcaster() -> VoteBroadcaster:
+    return _BROADCASTER
+
+
+def stream_vote_events(queue: Queue, max_seconds: int, keepalive: int = 25):
+    """Тело SSE: изменения голосов строками `data:`, комментарии — keep-alive.
+
+    Поток завершается через max_seconds, чтобы не держать поток воркера
+    бесконечно; EventSource сам переподключается (через `retry` мс).
+    """
+    deadline = time.time() + max_seconds
+    try:
+        yield "retry: 3000\n\n"
+        while time.time() < deadline:
+            try:
+                payload = queue.get(timeout=keepalive)
+            except Empty:
+                yield ": keepalive\n\n"
+                continue
+            try:
+                data = json.loads(payload)
+                event = {"question_id": int(data["question_id"]), "votes_count": int(data["votes_count"])}
+            except (ValueError, KeyError, TypeError):
+                continue
+            yield f"event: votes\ndata: {json.dumps(event)}\n\n"
+    finally:
+        get_vote_broadcaster().unsubscribe(queue)
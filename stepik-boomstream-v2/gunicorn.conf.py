@@ -0,0 +1,7 @@
+# Настройки gunicorn (render.yaml: gunicorn -c gunicorn.conf.py web_app:app)
+import os
+
+# gthread: SSE-поток голосов (/questions/api/votes/stream) держит поток, а не весь воркер.
+# Число потоков читает и app/config.py: от него считается лимит SSE-клиентов.
+worker_class = "gthread"
+threads = int(os.getenv("GUNICORN_THREADS", "16"))
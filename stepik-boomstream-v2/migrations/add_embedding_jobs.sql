@@ -0,0 +1,15 @@
+-- Миграция: очередь пересчёта эмбеддингов (embedding_jobs)
+-- Одна строка на вопрос: повторные правки схлопываются, воркеры забирают задачи через FOR UPDATE SKIP LOCKED.
+
+CREATE TABLE IF NOT EXISTS embedding_jobs (
+    question_id INTEGER PRIMARY KEY REFERENCES questions(id) ON DELETE CASCADE,
+    status VARCHAR(20) DEFAULT 'PENDING' NOT NULL,
+    attempts INTEGER DEFAULT 0 NOT NULL,
+    run_after TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW() NOT NULL,
+    locked_at TIMESTAMP WITHOUT TIME ZONE,
+    last_error TEXT,
+    enqueued_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW() NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_embedding_jobs_status_run_after
+  ON embedding_jobs (status, run_after);
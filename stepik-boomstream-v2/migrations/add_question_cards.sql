@@ -0,0 +1,269 @@
+-- Миграция: денормализованная проекция карточек вопросов (question_cards)
+-- Списки вопросов читают только эту таблицу; триггеры поддерживают её
+-- в актуальном состоянии при изменении вопросов, ответов, модулей и тем.
+-- search_text/search_vector — документ поиска (вопрос + ответ) для /questions/api/search.
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- 1. Таблица проекции
+CREATE TABLE IF NOT EXISTS question_cards (
+    question_id INTEGER PRIMARY KEY REFERENCES questions(id) ON DELETE CASCADE,
+    title VARCHAR(200),
+    body_preview TEXT NOT NULL,
+    status VARCHAR(20) NOT NULL,
+    status_label VARCHAR(50) NOT NULL,
+    votes_count INTEGER DEFAULT 0 NOT NULL,
+    created_at TIMESTAMP WITHOUT TIME ZONE NOT NULL,
+    posted_at TIMESTAMP WITHOUT TIME ZONE,
+    module_ids INTEGER[] DEFAULT '{}' NOT NULL,
+    modules JSON DEFAULT '[]' NOT NULL,
+    summary VARCHAR(500),
+    telegram_link VARCHAR,
+    messages_count INTEGER DEFAULT 0 NOT NULL,
+    close_at TIMESTAMP WITHOUT TIME ZONE,
+    search_text TEXT DEFAULT '' NOT NULL,
+    search_vector TSVECTOR,
+    updated_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW() NOT NULL
+);
+
+ALTER TABLE question_cards ADD COLUMN IF NOT EXISTS search_text TEXT DEFAULT '' NOT NULL;
+ALTER TABLE question_cards ADD COLUMN IF NOT EXISTS search_vector TSVECTOR;
+
+-- Keyset-индексы на questions не нужны: списки читают question_cards
+DROP INDEX IF EXISTS idx_questions_votes_created_id;
+DROP INDEX IF EXISTS idx_questions_created_id;
+DROP INDEX IF EXISTS idx_questions_posted_id;
+
+-- Старые имена: create_all мог успеть создать их по возрастанию раньше этого скрипта
+DROP INDEX IF EXISTS idx_question_cards_votes_created_id;
+DROP INDEX IF EXISTS idx_question_cards_created_id;
+
+CREATE INDEX IF NOT EXISTS idx_question_cards_votes_created_id_desc
+  ON question_cards (votes_count DESC, created_at DESC, question_id DESC);
+CREATE INDEX IF NOT EXISTS idx_question_cards_created_id_desc
+  ON question_cards (created_at DESC, question_id DESC);
+CREATE INDEX IF NOT EXISTS idx_question_cards_status_posted
+  ON question_cards (status, (COALESCE(posted_at, created_at)) DESC, question_id DESC);
+CREATE INDEX IF NOT EXISTS idx_question_cards_module_ids
+  ON question_cards USING gin (module_ids);
+CREATE INDEX IF NOT EXISTS idx_question_cards_search_vector
+  ON question_cards USING gin (search_vector);
+CREATE INDEX IF NOT EXISTS idx_question_cards_search_text_trgm
+  ON question_cards USING gin (search_text gin_trgm_ops);
+-- ETag списков строится по question_cards_meta.version, индекс по updated_at не нужен
+DROP INDEX IF EXISTS idx_question_cards_updated_at;
+
+-- Версия списков: счётчик растёт при каждом commit, изменившем карточки (включая удаление).
+-- Увеличивается отложенным триггером в момент commit под блокировкой этой строки,
+-- поэтому порядок версий совпадает с порядком commit (NOW() — время начала транзакции —
+-- мог бы дать длинной транзакции метку раньше уже видимых изменений).
+CREATE TABLE IF NOT EXISTS question_cards_meta (
+    id INTEGER PRIMARY KEY DEFAULT 1 CHECK (id = 1),
+    version BIGINT DEFAULT 0 NOT NULL,
+    updated_at TIMESTAMP WITHOUT TIME ZONE
+);
+ALTER TABLE question_cards_meta ADD COLUMN IF NOT EXISTS version BIGINT DEFAULT 0 NOT NULL;
+ALTER TABLE question_cards_meta ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP WITHOUT TIME ZONE;
+ALTER TABLE question_cards_meta DROP COLUMN IF EXISTS deleted_at;
+INSERT INTO question_cards_meta (id) VALUES (1) ON CONFLICT DO NOTHING;
+
+-- 2. Пересборка одной карточки
+CREATE OR REPLACE FUNCTION public.refresh_question_card(qid INTEGER) RETURNS VOID AS $$
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM public.questions WHERE id = qid) THEN
+        DELETE FROM public.question_cards WHERE question_id = qid;
+        RETURN;
+    END IF;
+
+    INSERT INTO public.question_cards (
+        question_id, title, body_preview, status, status_label, votes_count,
+        created_at, posted_at, module_ids, modules, summary, telegram_link,
+        messages_count, close_at, search_text, search_vector, updated_at
+    )
+    SELECT
+        q.id,
+        q.title,
+        -- превью 300 символов, как в HTML-списке (мини-приложение раньше получало 250)
+        CASE WHEN length(q.body) > 300 THEN substr(q.body, 1, 300) || '...' ELSE q.body END,
+        q.status,
+        CASE q.status
+            WHEN 'VOTING' THEN 'В голосовании'
+            WHEN 'SCHEDULED' THEN 'Запланировано'
+            WHEN 'POSTED' THEN 'В обсуждении'
+            WHEN 'CLOSED' THEN 'Закрыто'
+            WHEN 'ARCHIVED' THEN 'Архив'
+            ELSE q.status
+        END,
+        q.votes_count,
+        q.created_at,
+        q.posted_at,
+        COALESCE(mods.module_ids, '{}'),
+        COALESCE(mods.modules, '[]'::json),
+        NULLIF(a.summary, ''),
+        CASE WHEN t.id IS NOT NULL
+            THEN 'https://t.me/c/' || substr(t.chat_id::text, 5) || '/' || t.message_thread_id
+        END,
+        COALESCE(t.messages_count, 0),
+        t.close_at,
+        concat_ws(' ', q.title, q.body, a.summary, a.answer),
+        setweight(to_tsvector('russian', COALESCE(q.title, '')), 'A')
+            || setweight(to_tsvector('russian', q.body), 'B')
+            || setweight(to_tsvector('russian', COALESCE(a.summary, '')), 'B')
+            || setweight(to_tsvector('russian', COALESCE(a.answer, '')), 'C'),
+        clock_timestamp() AT TIME ZONE 'utc'
+    FROM public.questions q
+    LEFT JOIN public.question_answers a ON a.question_id = q.id
+    LEFT JOIN public.telegram_topics t ON t.question_id = q.id
+    LEFT JOIN LATERAL (
+        SELECT
+            array_agg(m.id ORDER BY m.position) AS module_ids,
+            json_agg(
+                json_build_object(
+                    'id', m.id,
+                    'title', m.title,
+                    'short_title', m.short_title,
+                    'position', m.position
+                )
+                ORDER BY m.position
+            ) AS modules
+        FROM public.question_stepik_modules qsm
+        JOIN public.stepik_modules m ON m.id = qsm.module_id
+        WHERE qsm.question_id = q.id
+    ) mods ON TRUE
+    WHERE q.id = qid
+    ON CONFLICT (question_id) DO UPDATE SET
+        title = EXCLUDED.title,
+        body_preview = EXCLUDED.body_preview,
+        status = EXCLUDED.status,
+        status_label = EXCLUDED.status_label,
+        votes_count = EXCLUDED.votes_count,
+        created_at = EXCLUDED.created_at,
+        posted_at = EXCLUDED.posted_at,
+        module_ids = EXCLUDED.module_ids,
+        modules = EXCLUDED.modules,
+        summary = EXCLUDED.summary,
+        telegram_link = EXCLUDED.telegram_link,
+        messages_count = EXCLUDED.messages_count,
+        close_at = EXCLUDED.close_at,
+        search_text = EXCLUDED.search_text,
+        search_vector = EXCLUDED.search_vector,
+        updated_at = EXCLUDED.updated_at;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 3. Триггер на questions: изменение только votes_count — дешёвое обновление
+CREATE OR REPLACE FUNCTION public.question_cards_on_question() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'UPDATE'
+        AND NEW.title IS NOT DISTINCT FROM OLD.title
+        AND NEW.body IS NOT DISTINCT FROM OLD.body
+        AND NEW.status IS NOT DISTINCT FROM OLD.status
+        AND NEW.created_at IS NOT DISTINCT FROM OLD.created_at
+        AND NEW.posted_at IS NOT DISTINCT FROM OLD.posted_at
+    THEN
+        IF NEW.votes_count IS DISTINCT FROM OLD.votes_count THEN
+            -- версию списков сдвинет триггер trg_question_cards_version
+            UPDATE public.question_cards
+            SET votes_count = NEW.votes_count,
+                updated_at = clock_timestamp() AT TIME ZONE 'utc'
+            WHERE question_id = NEW.id;
+        END IF;
+        RETURN NULL;
+    END IF;
+
+    PERFORM public.refresh_question_card(NEW.id);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 4. Триггер на дочерние таблицы (question_answers, question_stepik_modules, telegram_topics)
+CREATE OR REPLACE FUNCTION public.question_cards_on_child() RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'INSERT' THEN
+        PERFORM public.refresh_question_card(NEW.question_id);
+    ELSIF TG_OP = 'DELETE' THEN
+        PERFORM public.refresh_question_card(OLD.question_id);
+    ELSE
+        PERFORM public.refresh_question_card(NEW.question_id);
+        IF NEW.question_id <> OLD.question_id THEN
+            PERFORM public.refresh_question_card(OLD.question_id);
+        END IF;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 5. Триггер на stepik_modules: переименование модуля обновляет его карточки
+CREATE OR REPLACE FUNCTION public.question_cards_on_module() RETURNS TRIGGER AS $$
+BEGIN
+    IF NEW.title IS DISTINCT FROM OLD.title
+        OR NEW.short_title IS DISTINCT FROM OLD.short_title
+        OR NEW.position IS DISTINCT FROM OLD.position
+    THEN
+        PERFORM public.refresh_question_card(qsm.question_id)
+        FROM public.question_stepik_modules qsm
+        WHERE qsm.module_id = NEW.id;
+    END IF;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 6. Любое изменение карточек (пересборка, голос, удаление) сдвигает версию списков.
+--    Одно увеличение на транзакцию: флаг в локальной для транзакции настройке.
+CREATE OR REPLACE FUNCTION public.question_cards_bump_version() RETURNS TRIGGER AS $$
+BEGIN
+    IF current_setting('question_cards.version_bumped', true) = 'on' THEN
+        RETURN NULL;
+    END IF;
+    PERFORM set_config('question_cards.version_bumped', 'on', true);
+    UPDATE public.question_cards_meta
+    SET version = version + 1,
+        updated_at = clock_timestamp() AT TIME ZONE 'utc'
+    WHERE id = 1;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP FUNCTION IF EXISTS public.question_cards_on_delete() CASCADE;
+
+DROP TRIGGER IF EXISTS trg_question_cards_question ON questions;
+CREATE TRIGGER trg_question_cards_question
+AFTER INSERT OR UPDATE ON questions
+FOR EACH ROW EXECUTE FUNCTION question_cards_on_question();
+
+DROP TRIGGER IF EXISTS trg_question_cards_answer ON question_answers;
+CREATE TRIGGER trg_question_cards_answer
+AFTER INSERT OR UPDATE OR DELETE ON question_answers
+FOR EACH ROW EXECUTE FUNCTION question_cards_on_child();
+
+DROP TRIGGER IF EXISTS trg_question_cards_module_link ON question_stepik_modules;
+CREATE TRIGGER trg_question_cards_module_link
+AFTER INSERT OR UPDATE OR DELETE ON question_stepik_modules
+FOR EACH ROW EXECUTE FUNCTION question_cards_on_child();
+
+DROP TRIGGER IF EXISTS trg_question_cards_topic ON telegram_topics;
+CREATE TRIGGER trg_question_cards_topic
+AFTER INSERT OR UPDATE OR DELETE ON telegram_topics
+FOR EACH ROW EXECUTE FUNCTION question_cards_on_child();
+
+DROP TRIGGER IF EXISTS trg_question_cards_module ON stepik_modules;
+CREATE TRIGGER trg_question_cards_module
+AFTER UPDATE ON stepik_modules
+FOR EACH ROW EXECUTE FUNCTION question_cards_on_module();
+
+-- Отложенный до commit: строка версии блокируется последней и только на время commit
+DROP TRIGGER IF EXISTS trg_question_cards_version ON question_cards;
+CREATE CONSTRAINT TRIGGER trg_question_cards_version
+AFTER INSERT OR UPDATE OR DELETE ON question_cards
+DEFERRABLE INITIALLY DEFERRED
+FOR EACH ROW EXECUTE FUNCTION question_cards_bump_version();
+
+-- 7. Инициализация: собрать карточки для вопросов, у которых их ещё нет
+--    (и пересобрать карточки без поискового документа)
+SELECT public.refresh_question_card(q.id)
+FROM questions q
+WHERE NOT EXISTS (SELECT 1 FROM question_cards c WHERE c.question_id = q.id);
+
+SELECT public.refresh_question_card(c.question_id)
+FROM question_cards c
+WHERE c.search_vector IS NULL;
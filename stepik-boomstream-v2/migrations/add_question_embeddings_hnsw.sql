@@ -0,0 +1,15 @@
+-- HNSW-индекс для поиска похожих вопросов (EMBEDDING_INDEX_MODE=hnsw).
+-- pgvector не строит HNSW/IVFFlat по vector больше 2000 измерений,
+-- поэтому индексируется выражение embedding::halfvec (до 4000 измерений).
+-- Отдельной колонки нет: запросы сортируют по тому же выражению.
+-- Применяется utils/ensure_embedding_index.py только в режиме hnsw.
+
+-- Раньше индекс строился по генерируемой колонке embedding_half
+ALTER TABLE question_embeddings DROP COLUMN IF EXISTS embedding_half;
+
+CREATE INDEX IF NOT EXISTS idx_question_embeddings_half_hnsw
+  ON question_embeddings USING hnsw ((embedding::halfvec(3072)) halfvec_cosine_ops)
+  WITH (m = 16, ef_construction = 64);
+
+-- Точность/скорость поиска настраивается на сессию:
+-- SET hnsw.ef_search = 40;
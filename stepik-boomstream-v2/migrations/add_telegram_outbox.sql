@@ -0,0 +1,22 @@
+-- Миграция: очередь исходящих операций Telegram (telegram_outbox)
+-- Веб-запросы только ставят операцию в очередь; фоновый отправитель выполняет их по порядку внутри чата.
+-- idempotency_key защищает от повторной постановки, state хранит уже выполненные шаги операции.
+
+CREATE TABLE IF NOT EXISTS telegram_outbox (
+    id BIGSERIAL PRIMARY KEY,
+    idempotency_key VARCHAR(200) NOT NULL UNIQUE,
+    chat_id BIGINT NOT NULL,
+    operation VARCHAR(50) NOT NULL,
+    payload JSON DEFAULT '{}' NOT NULL,
+    state JSON DEFAULT '{}' NOT NULL,
+    status VARCHAR(20) DEFAULT 'PENDING' NOT NULL,
+    attempts INTEGER DEFAULT 0 NOT NULL,
+    run_after TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW() NOT NULL,
+    locked_at TIMESTAMP WITHOUT TIME ZONE,
+    last_error TEXT,
+    created_at TIMESTAMP WITHOUT TIME ZONE DEFAULT NOW() NOT NULL,
+    completed_at TIMESTAMP WITHOUT TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS idx_telegram_outbox_chat_status_id
+  ON telegram_outbox (chat_id, status, id);
@@ -1,24 +1,37 @@
 -- Миграция: добавление votes_count в questions и триггер для автоматического пересчёта
+-- Счётчик меняется на ±1 за голос (без COUNT(*) по question_votes);
+-- расхождения исправляет периодическая сверка app/vote_counts.py (reconcile_votes_counts)
 
 -- 1. Добавить поле votes_count
 ALTER TABLE questions ADD COLUMN IF NOT EXISTS votes_count INTEGER DEFAULT 0 NOT NULL;
 
--- 2. Функция для пересчёта голосов
+-- 2. Функция для инкрементального обновления счётчика
+--    Новое значение уходит в канал NOTIFY question_votes (живые счётчики в Mini App, SSE)
 CREATE OR REPLACE FUNCTION public.update_votes_count() RETURNS TRIGGER AS $$
 DECLARE
     qid INTEGER;
+    delta INTEGER;
+    new_count INTEGER;
 BEGIN
     IF TG_OP = 'DELETE' THEN
         qid := OLD.question_id;
+        delta := -1;
     ELSE
         qid := NEW.question_id;
+        delta := 1;
     END IF;
 
     UPDATE public.questions
-    SET votes_count = (
-        SELECT COUNT(*) FROM public.question_votes WHERE question_id = qid
-    )
-    WHERE id = qid;
+    SET votes_count = GREATEST(votes_count + delta, 0)
+    WHERE id = qid
+    RETURNING votes_count INTO new_count;
+
+    IF FOUND THEN
+        PERFORM pg_notify(
+            'question_votes',
+            json_build_object('question_id', qid, 'votes_count', new_count)::text
+        );
+    END IF;
 
     RETURN NULL;
 END;
@@ -36,7 +49,7 @@ CREATE TRIGGER trg_update_votes_count_delete
 AFTER DELETE ON question_votes
 FOR EACH ROW EXECUTE FUNCTION update_votes_count();
 
--- 5. Инициализация: пересчитать для всех вопросов
+-- 5. Инициализация: пересчитать для всех вопросов (то же делает reconcile_votes_counts)
 UPDATE questions SET votes_count = (
     SELECT COUNT(*) FROM question_votes WHERE question_id = questions.id
 );
@@ -0,0 +1,48 @@
+import os
+import unittest
+
+os.environ.setdefault("DATABASE_URL", "sqlite://")
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app.embedding_providers import HashingEmbeddingProvider, set_embedding_provider
+from app.embeddings import upsert_question_embeddings_batch
+from app.models import QuestionEmbedding
+
+
+class UpsertQuestionEmbeddingsBatchTest(unittest.TestCase):
+    def setUp(self):
+        engine = create_engine("sqlite://")
+        QuestionEmbedding.__table__.create(engine)
+        self.db = sessionmaker(bind=engine)()
+        self.dims = QuestionEmbedding.embedding.type.dim
+
+    def tearDown(self):
+        self.db.close()
+        set_embedding_provider(None)
+
+    def upsert(self, source_texts):
+        updated = upsert_question_embeddings_batch(self.db, source_texts)
+        self.db.commit()
+        return updated
+
+    def test_unchanged_text_is_skipped(self):
+        set_embedding_provider(HashingEmbeddingProvider(self.dims))
+        self.assertEqual(self.upsert({1: "Текст: вопрос"}), 1)
+        self.assertEqual(self.upsert({1: "Текст: вопрос"}), 0)
+        self.assertEqual(self.upsert({1: "Текст: другой вопрос"}), 1)
+
+    def test_switching_provider_forces_reembed(self):
+        set_embedding_provider(HashingEmbeddingProvider(self.dims))
+        self.assertEqual(self.upsert({1: "Текст: вопрос", 2: "Текст: ещё"}), 2)
+        old_vector = list(self.db.get(QuestionEmbedding, 1).embedding)
+
+        set_embedding_provider(HashingEmbeddingProvider(self.dims, char_ngrams=(3,)))
+        self.assertEqual(self.upsert({1: "Текст: вопрос", 2: "Текст: ещё"}), 2)
+        self.assertNotEqual(list(self.db.get(QuestionEmbedding, 1).embedding), old_vector)
+        self.assertEqual(self.upsert({1: "Текст: вопрос", 2: "Текст: ещё"}), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,97 @@
+"""Offline benchmark of the similar-questions pipeline (embed -> index -> top-k).
+
+Uses the local hashing embedding provider, so no OpenAI key and no database
+are needed. Questions are synthesized in topic clusters; the report shows
+timings and how often a question's neighbours come from its own cluster.
+
+    python utils/benchmark_similar_search.py --count 20000 --k 5
+"""
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parents[1]
+if str(ROOT_DIR) not in sys.path:
+    sys.path.insert(0, str(ROOT_DIR))
+
+from app.config import Config
+from app.embedding_providers import HashingEmbeddingProvider, set_embedding_provider
+from app.embeddings import generate_embeddings
+from app.vector_index import NumpyVectorIndex
+
+TOPICS = [
+    "энергия дыхание практика утро",
+    "вода питьевой режим очищение",
+    "воздух дыхательные упражнения лёгкие",
+    "здоровье оценка самочувствие анализы",
+    "блоки напряжение спина шея",
+    "питание завтрак продукты сахар",
+    "сон режим бессонница вечер",
+    "видео доступ урок модуль",
+]
+FILLER = "как почему можно ли нужно что делать если после перед когда сколько раз день неделю".split()
+
+
+def synthesize(count: int, seed: int):
+    rnd = random.Random(seed)
+    texts, labels = [], []
+    for i in range(count):
+        topic = i % len(TOPICS)
+        words = TOPICS[topic].split()
+        body = rnd.sample(words, k=min(3, len(words))) + rnd.sample(FILLER, k=6)
+        rnd.shuffle(body)
+        texts.append(f"Заголовок: {' '.join(body[:4])}\nТекст: {' '.join(body)} #{i}")
+        labels.append(topic)
+    return texts, labels
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--count", type=int, default=5000)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--dims", type=int, default=Config.EMBEDDING_HASHING_DIM)
+    parser.add_argument("--block-size", type=int, default=Config.SIMILAR_WARMUP_BLOCK_SIZE)
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    set_embedding_provider(HashingEmbeddingProvider(args.dims))
+    texts, labels = synthesize(args.count, args.seed)
+
+    started = time.time()
+    vectors = generate_embeddings(texts)
+    embed_time = time.time() - started
+
+    started = time.time()
+    index = NumpyVectorIndex()
+    index.build(list(range(args.count)), vectors)
+    index_time = time.time() - started
+
+    started = time.time()
+    results = index.top_k_batch(range(args.count), args.k, block_size=args.block_size)
+    knn_time = time.time() - started
+
+    started = time.time()
+    sample = random.Random(args.seed).sample(range(args.count), k=min(200, args.count))
+    for question_id in sample:
+        index.top_k_scored_for_question(question_id, args.k)
+    single_ms = (time.time() - started) / len(sample) * 1000
+
+    same_topic = sum(
+        labels[neighbour] == labels[question_id]
+        for question_id, neighbours in results.items()
+        for neighbour, _ in neighbours
+    )
+    total = sum(len(neighbours) for neighbours in results.values()) or 1
+
+    print(f"Questions: {args.count}, dims: {args.dims}, k: {args.k}")
+    print(f"Embed:        {embed_time:.2f}s ({args.count / max(embed_time, 1e-9):.0f} texts/s)")
+    print(f"Index build:  {index_time:.2f}s")
+    print(f"Batch top-k:  {knn_time:.2f}s (block {args.block_size})")
+    print(f"Single top-k: {single_ms:.2f}ms avg over {len(sample)} queries")
+    print(f"Same-topic neighbours: {same_topic / total:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+import sys
+from pathlib import Path
+
+from sqlalchemy import text
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.config import Config
+from app.db import engine
+from app.models import QuestionEmbedding
+
+# Воркеры gunicorn стартуют одновременно: без блокировки оба видят, что колонки
+# нет, и второй падает на ADD COLUMN (duplicate column). См. ensure_question_cards.
+_LOCK_KEY = 7302002
+
+
+def _column_exists(conn, column_name: str) -> bool:
+    result = conn.execute(
+        text(
+            """
+            SELECT 1
+            FROM information_schema.columns
+            WHERE table_schema = 'public'
+              AND table_name = 'question_embeddings'
+              AND column_name = :column_name
+            """
+        ),
+        {"column_name": column_name},
+    )
+    return result.first() is not None
+
+
+def ensure_embedding_index() -> None:
+    """source_hash нужен всегда (он есть в модели), HNSW-индекс по embedding::halfvec — только в режиме hnsw.
+
+    Ошибки DDL не глушим: без индекса режим hnsw молча превратился бы в полный перебор.
+    """
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+        if not _column_exists(conn, "source_hash"):
+            # Без заполнения: каким провайдером посчитаны старые векторы, неизвестно,
+            # NULL считается устаревшим и пересчитывается (embeddings.source_text_hash)
+            conn.execute(text("ALTER TABLE question_embeddings ADD COLUMN source_hash VARCHAR(64)"))
+            print("source_hash column added.")
+        else:
+            print("source_hash column already exists.")
+
+        # Генерируемая колонка прежней схемы (вместе с её индексом)
+        if _column_exists(conn, "embedding_half"):
+            conn.execute(text("ALTER TABLE question_embeddings DROP COLUMN embedding_half"))
+            print("embedding_half column dropped.")
+
+        if (Config.EMBEDDING_INDEX_MODE or "").lower() == "hnsw":
+            dims = QuestionEmbedding.embedding.type.dim
+            conn.execute(
+                text(
+                    "CREATE INDEX IF NOT EXISTS idx_question_embeddings_half_hnsw "
+                    f"ON question_embeddings USING hnsw ((embedding::halfvec({dims})) halfvec_cosine_ops) "
+                    f"WITH (m = {int(Config.EMBEDDING_HNSW_M)}, "
+                    f"ef_construction = {int(Config.EMBEDDING_HNSW_EF_CONSTRUCTION)})"
+                )
+            )
+            print("HNSW index on question_embeddings ensured.")
+        else:
+            # В режиме exact индекс не читается, а запись замедляет
+            conn.execute(text("DROP INDEX IF EXISTS idx_question_embeddings_half_hnsw"))
+
+
+if __name__ == "__main__":
+    ensure_embedding_index()
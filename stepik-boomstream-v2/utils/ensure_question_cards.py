@@ -0,0 +1,30 @@
+import sys
+from pathlib import Path
+
+from sqlalchemy import text
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.db import engine
+
+SQL_PATH = ROOT / "migrations" / "add_question_cards.sql"
+
+# Один ключ advisory lock на все воркеры: CREATE OR REPLACE FUNCTION
+# из нескольких процессов одновременно падает с "tuple concurrently updated".
+_LOCK_KEY = 7302001
+
+
+def ensure_question_cards() -> None:
+    sql = SQL_PATH.read_text(encoding="utf-8")
+    try:
+        with engine.begin() as conn:
+            conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+            conn.exec_driver_sql(sql)
+        print("question_cards projection and triggers ensured.")
+    except Exception as e:
+        print(f"Error ensuring question_cards projection:\n{e}")
+
+
+if __name__ == "__main__":
+    ensure_question_cards()
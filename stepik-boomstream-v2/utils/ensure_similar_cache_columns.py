@@ -0,0 +1,44 @@
+import sys
+from pathlib import Path
+
+from sqlalchemy import text
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+from app.db import engine
+
+# Проверка и ADD COLUMN под advisory lock: воркеры стартуют одновременно
+_LOCK_KEY = 7302003
+
+
+def _column_exists(conn, column_name: str) -> bool:
+    result = conn.execute(
+        text(
+            """
+            SELECT 1
+            FROM information_schema.columns
+            WHERE table_schema = 'public'
+              AND table_name = 'similar_questions_cache'
+              AND column_name = :column_name
+            """
+        ),
+        {"column_name": column_name},
+    )
+    return result.first() is not None
+
+
+def ensure_similar_cache_columns() -> None:
+    with engine.begin() as conn:
+        conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": _LOCK_KEY})
+        if not _column_exists(conn, "similar_distances"):
+            conn.execute(
+                text("ALTER TABLE similar_questions_cache ADD COLUMN similar_distances DOUBLE PRECISION[]")
+            )
+            print("similar_distances column added.")
+        else:
+            print("similar_distances column already exists.")
+
+
+if __name__ == "__main__":
+    ensure_similar_cache_columns()
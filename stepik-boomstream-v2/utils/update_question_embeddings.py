@@ -6,33 +6,18 @@ if str(ROOT_DIR) not in sys.path:
     sys.path.insert(0, str(ROOT_DIR))
 
 from app.db import SessionLocal
-from app.models import Question, StepikModule, QuestionStepikModule
-from app.embeddings import upsert_question_embedding
+from app.embeddings import build_question_source_texts, upsert_question_embeddings_batch
 
 
 def main() -> None:
     db = SessionLocal()
     try:
-        questions = db.query(Question).all()
-        total = len(questions)
-        updated = 0
+        source_texts = build_question_source_texts(db)
+        total = len(source_texts)
         print(f"Found questions: {total}")
-        for idx, question in enumerate(questions, start=1):
-            modules = (
-                db.query(StepikModule)
-                .join(QuestionStepikModule)
-                .filter(QuestionStepikModule.question_id == question.id)
-                .order_by(StepikModule.position)
-                .all()
-            )
-            if upsert_question_embedding(db, question, modules):
-                updated += 1
-                if updated % 20 == 0:
-                    db.commit()
-            if idx % 20 == 0 or idx == total:
-                print(f"Processed {idx}/{total}, updated {updated}")
+        updated = upsert_question_embeddings_batch(db, source_texts)
         db.commit()
-        print(f"Updated embeddings: {updated}")
+        print(f"Updated embeddings: {updated}, unchanged: {total - updated}")
     finally:
         db.close()
 